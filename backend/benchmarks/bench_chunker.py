@@ -0,0 +1,75 @@
+import argparse
+import random
+import time
+from typing import List
+
+from utils.chunker import TokenCounter
+
+WORDS = (
+    "theorem proof lemma matrix vector eigenvalue integral derivative limit series "
+    "function domain range graph node edge tree heap queue stack sort search hash "
+    "probability variance expectation distribution sample estimator bias entropy"
+).split()
+
+
+def generate_pages(num_pages: int, words_per_page: int = 500, seed: int = 0) -> str:
+    """Generate lecture-note-like text of roughly num_pages pages"""
+    rng = random.Random(seed)
+    sentences = []
+    for _ in range(num_pages * words_per_page // 12):
+        length = rng.randint(6, 18)
+        sentences.append(" ".join(rng.choice(WORDS) for _ in range(length)).capitalize() + ".")
+    return " ".join(sentences)
+
+
+def legacy_chunk_text(counter: TokenCounter, text: str, max_tokens: int, overlap_tokens: int) -> List[str]:
+    """The previous sentence-slicing chunker, kept here for comparison"""
+    sentences = [s.strip() for s in counter.sentence_endings.split(text) if s.strip()]
+    chunks = []
+    current_pos = 0
+    while current_pos < len(sentences):
+        chunk = []
+        current_tokens = 0
+        for sentence in sentences[current_pos:]:
+            sentence_tokens = counter.count_tokens(sentence)
+            if current_tokens + sentence_tokens > max_tokens - overlap_tokens:
+                break
+            chunk.append(sentence)
+            current_tokens += sentence_tokens
+        if not chunk:
+            break
+        chunks.append(" ".join(chunk))
+        current_pos += max(1, len(chunk) - 1)
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark TokenCounter.chunk_text")
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--max-tokens", type=int, default=4000)
+    parser.add_argument("--overlap-tokens", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    text = generate_pages(args.pages)
+    counter = TokenCounter()
+    print(f"Input: {args.pages} pages, {len(text):,} characters")
+
+    def timed(label, fn):
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            chunks = fn()
+            best = min(best, time.perf_counter() - start)
+        print(f"{label:>8}: {best * 1000:9.1f} ms  ({len(chunks)} chunks)")
+        return best
+
+    new_time = timed("current", lambda: counter.chunk_text(text, args.max_tokens, args.overlap_tokens))
+    if not args.skip_legacy:
+        old_time = timed("legacy", lambda: legacy_chunk_text(counter, text, args.max_tokens, args.overlap_tokens))
+        print(f"Speedup: {old_time / new_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
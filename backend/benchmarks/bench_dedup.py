@@ -0,0 +1,75 @@
+import argparse
+import random
+import time
+from typing import List
+
+from utils.dedup import BulletDeduplicator
+
+WORDS = (
+    "theorem proof lemma matrix vector eigenvalue integral derivative limit series "
+    "function domain range graph node edge tree heap queue stack sort search hash "
+    "probability variance expectation distribution sample estimator bias entropy"
+).split()
+
+
+def generate_summaries(num_chunks: int, items_per_chunk: int, overlap_items: int, seed: int = 0) -> List[str]:
+    """Chunk summaries whose first bullets restate (with small edits) the previous chunk's last ones"""
+    rng = random.Random(seed)
+    summaries = []
+    previous: List[str] = []
+    for _ in range(num_chunks):
+        items = []
+        for text in previous[-overlap_items:]:
+            words = text.split()
+            words[rng.randrange(len(words))] = rng.choice(WORDS)
+            items.append(" ".join(words))
+        while len(items) < items_per_chunk:
+            items.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 24))))
+        previous = items
+        summaries.append("\\begin{itemize}\n" + "".join(f"\\item {item}\n" for item in items) + "\\end{itemize}")
+    return summaries
+
+
+def brute_force_removed(deduplicator: BulletDeduplicator, summaries: List[str]) -> int:
+    """Greedy all-pairs clustering with the same similarity rule, for checking recall"""
+    from utils.dedup import _Summary, _shingles
+    kept = []
+    removed = 0
+    for summary in summaries:
+        for item in _Summary(summary).items:
+            shingles = _shingles(item, deduplicator.shingle_size)
+            if any(len(shingles & other) / len(shingles | other) >= deduplicator.threshold for other in kept):
+                removed += 1
+            else:
+                kept.append(shingles)
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BulletDeduplicator")
+    parser.add_argument("--chunks", type=int, default=400)
+    parser.add_argument("--items", type=int, default=12)
+    parser.add_argument("--overlap-items", type=int, default=2)
+    parser.add_argument("--check", action="store_true", help="Compare against all-pairs clustering")
+    args = parser.parse_args()
+
+    summaries = generate_summaries(args.chunks, args.items, args.overlap_items)
+    deduplicator = BulletDeduplicator()
+
+    start = time.perf_counter()
+    _, report = deduplicator.dedup(summaries)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{report.bullets:,} bullets: removed {report.removed:,} "
+        f"({report.chars_removed:,} characters) in {elapsed * 1000:.0f} ms"
+    )
+
+    if args.check:
+        start = time.perf_counter()
+        expected = brute_force_removed(deduplicator, summaries)
+        elapsed = time.perf_counter() - start
+        print(f"All-pairs: removed {expected:,} in {elapsed * 1000:.0f} ms (recall {report.removed / max(expected, 1):.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.corpus import generate_upload
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_BUCKET_LINE = re.compile(r'^cheatsheet_stage_seconds_bucket\{stage="([^"]+)",le="([^"]+)"\} (\S+)$', re.MULTILINE)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Linearly interpolated percentile, q in [0, 100]"""
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def parse_stage_buckets(metrics_text: str) -> Dict[str, List[Tuple[float, float]]]:
+    """Cumulative (upper bound, count) pairs of cheatsheet_stage_seconds per stage"""
+    buckets = defaultdict(list)
+    for stage, bound, count in _BUCKET_LINE.findall(metrics_text):
+        buckets[stage].append((float("inf") if bound == "+Inf" else float(bound), float(count)))
+    return {stage: sorted(pairs) for stage, pairs in buckets.items()}
+
+
+def histogram_quantile(pairs: List[Tuple[float, float]], q: float) -> Optional[float]:
+    """Estimate a quantile from cumulative buckets, interpolating within a bucket like Prometheus does"""
+    total = pairs[-1][1] if pairs else 0
+    if total <= 0:
+        return None
+    rank = total * q / 100
+    lower_bound, lower_count = 0.0, 0.0
+    for bound, count in pairs:
+        if count >= rank:
+            if bound == float("inf"):
+                return lower_bound
+            if count == lower_count:
+                return bound
+            return lower_bound + (bound - lower_bound) * (rank - lower_count) / (count - lower_count)
+        lower_bound, lower_count = bound, count
+    return lower_bound
+
+
+def stage_percentiles(before: str, after: str) -> Dict[str, Dict[str, float]]:
+    """Per-stage p50/p95/p99 of the operations recorded between two /metrics scrapes"""
+    start = parse_stage_buckets(before)
+    result = {}
+    for stage, pairs in parse_stage_buckets(after).items():
+        previous = dict(start.get(stage, []))
+        delta = [(bound, count - previous.get(bound, 0.0)) for bound, count in pairs]
+        if delta and delta[-1][1] > 0:
+            result[stage] = {
+                "count": int(delta[-1][1]),
+                **{f"p{q}": histogram_quantile(delta, q) for q in (50, 95, 99)},
+            }
+    return result
+
+
+def process_tree_peak_rss(pid: int) -> Optional[int]:
+    """Sum of peak resident set sizes (VmHWM) of a process and its descendants, in bytes; Linux only"""
+    if not os.path.exists(f"/proc/{pid}"):
+        return None
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total += int(line.split()[1]) * 1024
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+    return total
+
+
+async def wait_until_up(url: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{url} did not come up within {timeout} seconds")
+                await asyncio.sleep(0.2)
+
+
+async def run_level(base_url: str, uploads: List[list], concurrency: int, args) -> Dict[str, object]:
+    """Send every upload to /upload with at most `concurrency` requests in flight"""
+    slots = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    statuses: Dict[str, int] = defaultdict(int)
+    form = {"font_size": args.font_size, "columns": str(args.columns), "orientation": args.orientation}
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout) as client:
+        before = (await client.get("/metrics")).text
+
+        async def send(upload) -> None:
+            async with slots:
+                files = [("files", file) for file in upload]
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/upload", files=files, data=form)
+                    statuses[str(response.status_code)] += 1
+                    if response.status_code == 200:
+                        latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(send(upload) for upload in uploads))
+        wall = time.perf_counter() - wall_start
+
+        after = (await client.get("/metrics")).text
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(uploads),
+        "statuses": dict(statuses),
+        "requests_per_second": len(latencies) / wall if wall else 0.0,
+        "end_to_end": {f"p{q}": percentile(latencies, q) for q in (50, 95, 99)},
+        "stages": stage_percentiles(before, after),
+    }
+
+
+def compare(results: Dict[str, object], baseline: Dict[str, object], tolerance: float) -> List[str]:
+    """Describe every level whose p95 latency or throughput is worse than the baseline by more than tolerance"""
+    regressions = []
+    previous = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    for level in results["levels"]:
+        old = previous.get(level["concurrency"])
+        if old is None:
+            continue
+        new_p95, old_p95 = level["end_to_end"]["p95"], old["end_to_end"]["p95"]
+        if new_p95 and old_p95 and new_p95 > old_p95 * (1 + tolerance):
+            regressions.append(f"c={level['concurrency']}: p95 {old_p95:.2f}s -> {new_p95:.2f}s")
+        new_rps, old_rps = level["requests_per_second"], old["requests_per_second"]
+        if old_rps and new_rps < old_rps * (1 - tolerance):
+            regressions.append(f"c={level['concurrency']}: throughput {old_rps:.2f}/s -> {new_rps:.2f}/s")
+    return regressions
+
+
+def print_level(level: Dict[str, object]) -> None:
+    e2e = level["end_to_end"]
+
+    def fmt(value):
+        return f"{value:7.3f}" if value is not None else "      -"
+
+    print(
+        f"\nconcurrency={level['concurrency']}  requests={level['requests']}  "
+        f"statuses={level['statuses']}  throughput={level['requests_per_second']:.2f} req/s"
+    )
+    print(f"  {'end-to-end':<14} p50 {fmt(e2e['p50'])}s  p95 {fmt(e2e['p95'])}s  p99 {fmt(e2e['p99'])}s")
+    for stage, values in sorted(level["stages"].items()):
+        print(
+            f"  {stage:<14} p50 {fmt(values['p50'])}s  p95 {fmt(values['p95'])}s  "
+            f"p99 {fmt(values['p99'])}s  (n={values['count']})"
+        )
+
+
+async def run(args) -> int:
+    workdir = tempfile.mkdtemp(prefix="cheatsheet_bench_")
+    stub_port, app_port = free_port(), free_port()
+    stub = server = None
+    try:
+        stub = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.stub_openai", "--port", str(stub_port),
+             "--latency", str(args.latency), "--jitter", str(args.jitter),
+             "--rate-limit", str(args.rate_limit), "--bullets", str(args.bullets)],
+            cwd=BACKEND_DIR
+        )
+
+        # The server runs in a scratch directory so its caches and storage start empty
+        env = dict(os.environ)
+        env.update({
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{stub_port}/v1",
+            "OPENAI_API_KEY": "benchmark",
+            "CHUNK_CACHE_PATH": os.path.join(workdir, "chunk_cache.sqlite3"),
+        })
+        env.setdefault("OPENAI_RPM", "100000")
+        env.setdefault("OPENAI_TPM", "100000000")
+        server_log = open(os.path.join(workdir, "server.log"), "w")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR,
+             "--port", str(app_port), "--log-level", "warning"],
+            cwd=workdir,
+            env=env,
+            stdout=server_log,
+            stderr=subprocess.STDOUT
+        )
+
+        base_url = f"http://127.0.0.1:{app_port}"
+        await wait_until_up(f"http://127.0.0.1:{stub_port}/stats")
+        await wait_until_up(base_url + "/")
+        print(f"Server log: {server_log.name}")
+
+        results = {
+            "config": {
+                key: getattr(args, key) for key in
+                ("files", "pages", "kind", "latency", "jitter", "rate_limit", "bullets", "requests")
+            },
+            "levels": [],
+        }
+        seed = 0
+        for concurrency in args.concurrency:
+            uploads = []
+            for _ in range(args.requests):
+                # A fresh seed per upload keeps the result and chunk caches cold
+                seed += 0 if args.repeat_content else 1
+                uploads.append(generate_upload(args.files, args.pages, args.kind, seed))
+            level = await run_level(base_url, uploads, concurrency, args)
+            level["peak_rss_bytes"] = process_tree_peak_rss(server.pid)
+            results["levels"].append(level)
+            print_level(level)
+            if level["peak_rss_bytes"]:
+                print(f"  peak RSS (server + workers) {level['peak_rss_bytes'] / 1024 / 1024:.0f} MiB")
+
+        async with httpx.AsyncClient() as client:
+            results["stub"] = (await client.get(f"http://127.0.0.1:{stub_port}/stats")).json()
+        print(f"\nStub: {results['stub']}")
+
+        if args.save_baseline:
+            os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+            with open(args.save_baseline, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"Saved baseline to {args.save_baseline}")
+
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare(results, json.load(f), args.tolerance)
+            if regressions:
+                print("\nRegressions against baseline:")
+                for line in regressions:
+                    print(f"  {line}")
+                return 1
+            print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.baseline}")
+        return 0
+    finally:
+        for process in (server, stub):
+            if process is not None:
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+        if args.keep_workdir:
+            print(f"Kept {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end /upload benchmark against a local OpenAI stand-in")
+    parser.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 4, 8],
+                        help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=16, help="Uploads per concurrency level")
+    parser.add_argument("--files", type=int, default=2, help="Files per upload")
+    parser.add_argument("--pages", type=int, default=10, help="Pages per file")
+    parser.add_argument("--kind", choices=("pdf", "txt", "mixed"), default="mixed")
+    parser.add_argument("--repeat-content", action="store_true", help="Send the same upload every time (measures the cache path)")
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub response time in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--rate-limit", type=float, default=0.02, help="Fraction of stub responses that are 429s")
+    parser.add_argument("--bullets", type=int, default=8, help="Bullets per stub summary")
+    parser.add_argument("--font-size", default="scriptsize")
+    parser.add_argument("--columns", type=int, default=3)
+    parser.add_argument("--orientation", default="landscape")
+    parser.add_argument("--request-timeout", type=float, default=600)
+    parser.add_argument("--save-baseline", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against a saved baseline and exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown before flagging")
+    parser.add_argument("--keep-workdir", action="store_true")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
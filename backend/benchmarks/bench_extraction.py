@@ -0,0 +1,54 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.corpus import generate_pdf
+from utils import text_extractor
+from utils.extraction_cache import ExtractionCache
+
+
+async def extract_all(files) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(text_extractor.extract_text_from_bytes(name, content) for name, content in files))
+    return time.perf_counter() - start
+
+
+async def run(args) -> None:
+    workdir = tempfile.mkdtemp(prefix="extraction_bench_")
+    # A private cache, so the app's own is neither read nor filled
+    text_extractor.extraction_cache = ExtractionCache(os.path.join(workdir, "extracted.sqlite3"))
+    try:
+        files = [(f"lecture_{i}.pdf", generate_pdf(args.pages, seed=i)) for i in range(args.files)]
+        extra = (f"lecture_{args.files}.pdf", generate_pdf(args.pages, seed=args.files))
+        source_mb = sum(len(content) for _, content in files) / 1024 / 1024
+        print(f"{args.files} PDFs x {args.pages} pages ({source_mb:.1f} MiB)")
+
+        cold = await extract_all(files)
+        warm = await extract_all(files)
+        # The same set plus one new file: only the new one should be parsed
+        grown = await extract_all(files + [extra])
+        print(f"  cold             {cold:7.3f}s")
+        print(f"  warm (all hits)  {warm:7.3f}s  ({cold / warm:.0f}x faster)")
+        print(f"  one file added   {grown:7.3f}s")
+
+        stats = text_extractor.extraction_cache.stats()
+        print(
+            f"  cache: {stats['entries']} entries, {stats['bytes'] / 1024:.0f} KiB stored for "
+            f"{stats['text_bytes'] / 1024:.0f} KiB of text, hit rate {stats['hit_rate']:.0%}, "
+            f"{stats['bytes_parsed_saved'] / 1024 / 1024:.1f} MiB of parsing saved"
+        )
+    finally:
+        text_extractor.shutdown_extraction_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time extraction with a cold and a warm extraction cache")
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+from benchmarks.bench_e2e import BACKEND_DIR, free_port, percentile, wait_until_up
+from benchmarks.corpus import generate_text
+from utils.llm_client import LLMClient
+from utils.routing import ModelRouter, Route
+
+SYSTEM_PROMPT = "Summarize the text as a LaTeX itemize environment."
+
+
+def generate_chunks(count: int, seed: int = 0) -> List[str]:
+    """Chunks of mixed size, some of them formula-heavy"""
+    rng = random.Random(seed)
+    chunks = []
+    for i in range(count):
+        text = generate_text(1, seed=seed * 1000 + i)
+        if rng.random() < 0.5:
+            text = text[: rng.randint(400, 1500)]
+        if rng.random() < 0.2:
+            text += " " + " ".join(f"x_{j}^2 + {j} = y_{j}" for j in range(rng.randint(20, 60)))
+        chunks.append(text)
+    return chunks
+
+
+async def run_batches(
+    client: LLMClient,
+    router: ModelRouter,
+    chunks: List[str],
+    batch_size: int
+) -> Dict[str, Optional[float]]:
+    """Summarize chunks in gathered batches, as one upload does, and time each batch"""
+    batch_seconds = []
+
+    async def send(chunk: str) -> None:
+        route = router.choose(chunk)
+        start = time.perf_counter()
+        await client.chat(
+            [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": chunk}],
+            model=route.model,
+            temperature=0.7
+        )
+        router.record(route, time.perf_counter() - start)
+
+    for offset in range(0, len(chunks), batch_size):
+        start = time.perf_counter()
+        await asyncio.gather(*(send(chunk) for chunk in chunks[offset:offset + batch_size]))
+        batch_seconds.append(time.perf_counter() - start)
+
+    return {f"p{q}": percentile(batch_seconds, q) for q in (50, 95, 99)}
+
+
+async def run(args) -> None:
+    port = free_port()
+    command = [
+        sys.executable, "-m", "benchmarks.stub_openai", "--port", str(port),
+        "--latency", str(args.latency), "--jitter", str(args.jitter),
+        "--slow-fraction", str(args.slow_fraction), "--slow-latency", str(args.slow_latency),
+        "--model-latency", f"{args.fast_model}={args.fast_latency}",
+    ]
+    stub = subprocess.Popen(command, cwd=BACKEND_DIR)
+    try:
+        await wait_until_up(f"http://127.0.0.1:{port}/stats")
+        chunks = generate_chunks(args.chunks)
+
+        for label, hedge_quantile, fast in (
+            ("no hedging, one model", None, False),
+            ("hedging, one model", args.hedge_quantile, False),
+            ("hedging, routed", args.hedge_quantile, True),
+        ):
+            client = LLMClient(
+                api_key="benchmark",
+                base_url=f"http://127.0.0.1:{port}/v1",
+                max_concurrency=args.batch_size * 2,
+                requests_per_minute=100000,
+                tokens_per_minute=100000000,
+                hedge_quantile=hedge_quantile,
+                hedge_min_samples=args.warmup,
+                hedge_max_ratio=args.hedge_max_ratio
+            )
+            routes = [Route("strong", args.model)]
+            if fast:
+                routes.insert(0, Route("fast", args.fast_model, max_tokens=args.fast_max_tokens, max_math_ratio=0.15))
+            router = ModelRouter(routes)
+            try:
+                # Warm-up requests fill the latency window the hedge delay is taken from
+                await run_batches(client, router, chunks[:args.warmup], args.batch_size)
+                timings = await run_batches(client, router, chunks, args.batch_size)
+            finally:
+                await client.aclose()
+
+            stats = client.stats()
+            print(f"{label}:")
+            print("  batch " + "  ".join(f"{key} {value:.2f}s" for key, value in timings.items()))
+            print(f"  requests {stats['requests']}  hedged {stats['hedged']}  hedge wins {stats['hedge_wins']}")
+            for name, route_stats in router.stats().items():
+                print(f"  route {name} ({route_stats['model']}): {route_stats['requests']} requests, "
+                      f"p50 {route_stats['p50']}s, p95 {route_stats['p95']}s")
+    finally:
+        stub.terminate()
+        stub.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure hedged requests and model routing against a slow-tailed stub")
+    parser.add_argument("--chunks", type=int, default=400)
+    parser.add_argument("--batch-size", type=int, default=8, help="Chunks gathered together, as in one upload")
+    parser.add_argument("--warmup", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--slow-fraction", type=float, default=0.03)
+    parser.add_argument("--slow-latency", type=float, default=3.0)
+    parser.add_argument("--hedge-quantile", type=float, default=95)
+    parser.add_argument("--hedge-max-ratio", type=float, default=0.1)
+    parser.add_argument("--model", default="gpt-4")
+    parser.add_argument("--fast-model", default="gpt-3.5-turbo")
+    parser.add_argument("--fast-latency", type=float, default=0.15)
+    parser.add_argument("--fast-max-tokens", type=int, default=1500)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
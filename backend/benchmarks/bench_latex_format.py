@@ -0,0 +1,73 @@
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from utils.compile_latex import LatexCompiler
+from utils.latex_gen import render_latex
+
+SAMPLE_CONTENT = "\n".join(
+    ["\\begin{itemize}"]
+    + [f"\\item Fact {i}: $\\int_0^{{{i}}} x^2\\,dx = {i}^3/3$ and $\\sum_{{k=1}}^n k = n(n+1)/2$" for i in range(40)]
+    + ["\\end{itemize}"]
+)
+
+VARIANTS = [
+    ("\\small", "portrait"),
+    ("\\footnotesize", "landscape"),
+]
+
+
+async def measure(compiler: LatexCompiler, latex_code: str, runs: int, use_format: bool):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        pdf_path = await compiler.compile(latex_code, use_format=use_format)
+        timings.append(time.perf_counter() - start)
+        shutil.rmtree(os.path.dirname(pdf_path), ignore_errors=True)
+    return timings
+
+
+async def run(args):
+    scratch = tempfile.mkdtemp(prefix="latex-bench-")
+    compiler = LatexCompiler(
+        max_concurrent_jobs=1,
+        scratch_dir=os.path.join(scratch, "jobs"),
+        format_dir=os.path.join(scratch, "formats")
+    )
+    if not await compiler.probe():
+        raise SystemExit("pdflatex is required for this benchmark")
+
+    try:
+        for font_size, orientation in VARIANTS:
+            latex_code = render_latex(SAMPLE_CONTENT, font_size, 3, orientation)
+
+            start = time.perf_counter()
+            await compiler.compile(latex_code, use_format=True)  # builds the format
+            build = time.perf_counter() - start
+
+            cold = await measure(compiler, latex_code, args.runs, use_format=False)
+            warm = await measure(compiler, latex_code, args.runs, use_format=True)
+            print(
+                f"{font_size:>14} {orientation:<9}  "
+                f"cold median {statistics.median(cold) * 1000:7.1f} ms  "
+                f"format median {statistics.median(warm) * 1000:7.1f} ms  "
+                f"speedup {statistics.median(cold) / statistics.median(warm):4.1f}x  "
+                f"(first run incl. format build {build * 1000:.0f} ms)"
+            )
+        print(compiler.stats())
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare cold and precompiled-format pdflatex latency")
+    parser.add_argument("--runs", type=int, default=10)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.bench_e2e import BACKEND_DIR, free_port, percentile, wait_until_up
+from benchmarks.corpus import generate_upload
+
+
+async def send_uploads(base_url: str, uploads: List[list], concurrency: int, args) -> Dict[str, object]:
+    """Send every upload to /upload with at most `concurrency` requests in flight"""
+    slots = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    statuses: Dict[str, int] = defaultdict(int)
+    form = {"font_size": args.font_size, "columns": str(args.columns), "orientation": args.orientation}
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout) as client:
+        async def send(upload) -> None:
+            async with slots:
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/upload", files=[("files", file) for file in upload], data=form)
+                    statuses[str(response.status_code)] += 1
+                    if response.status_code == 200:
+                        latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(send(upload) for upload in uploads))
+        wall = time.perf_counter() - start
+
+    return {
+        "statuses": dict(statuses),
+        "wall": wall,
+        **{f"p{q}": percentile(latencies, q) for q in (50, 95)},
+    }
+
+
+async def run_mode(shared: bool, uploads: List[list], args) -> Dict[str, object]:
+    """Run one server with args.workers processes against a fresh stub and return the stub's view of it"""
+    workdir = tempfile.mkdtemp(prefix="cheatsheet_mp_")
+    stub_port, app_port = free_port(), free_port()
+    stub = server = None
+    try:
+        # The stub rejects requests beyond the provider's concurrency limit, as a per-key limit would
+        stub = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.stub_openai", "--port", str(stub_port),
+             "--latency", str(args.latency), "--jitter", str(args.jitter),
+             "--max-concurrency", str(args.limit)],
+            cwd=BACKEND_DIR
+        )
+        env = dict(os.environ)
+        env.update({
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{stub_port}/v1",
+            "OPENAI_API_KEY": "benchmark",
+            "OPENAI_MAX_CONCURRENCY": str(args.limit),
+            "OPENAI_RPM": "100000",
+            "OPENAI_TPM": "100000000",
+            # Hedged duplicates would be counted as repeated requests
+            "OPENAI_HEDGE": "0",
+            "SHARED_COORDINATION": "1" if shared else "0",
+        })
+        server_log = open(os.path.join(workdir, "server.log"), "w")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR,
+             "--port", str(app_port), "--workers", str(args.workers), "--log-level", "warning"],
+            cwd=workdir,
+            env=env,
+            stdout=server_log,
+            stderr=subprocess.STDOUT
+        )
+        base_url = f"http://127.0.0.1:{app_port}"
+        await wait_until_up(f"http://127.0.0.1:{stub_port}/stats")
+        await wait_until_up(base_url + "/")
+        # Every worker has to be up before the load starts, or the first one takes all of it
+        await asyncio.sleep(args.startup_seconds)
+
+        result = await send_uploads(base_url, uploads, args.concurrency, args)
+        async with httpx.AsyncClient() as client:
+            result["stub"] = (await client.get(f"http://127.0.0.1:{stub_port}/stats")).json()
+        return result
+    finally:
+        for process in (server, stub):
+            if process is not None:
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+async def run(args) -> int:
+    # Each distinct upload is sent `copies` times, so identical work lands on different workers at once
+    uploads = []
+    for seed in range(args.distinct):
+        upload = generate_upload(args.files, args.pages, args.kind, seed + 1)
+        uploads.extend([upload] * args.copies)
+
+    failed = False
+    for shared in (False, True):
+        result = await run_mode(shared, uploads, args)
+        stub = result["stub"]
+        label = "shared coordination" if shared else "per-process limits"
+        print(f"{label} ({args.workers} workers, limit {args.limit}):")
+        print(f"  uploads {result['statuses']}  wall {result['wall']:.1f}s  "
+              f"p50 {result['p50'] or 0:.2f}s  p95 {result['p95'] or 0:.2f}s")
+        print(f"  stub: requests {stub['requests']}  peak in flight {stub['peak_in_flight']}  "
+              f"rejected over limit {stub['over_concurrency']}  repeated requests {stub['duplicates']}")
+        if shared and (stub["peak_in_flight"] > args.limit or stub["over_concurrency"]):
+            failed = True
+
+    if args.check and failed:
+        print(f"Shared coordination let more than {args.limit} requests reach the provider at once")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load a multi-worker server and check that the provider's concurrency limit holds across processes"
+    )
+    parser.add_argument("--workers", type=int, default=4, help="uvicorn worker processes")
+    parser.add_argument("--limit", type=int, default=3, help="OPENAI_MAX_CONCURRENCY, enforced by the stub")
+    parser.add_argument("--distinct", type=int, default=6, help="Distinct uploads")
+    parser.add_argument("--copies", type=int, default=3, help="Times each upload is sent")
+    parser.add_argument("--concurrency", type=int, default=12, help="Uploads in flight at once")
+    parser.add_argument("--files", type=int, default=1)
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--kind", choices=("pdf", "txt", "mixed"), default="txt")
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--font-size", default="scriptsize")
+    parser.add_argument("--columns", type=int, default=3)
+    parser.add_argument("--orientation", default="landscape")
+    parser.add_argument("--startup-seconds", type=float, default=3.0)
+    parser.add_argument("--request-timeout", type=float, default=600)
+    parser.add_argument("--check", action="store_true", help="Exit 1 if the shared limit was exceeded")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
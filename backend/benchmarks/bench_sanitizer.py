@@ -0,0 +1,112 @@
+import argparse
+import random
+import time
+
+from utils.sanitizer import TextSanitizer, get_sanitizer
+
+NOISE_LINES = [
+    "12",
+    "Page 7",
+    "- 3 -",
+    "Introduction To Algorithms",
+    "© 2024 Some University",
+    "www.example.edu/course",
+    "Copyright © 2023 Someone",
+    "All rights reserved.",
+    "STRICTLY CONFIDENTIAL: do not share",
+    "COMPANY TRADE SECRET 2024",
+    "4.",
+    "[12] Knuth, The Art of Computer Programming",
+    "*",
+    "•••••",
+    "......",
+    "_____",
+    "",
+    "   ",
+]
+
+BODY_WORDS = (
+    "the gradient of a convex function is monotone ( see figure 3 ) and "
+    "therefore , the minimizer is unique ; we prove this by contradiction : "
+    "assume two minimizers exist [ 1 ] » then their midpoint is strictly better !"
+).split()
+
+
+def generate_document(num_pages: int, seed: int = 0) -> str:
+    """Generate PDF-extraction-like text with headers, footers and artifacts"""
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(num_pages):
+        lines.append(rng.choice(NOISE_LINES))
+        for _ in range(40):
+            if rng.random() < 0.1:
+                lines.append(rng.choice(NOISE_LINES))
+            else:
+                lines.append(" ".join(rng.choice(BODY_WORDS) for _ in range(rng.randint(4, 14))))
+        lines.append(rng.choice(NOISE_LINES))
+    return "\n".join(lines)
+
+
+def generate_fuzz_case(rng: random.Random) -> str:
+    """Short adversarial snippets that mix keywords, whitespace and punctuation"""
+    tokens = [
+        "CONFIDENTIAL", "CONFIDENTI", "AL", "TRADE SECRET", "NOT FOR", "PUBLIC DISTRIBUTION",
+        "FOR INTERNAL USE", "ONLY", "Hello", "abc", "12", "3.", "Page 4", "- 5 -", "©", "www.x",
+        "[3]", "*", "...", "___", "•", "»", "–", "(", ")", "[", "]", ".", ",", ";", ":", "!", "?",
+        "\n", "\n", "\n\n\n", " ", "  ", "\t", "\u00a0", "\x0b", "\u2028", "\x1c", "All rights reserved",
+    ]
+    return "".join(rng.choice(tokens) for _ in range(rng.randint(1, 30)))
+
+
+def reference_sanitize(sanitizer: TextSanitizer, text: str) -> str:
+    """Apply every pattern in order, one full pass each, as the sanitizer originally did"""
+    for pattern in sanitizer.compiled_patterns:
+        text = pattern.sub('', text)
+    for pattern, repl in sanitizer.compiled_cleanup:
+        text = pattern.sub(repl, text)
+    return text.strip()
+
+
+def check_equivalence(sanitizer: TextSanitizer, documents, fuzz_cases: int, seed: int) -> None:
+    rng = random.Random(seed)
+    cases = list(documents) + [generate_fuzz_case(rng) for _ in range(fuzz_cases)]
+    for case in cases:
+        expected = reference_sanitize(sanitizer, case)
+        actual = sanitizer.sanitize(case)
+        if expected != actual:
+            raise AssertionError(f"Output mismatch for input {case!r}:\n{expected!r}\n{actual!r}")
+    print(f"Equivalence: {len(cases)} inputs match the reference implementation")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and verify TextSanitizer")
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--fuzz-cases", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    sanitizer = get_sanitizer()
+    document = generate_document(args.pages)
+    check_equivalence(sanitizer, [generate_document(5, seed=s) for s in range(20)], args.fuzz_cases, seed=1)
+
+    megabytes = len(document.encode("utf-8")) / 1e6
+
+    def timed(fn):
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    print(f"Input: {args.pages} pages, {megabytes:.2f} MB")
+    new_time = timed(lambda: sanitizer.sanitize(document))
+    old_time = timed(lambda: reference_sanitize(sanitizer, document))
+    print(f"  current: {new_time * 1000:9.1f} ms  ({megabytes / new_time:.1f} MB/s)")
+    print(f"reference: {old_time * 1000:9.1f} ms  ({megabytes / old_time:.1f} MB/s)")
+    print(f"Speedup: {old_time / new_time:.1f}x")
+    print(f"Sanitizer construction: {timed(TextSanitizer) * 1000:.1f} ms (now paid once per process)")
+
+
+if __name__ == "__main__":
+    main()
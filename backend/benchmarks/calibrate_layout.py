@@ -0,0 +1,120 @@
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from utils.compile_latex import LatexCompiler
+from utils.latex_gen import render_latex
+from utils.layout import AUTO_COLUMNS, AUTO_FONT_SIZES, estimate_pages, fit_layout, measure_fill
+
+WORDS = (
+    "theorem proof lemma matrix vector eigenvalue integral derivative limit series "
+    "function domain range graph node edge tree heap queue stack sort search hash "
+    "probability variance expectation distribution sample estimator bias entropy "
+    "a an the of for is to in by with on at"
+).split()
+
+
+def generate_bullets(items: int, seed: int = 0) -> str:
+    """Itemize environments of chunk-summary-like bullets of varying length"""
+    rng = random.Random(seed)
+    lists = []
+    while items > 0:
+        count = min(items, rng.randint(4, 10))
+        items -= count
+        bullets = "".join(
+            "\\item " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 30))) + "\n"
+            for _ in range(count)
+        )
+        lists.append("\\begin{itemize}\n" + bullets + "\\end{itemize}")
+    return "\n".join(lists)
+
+
+async def measure(
+    compiler: LatexCompiler,
+    text: str,
+    font_size: str,
+    columns: int,
+    orientation: str
+) -> float:
+    pdf_path = await compiler.compile(render_latex(text, "\\" + font_size, columns, orientation))
+    try:
+        return measure_fill(pdf_path, columns, orientation)
+    finally:
+        compiler.cleanup(pdf_path)
+
+
+async def run(args) -> int:
+    compiler = LatexCompiler(max_concurrent_jobs=args.jobs, scratch_dir=tempfile.mkdtemp(prefix="calibrate_"))
+    if not await compiler.probe():
+        print("pdflatex is not available; calibration needs real compiles")
+        return 2
+
+    texts = [generate_bullets(random.Random(sample).randint(20, args.max_items), seed=sample) for sample in range(args.samples)]
+    cases: List[Tuple[str, int, str, str]] = []
+    for text in texts:
+        for orientation in args.orientations:
+            for font_size in AUTO_FONT_SIZES:
+                for columns in AUTO_COLUMNS:
+                    cases.append((font_size, columns, orientation, text))
+
+    start = time.perf_counter()
+    fills = await asyncio.gather(*(measure(compiler, text, f, c, o) for f, c, o, text in cases), return_exceptions=True)
+    print(f"{len(cases)} compiles in {time.perf_counter() - start:.1f}s\n")
+    errors = [fill for fill in fills if isinstance(fill, Exception)]
+    if errors:
+        print(f"{len(errors)} compiles could not be measured, e.g.: {str(errors[0])[:300]}")
+        return 1
+
+    # Ratio of measured to estimated fill, per font size; 1.0 is a perfect estimate
+    ratios: Dict[str, List[float]] = defaultdict(list)
+    for (font_size, columns, orientation, text), fill in zip(cases, fills):
+        estimated = estimate_pages(text, font_size, columns, orientation)
+        if fill > 0.1:
+            ratios[font_size].append(fill / estimated)
+
+    worst = 0.0
+    print(f"{'font size':<14}{'cases':>6}{'mean ratio':>12}{'min':>8}{'max':>8}")
+    for font_size in AUTO_FONT_SIZES:
+        values = ratios[font_size]
+        if not values:
+            continue
+        mean = sum(values) / len(values)
+        worst = max(worst, abs(mean - 1))
+        print(f"{font_size:<14}{len(values):>6}{mean:>12.3f}{min(values):>8.3f}{max(values):>8.3f}")
+    print("\nA mean ratio above 1 means the estimate is optimistic: scale that size's CHAR_WIDTH_EM up by about the ratio.")
+
+    # How often auto-fit's first pick really fits one page
+    first_fit = 0
+    by_case = {case: fill for case, fill in zip(cases, fills)}
+    picks = 0
+    for text in texts:
+        for orientation in args.orientations:
+            picks += 1
+            font_size, columns = fit_layout(text, orientation)
+            first_fit += by_case[(font_size, columns, orientation, text)] <= 1
+    print(f"Auto-fit's first pick fit one page in {first_fit}/{picks} cases")
+
+    if args.check and (worst > args.tolerance or first_fit < picks):
+        print(f"Calibration check failed (tolerance {args.tolerance:.0%})")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the layout estimator against real pdflatex compiles")
+    parser.add_argument("--samples", type=int, default=6, help="Generated bullet sets")
+    parser.add_argument("--max-items", type=int, default=160, help="Largest bullet set")
+    parser.add_argument("--orientations", nargs="+", default=["portrait", "landscape"])
+    parser.add_argument("--jobs", type=int, default=4, help="Concurrent pdflatex processes")
+    parser.add_argument("--check", action="store_true", help="Exit 1 if any size is off by more than --tolerance")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
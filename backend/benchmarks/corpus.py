@@ -0,0 +1,88 @@
+import argparse
+import os
+import random
+from typing import List, Tuple
+
+import fitz
+
+WORDS = (
+    "theorem proof lemma matrix vector eigenvalue integral derivative limit series "
+    "function domain range graph node edge tree heap queue stack sort search hash "
+    "probability variance expectation distribution sample estimator bias entropy "
+    "gradient descent convergence bound complexity recursion invariant induction"
+).split()
+
+# Roughly one page of lecture notes
+WORDS_PER_PAGE = 450
+
+
+def generate_text(pages: int, seed: int = 0) -> str:
+    """Lecture-note-like text with headings and sentences, about `pages` pages long"""
+    rng = random.Random(seed)
+    paragraphs = []
+    for page in range(pages):
+        paragraphs.append(f"Section {page + 1}: {rng.choice(WORDS).capitalize()} {rng.choice(WORDS)}")
+        words = 0
+        while words < WORDS_PER_PAGE:
+            sentences = []
+            for _ in range(rng.randint(3, 6)):
+                length = rng.randint(6, 18)
+                sentences.append(" ".join(rng.choice(WORDS) for _ in range(length)).capitalize() + ".")
+                words += length
+            paragraphs.append(" ".join(sentences))
+    return "\n\n".join(paragraphs)
+
+
+def generate_pdf(pages: int, seed: int = 0) -> bytes:
+    """A PDF with `pages` pages of generated text"""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_number in range(pages):
+        page = doc.new_page()
+        text = generate_text(1, seed=rng.randrange(1 << 30)).replace("Section 1", f"Section {page_number + 1}")
+        page.insert_textbox(fitz.Rect(50, 50, 560, 790), text, fontsize=8)
+    try:
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def generate_upload(files: int, pages_per_file: int, kind: str = "mixed", seed: int = 0) -> List[Tuple[str, bytes, str]]:
+    """
+    Files for one upload as (filename, content, content type) tuples.
+
+    Args:
+        files (int): Number of files
+        pages_per_file (int): Pages of text in each file
+        kind (str): "pdf", "txt" or "mixed" (alternating)
+        seed (int): Different seeds give different content, so uploads don't hit the caches
+    """
+    upload = []
+    for i in range(files):
+        file_seed = seed * 1000 + i
+        as_pdf = kind == "pdf" or (kind == "mixed" and i % 2 == 0)
+        if as_pdf:
+            upload.append((f"notes_{i}.pdf", generate_pdf(pages_per_file, file_seed), "application/pdf"))
+        else:
+            upload.append((f"notes_{i}.txt", generate_text(pages_per_file, file_seed).encode("utf-8"), "text/plain"))
+    return upload
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic PDF/TXT corpus to disk")
+    parser.add_argument("output_dir")
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=10, help="Pages per file")
+    parser.add_argument("--kind", choices=("pdf", "txt", "mixed"), default="mixed")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for filename, content, _ in generate_upload(args.files, args.pages, args.kind, args.seed):
+        with open(os.path.join(args.output_dir, filename), "wb") as f:
+            f.write(content)
+        print(f"{filename}: {len(content):,} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+from typing import Dict, Optional
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+WORDS = "key result definition formula property example method rule case step".split()
+
+_SECTION_LINE = re.compile(r'^=== SECTION (\d+) ===', re.MULTILINE)
+_MAX_ITEMS = re.compile(r'at most (\d+) bullet')
+
+
+def create_app(
+    latency: float = 0.5,
+    jitter: float = 0.2,
+    rate_limit: float = 0.0,
+    bullets: int = 8,
+    words_per_bullet: int = 14,
+    seed: int = 0,
+    slow_fraction: float = 0.0,
+    slow_latency: float = 5.0,
+    model_latency: Optional[Dict[str, float]] = None,
+    max_concurrency: int = 0
+) -> Starlette:
+    """
+    A stand-in for the chat completions endpoint that answers in the app's expected formats.
+
+    Args:
+        latency (float): Mean response time in seconds
+        jitter (float): Response times are uniform in latency +/- jitter
+        rate_limit (float): Fraction of requests answered with a 429
+        bullets (int): Bullets per summary
+        words_per_bullet (int): Words per bullet
+        seed (int): Seed for latencies, 429s and generated text
+        slow_fraction (float): Fraction of requests that take slow_latency instead, to model a long tail
+        slow_latency (float): Response time of a slow request in seconds
+        model_latency (Optional[Dict[str, float]]): Mean response time of particular models, overriding latency
+        max_concurrency (int): Requests beyond this many in flight get a 429, like a per-key
+            concurrency limit; 0 means unlimited
+    """
+    rng = random.Random(seed)
+    model_latency = model_latency or {}
+    stats = {
+        "requests": 0, "rate_limited": 0, "over_concurrency": 0, "slow": 0, "models": {},
+        "in_flight": 0, "peak_in_flight": 0, "duplicates": 0,
+    }
+    seen = set()
+
+    def itemize(count: int) -> str:
+        items = "".join(
+            "\\item " + " ".join(rng.choice(WORDS) for _ in range(words_per_bullet)) + "\n"
+            for _ in range(count)
+        )
+        return "\\begin{itemize}\n" + items + "\\end{itemize}"
+
+    async def chat(request: Request) -> JSONResponse:
+        body = await request.json()
+        stats["requests"] += 1
+        stats["models"][body["model"]] = stats["models"].get(body["model"], 0) + 1
+        fingerprint = hashlib.sha256(json.dumps([body["model"], body["messages"]]).encode("utf-8")).digest()
+        if fingerprint in seen:
+            stats["duplicates"] += 1
+        seen.add(fingerprint)
+
+        if max_concurrency and stats["in_flight"] >= max_concurrency:
+            stats["over_concurrency"] += 1
+            return JSONResponse(
+                {"error": {"message": "Too many concurrent requests", "type": "requests"}},
+                status_code=429,
+                headers={"retry-after-ms": "200"}
+            )
+        stats["in_flight"] += 1
+        stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+        try:
+            return await respond(body)
+        finally:
+            stats["in_flight"] -= 1
+
+    async def respond(body: dict) -> JSONResponse:
+        if rng.random() < rate_limit:
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "requests"}},
+                status_code=429,
+                headers={"retry-after-ms": "200", "x-ratelimit-remaining-requests": "0"}
+            )
+
+        if rng.random() < slow_fraction:
+            stats["slow"] += 1
+            await asyncio.sleep(slow_latency)
+        else:
+            mean = model_latency.get(body["model"], latency)
+            await asyncio.sleep(max(0.0, mean + rng.uniform(-jitter, jitter)))
+
+        system, user = body["messages"][0]["content"], body["messages"][-1]["content"]
+        sections = _SECTION_LINE.findall(user) if "=== SECTION" in system else []
+        limit = _MAX_ITEMS.search(system)
+        if sections:
+            content = "\n".join(f"=== SECTION {number} ===\n{itemize(bullets)}" for number in sections)
+        else:
+            content = itemize(min(bullets, int(limit.group(1))) if limit else bullets)
+
+        prompt_tokens = sum(len(m["content"]) for m in body["messages"]) // 4
+        completion_tokens = len(content) // 4
+        return JSONResponse(
+            {
+                "choices": [{"message": {"role": "assistant", "content": content}}],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            },
+            headers={"x-ratelimit-remaining-requests": "1000", "x-ratelimit-remaining-tokens": "1000000"}
+        )
+
+    async def get_stats(request: Request) -> JSONResponse:
+        return JSONResponse(stats)
+
+    return Starlette(routes=[
+        Route("/v1/chat/completions", chat, methods=["POST"]),
+        Route("/stats", get_stats),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the OpenAI chat completions API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Fraction of requests answered with a 429")
+    parser.add_argument("--bullets", type=int, default=8)
+    parser.add_argument("--words-per-bullet", type=int, default=14)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--slow-fraction", type=float, default=0.0, help="Fraction of requests that take --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    parser.add_argument(
+        "--model-latency", action="append", default=[], metavar="MODEL=SECONDS",
+        help="Mean response time of one model, e.g. gpt-3.5-turbo=0.2; repeatable"
+    )
+    parser.add_argument("--max-concurrency", type=int, default=0, help="Answer requests beyond this many in flight with a 429")
+    args = parser.parse_args()
+
+    model_latency = {}
+    for item in args.model_latency:
+        model, _, seconds = item.partition("=")
+        model_latency[model] = float(seconds)
+    app = create_app(
+        args.latency, args.jitter, args.rate_limit, args.bullets, args.words_per_bullet, args.seed,
+        args.slow_fraction, args.slow_latency, model_latency, args.max_concurrency
+    )
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,111 +1,466 @@
 import os
 from dotenv import load_dotenv
-import tempfile
-from typing import List
-from fastapi import Form, File, UploadFile
 import asyncio
-import shutil
+import json
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from typing import List, Optional, Tuple
+from fastapi import Form, File, Request, UploadFile
 from pathlib import Path
 
 
 load_dotenv()
 
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi import FastAPI
-from utils.latex_gen import render_latex
-from utils.compile_latex import compile_latex_to_pdf
-from utils.text_extractor import extract_text_from_file
-from utils.chunker import chunk_text, count_tokens
-from utils.async_summarizer import summarize_all_chunks
+from utils.compile_latex import LatexCompiler
+from utils.text_extractor import extraction_cache, shutdown_extraction_pool
+from utils.chunker import warm_encoders
+from utils.async_summarizer import chunk_cache, chunk_packer, coordinator, inflight_chats, llm_client, model_router
+from utils.result_cache import ResultCache
+from utils.jobs import Job, JobManager, QueueFullError
+from utils.pipeline import CheatsheetPipeline, InputFileError, LayoutOptions
+from utils.admission import (
+    BodySizeLimitMiddleware, Reservation, SaturatedError, TokenBudget, UploadTooLargeError, parse_file_sizes,
+    read_upload
+)
+from utils.storage import PdfStorage
+from utils.metrics import BATCH_GROUPS, REGISTRY
+from utils.batch import parse_batch_manifest
+from utils.zipstream import ZipStream
+from utils.reducer import SummaryReducer
+from utils.dedup import BulletDeduplicator
+from utils.latex_lint import LatexLinter
 from fastapi.middleware.cors import CORSMiddleware
 
 # Create a directory for storing PDFs
 PDF_STORAGE_DIR = Path("pdf_storage")
 PDF_STORAGE_DIR.mkdir(exist_ok=True)
+# Kept at least as long as cached results point at them
+RESULT_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", str(24 * 3600)))
+
+# Finished cheat sheets, keyed by uploaded file contents + layout options
+result_cache = ResultCache(
+    PDF_STORAGE_DIR,
+    max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256")),
+    ttl_seconds=RESULT_TTL_SECONDS,
+    coordinator=coordinator
+)
+
+# pdflatex runs as async subprocesses; LATEX_SCRATCH_DIR can point at tmpfs (e.g. /dev/shm)
+latex_compiler = LatexCompiler(
+    max_concurrent_jobs=int(os.getenv("LATEX_MAX_JOBS", "2")),
+    timeout=float(os.getenv("LATEX_TIMEOUT_SECONDS", "60")),
+    scratch_dir=os.getenv("LATEX_SCRATCH_DIR"),
+    use_formats=os.getenv("LATEX_USE_FORMATS", "0") == "1",
+    format_dir=os.getenv("LATEX_FORMAT_DIR", "fmt_cache")
+)
+
+# Finished PDFs, stored once per distinct content and evicted by age and total size
+pdf_storage = PdfStorage(
+    PDF_STORAGE_DIR,
+    Path(latex_compiler.work_root),
+    max_bytes=int(os.getenv("PDF_STORAGE_MAX_BYTES", str(1024 * 1024 * 1024))),
+    ttl_seconds=float(os.getenv("PDF_STORAGE_TTL_SECONDS", str(RESULT_TTL_SECONDS))),
+    sweep_interval=float(os.getenv("PDF_STORAGE_SWEEP_SECONDS", "300"))
+)
+
+logger = logging.getLogger(__name__)
+
+# Merges chunk summaries in a tree until they fit the requested page budget
+summary_reducer = SummaryReducer(
+    llm_client,
+    fan_in=int(os.getenv("REDUCE_FAN_IN", "4")),
+    max_concurrency=int(os.getenv("REDUCE_MAX_CONCURRENCY", "4")),
+    max_rounds=int(os.getenv("REDUCE_MAX_ROUNDS", "6"))
+)
+
+# Near-duplicate bullets (Jaccard similarity of word shingles) are merged before layout
+bullet_deduplicator = BulletDeduplicator(threshold=float(os.getenv("DEDUP_THRESHOLD", "0.7")))
+
+# Model replies are checked and repaired before they reach pdflatex
+latex_linter = LatexLinter()
+
+pipeline = CheatsheetPipeline(
+    result_cache, latex_compiler, summary_reducer, bullet_deduplicator, pdf_storage, latex_linter, coordinator
+)
+
+async def run_cheatsheet_job(job: Job) -> dict:
+    files, options = job.payload
+    result = await pipeline.run(files, options, progress=job)
+    return {
+        "pdf_url": f"/download/{result.pdf_filename}",
+        "latex_code": result.latex_code
+    }
+
+# Background workers that run the pipeline; /upload and /jobs both feed this queue
+job_manager = JobManager(
+    run_cheatsheet_job,
+    workers=int(os.getenv("JOB_WORKERS", "4")),
+    max_queue=int(os.getenv("JOB_QUEUE_SIZE", "32")),
+    ttl_seconds=float(os.getenv("JOB_TTL_SECONDS", "3600"))
+)
+
+# Each group of a /batch request is one job, so batches share the workers, LLM limits and compilers
+MAX_BATCH_GROUPS = int(os.getenv("MAX_BATCH_GROUPS", "16"))
+
+# Uploads are bounded while they arrive, then estimated before any LLM call
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(200 * 1024 * 1024)))
+MAX_FILE_BYTES = int(os.getenv("MAX_FILE_BYTES", str(50 * 1024 * 1024)))
+MAX_UPLOAD_FILES = int(os.getenv("MAX_UPLOAD_FILES", "20"))
+MAX_UPLOAD_TOKENS = int(os.getenv("MAX_UPLOAD_TOKENS", "1000000"))
 
-app = FastAPI()
+# Estimated tokens of all uploads in progress; the rest queue fairly or are turned away with Retry-After
+token_budget = TokenBudget(
+    capacity=int(os.getenv("ADMISSION_TOKEN_BUDGET", "400000")),
+    tokens_per_minute=int(os.getenv("OPENAI_TPM", "40000")),
+    max_wait_seconds=float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "30")),
+    max_waiting_per_client=int(os.getenv("ADMISSION_MAX_WAITING_PER_CLIENT", "2"))
+)
+
+# Component counters (caches, queues, limiter) are read at scrape time
+for component, component_stats in (
+    ("result_cache", result_cache.stats),
+    ("chunk_cache", chunk_cache.stats),
+    ("extraction_cache", extraction_cache.stats),
+    ("latex", latex_compiler.stats),
+    ("jobs", job_manager.stats),
+    ("admission", token_budget.stats),
+    ("llm", llm_client.stats),
+    ("routes", model_router.stats),
+    ("reduce", summary_reducer.stats),
+    ("dedup", bullet_deduplicator.stats),
+    ("lint", latex_linter.stats),
+    ("storage", pdf_storage.stats),
+    ("packer", chunk_packer.stats),
+    ("inflight_uploads", pipeline.inflight.stats),
+    ("inflight_chats", inflight_chats.stats),
+):
+    REGISTRY.add_collector(component, component_stats)
+if coordinator is not None:
+    REGISTRY.add_collector("coordination", coordinator.stats)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load tokenizer encodings once instead of on the first upload
+    warm_encoders()
+    # Check for pdflatex once rather than before every compile
+    await latex_compiler.probe()
+    await job_manager.start()
+    await pdf_storage.start()
+    yield
+    await pdf_storage.stop()
+    await job_manager.stop()
+    await llm_client.aclose()
+    shutdown_extraction_pool()
+
+app = FastAPI(lifespan=lifespan)
 
+# Added first so that it runs inside CORS, and its 413s carry CORS headers too
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=MAX_REQUEST_BYTES)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],  # your frontend origin
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
+@app.exception_handler(UploadTooLargeError)
+async def upload_too_large(request: Request, e: UploadTooLargeError):
+    return JSONResponse(status_code=413, content={"error": e.detail})
+
+@app.exception_handler(InputFileError)
+async def input_file_error(request: Request, e: InputFileError):
+    return JSONResponse(status_code=400, content={"error": str(e)})
+
+@app.exception_handler(SaturatedError)
+async def saturated(request: Request, e: SaturatedError):
+    return JSONResponse(
+        status_code=e.status_code,
+        content={"error": str(e), "retry_after": e.retry_after},
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
 @app.get("/")
 def home():
     return {"message": "Backend is working!"}
 
+async def read_files(files: List[UploadFile], max_files: int = MAX_UPLOAD_FILES) -> List[Tuple[str, bytes]]:
+    """Read the uploads now, within the size limits; they are closed once the request returns"""
+    if len(files) > max_files:
+        raise UploadTooLargeError(f"At most {max_files} files can be uploaded at once")
+    return [(file.filename, await read_upload(file, MAX_FILE_BYTES)) for file in files]
+
+async def admit(request: Request, uploads: List[Tuple[List[Tuple[str, bytes]], LayoutOptions]]) -> Reservation:
+    """
+    Estimate the uploads' LLM tokens and reserve them, before any model call.
+
+    A saturated server refuses before looking at the files at all; otherwise
+    tokens are guessed from file sizes and page counts, so nothing is
+    extracted or tokenized until the upload has been admitted.
+
+    Raises:
+        InputFileError: If a file is not a PDF or TXT file, or a PDF cannot be opened
+        UploadTooLargeError: If one upload would need more than MAX_UPLOAD_TOKENS
+        SaturatedError: If the server cannot take them on soon enough
+    """
+    client = request.client.host if request.client else ""
+    token_budget.check(client)
+    estimates = await asyncio.gather(*(pipeline.estimate(contents, options) for contents, options in uploads))
+    for estimate in estimates:
+        if estimate.total_tokens > MAX_UPLOAD_TOKENS:
+            raise UploadTooLargeError(
+                f"This upload needs about {estimate.total_tokens} tokens, more than the {MAX_UPLOAD_TOKENS} allowed"
+            )
+    tokens = sum(estimate.total_tokens for estimate in estimates)
+    return await token_budget.acquire(client, tokens)
+
+# Tasks that hand a reservation back once its jobs finish
+_releases = set()
+
+def release_when_done(reservation: Reservation, jobs: List[Job]) -> None:
+    task = asyncio.ensure_future(asyncio.gather(*(job.wait() for job in jobs)))
+    _releases.add(task)
+
+    def release(task: asyncio.Future) -> None:
+        _releases.discard(task)
+        token_budget.release(reservation)
+
+    task.add_done_callback(release)
+
+async def submit_job(request: Request, files: List[UploadFile], options: LayoutOptions) -> Job:
+    contents = await read_files(files)
+    reservation = await admit(request, [(contents, options)])
+    try:
+        job = job_manager.submit((contents, options))
+    except QueueFullError:
+        token_budget.release(reservation)
+        raise
+    release_when_done(reservation, [job])
+    return job
+
+def queue_full_response(e: QueueFullError) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"error": str(e)},
+        headers={"Retry-After": "10"}
+    )
+
 @app.post("/upload")
 async def upload_files(
+    request: Request,
     files: List[UploadFile] = File(...),
     font_size: str = Form(...),
     columns: int = Form(...),
-    orientation: str = Form(...)
+    orientation: str = Form(...),
+    max_pages: Optional[int] = Form(None)
 ):
     try:
-        # Extract text from all files
-        all_text = ""
-        for file in files:
-            try:
-                text = await extract_text_from_file(file)
-                all_text += text + "\n\n"  # Add spacing between files
-            except ValueError as e:
-                return JSONResponse(
-                    status_code=400,
-                    content={"error": f"Error processing {file.filename}: {str(e)}"}
-                )
-        
-        # Count total tokens
-        total_tokens = count_tokens(all_text)
-        
-        # If text is too long, chunk it
-        if total_tokens > 4000:  # Adjust this threshold as needed
-            text_chunks = chunk_text(all_text, max_tokens=4000, overlap_tokens=200)
-            processed_chunks = await summarize_all_chunks(text_chunks)
-            ai_generated_text = "\n".join(processed_chunks)
-        else:
-            # Process the entire text at once
-            processed_chunks = await summarize_all_chunks([all_text])
-            ai_generated_text = processed_chunks[0]
-        
-        # Generate LaTeX and compile to PDF
-        latex_content = render_latex(ai_generated_text, "\\" + font_size, columns, orientation)
-        temp_pdf = compile_latex_to_pdf(latex_content)
-        
-        # Generate a unique filename
-        pdf_filename = f"cheatsheet_{os.urandom(8).hex()}.pdf"
-        pdf_path = PDF_STORAGE_DIR / pdf_filename
-        
-        # Copy the PDF to our storage directory
-        shutil.copy2(temp_pdf, pdf_path)
-        
+        job = await submit_job(request, files, LayoutOptions(font_size, columns, orientation, max_pages))
+    except QueueFullError as e:
+        return queue_full_response(e)
+
+    await job.wait()
+    if job.status == "done":
         # Return both PDF and LaTeX content
-        return JSONResponse(
-            content={
-                "pdf_url": f"/download/{pdf_filename}",
-                "latex_code": latex_content
-            }
-        )
-        
-    except Exception as e:
-        return JSONResponse(
-            status_code=500,
-            content={"error": f"An error occurred: {str(e)}"}
-        )
+        return JSONResponse(content=job.result)
+    if job.error_status == 400:
+        return JSONResponse(status_code=400, content={"error": job.error})
+    return JSONResponse(
+        status_code=500,
+        content={"error": f"An error occurred: {job.error}"}
+    )
+
+@app.post("/jobs")
+async def create_job(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    font_size: str = Form(...),
+    columns: int = Form(...),
+    orientation: str = Form(...),
+    max_pages: Optional[int] = Form(None)
+):
+    try:
+        job = await submit_job(request, files, LayoutOptions(font_size, columns, orientation, max_pages))
+    except QueueFullError as e:
+        return queue_full_response(e)
+    return JSONResponse(
+        status_code=202,
+        content={
+            "job_id": job.id,
+            "status_url": f"/jobs/{job.id}",
+            "events_url": f"/jobs/{job.id}/events"
+        }
+    )
+
+@app.post("/estimate")
+async def estimate_upload(
+    files: List[UploadFile] = File(None),
+    sizes: Optional[str] = Form(None),
+    font_size: str = Form(...),
+    columns: int = Form(...),
+    orientation: str = Form(...),
+    max_pages: Optional[int] = Form(None)
+):
+    # The same guess admission makes; sizes lets a client ask before uploading anything
+    if sizes is not None:
+        try:
+            file_sizes = parse_file_sizes(sizes, MAX_UPLOAD_FILES, MAX_FILE_BYTES)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+        estimate = pipeline.estimate_sizes(file_sizes)
+    elif files:
+        contents = await read_files(files)
+        estimate = await pipeline.estimate(contents, LayoutOptions(font_size, columns, orientation, max_pages))
+    else:
+        return JSONResponse(status_code=400, content={"error": "Send either files or sizes"})
+    return {
+        **asdict(estimate),
+        "max_upload_tokens": MAX_UPLOAD_TOKENS,
+        "expected_wait_seconds": round(token_budget.expected_wait(estimate.total_tokens), 1),
+        "admission": token_budget.stats(),
+    }
+
+@app.post("/batch")
+async def create_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    groups: str = Form(...),
+    font_size: Optional[str] = Form(None),
+    columns: Optional[int] = Form(None),
+    orientation: Optional[str] = Form(None),
+    max_pages: Optional[int] = Form(None)
+):
+    defaults = {"font_size": font_size, "columns": columns, "orientation": orientation, "max_pages": max_pages}
+    try:
+        batch = parse_batch_manifest(groups, [file.filename for file in files], defaults, MAX_BATCH_GROUPS)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    contents = await read_files(files, MAX_UPLOAD_FILES * len(batch))
+    uploads = [([contents[index] for index in group.files], group.options) for group in batch]
+    reservation = await admit(request, uploads)
+    try:
+        jobs = job_manager.submit_many(uploads)
+    except QueueFullError as e:
+        token_budget.release(reservation)
+        return queue_full_response(e)
+    release_when_done(reservation, jobs)
+
+    async def archive():
+        zip_stream = ZipStream()
+        manifest = []
+        pending = {asyncio.ensure_future(job.wait()): (group, job) for group, job in zip(batch, jobs)}
+        try:
+            # Each PDF goes out as soon as its group finishes, whatever the manifest order
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for waiter in done:
+                    group, job = pending.pop(waiter)
+                    entry = {"name": group.name, "job_id": job.id, "status": job.status}
+                    pdf_filename = job.result["pdf_url"].rsplit("/", 1)[-1] if job.status == "done" else None
+                    file_path = pdf_storage.path(pdf_filename) if pdf_filename else None
+                    if file_path is not None:
+                        pdf_storage.touch(pdf_filename)
+                        for data in zip_stream.add_file(f"{group.name}.pdf", str(file_path)):
+                            yield data
+                        entry["file"] = f"{group.name}.pdf"
+                        BATCH_GROUPS.inc(outcome="done")
+                    else:
+                        entry["status"] = "failed"
+                        entry["error"] = job.error or "PDF is no longer stored"
+                        BATCH_GROUPS.inc(outcome="failed")
+                    manifest.append(entry)
+        finally:
+            # The client went away; the jobs still finish and fill the caches
+            for waiter in pending:
+                waiter.cancel()
+
+        # The response has already started, so failures are reported inside the archive
+        yield zip_stream.add_bytes("manifest.json", json.dumps({"groups": manifest}, indent=2).encode("utf-8"))
+        yield zip_stream.close()
+
+    return StreamingResponse(
+        archive(),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="cheatsheets.zip"', "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found"})
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found"})
+
+    async def event_stream():
+        async for event in job.stream_events():
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/stats")
+def stats():
+    return {
+        "result_cache": result_cache.stats(),
+        "chunk_cache": chunk_cache.stats(),
+        "extraction_cache": extraction_cache.stats(),
+        "latex": latex_compiler.stats(),
+        "jobs": job_manager.stats(),
+        "admission": token_budget.stats(),
+        "llm": llm_client.stats(),
+        "routes": model_router.stats(),
+        "reduce": summary_reducer.stats(),
+        "dedup": bullet_deduplicator.stats(),
+        "lint": latex_linter.stats(),
+        "storage": pdf_storage.stats(),
+        "packer": chunk_packer.stats(),
+        "inflight": {
+            "uploads": pipeline.inflight.stats(),
+            "chats": inflight_chats.stats(),
+        },
+        "coordination": coordinator.stats() if coordinator is not None else None,
+    }
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/download/{filename}")
-async def download_file(filename: str):
-    file_path = PDF_STORAGE_DIR / filename
-    if not file_path.exists():
+async def download_file(filename: str, request: Request):
+    file_path = pdf_storage.path(filename)
+    if file_path is None:
         return JSONResponse(
             status_code=404,
             content={"error": "PDF file not found"}
         )
+    pdf_storage.touch(filename)
+
+    # Stored files never change, so the name-derived ETag is enough to revalidate
+    etag = pdf_storage.etag(filename)
+    cache_headers = {"ETag": etag, "Cache-Control": "private, max-age=86400, immutable"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=cache_headers)
+
+    # FileResponse answers Range and If-Range requests with 206 partial content
     return FileResponse(
         path=str(file_path),
         media_type="application/pdf",
-        filename="cheatsheet.pdf"
+        filename="cheatsheet.pdf",
+        headers=cache_headers
     )
 
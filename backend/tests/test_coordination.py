@@ -0,0 +1,81 @@
+import asyncio
+import multiprocessing
+import os
+
+from utils.coordination import Coordinator, SharedSemaphore
+
+SPAWN = multiprocessing.get_context("spawn")
+
+
+def _hold_the_semaphore(db_path: str, log_path: str, rounds: int) -> None:
+    """Enter a one-slot shared semaphore repeatedly, logging each entry and exit"""
+    async def run():
+        semaphore = SharedSemaphore(Coordinator(db_path), "compile", limit=1, poll_interval=0.001)
+        for _ in range(rounds):
+            async with semaphore:
+                with open(log_path, "a") as log:
+                    log.write(f"enter {os.getpid()}\n")
+                await asyncio.sleep(0.005)
+                with open(log_path, "a") as log:
+                    log.write(f"exit {os.getpid()}\n")
+
+    asyncio.run(run())
+
+
+def _claim_and_hang(db_path: str, claimed) -> None:
+    """Take a lease and a slot that never expire on their own, then wait to be killed"""
+    coordinator = Coordinator(db_path)
+    holder = coordinator.holder_id()
+    assert coordinator.claim_lease("doc", holder, lease_seconds=3600)
+    assert coordinator.claim_slot("compile", 1, holder, lease_seconds=3600)[0]
+    claimed.set()
+    SPAWN.Event().wait()
+
+
+def test_shared_semaphore_excludes_across_processes(tmp_path):
+    db_path = str(tmp_path / "coordination.db")
+    log_path = str(tmp_path / "log.txt")
+    Coordinator(db_path)
+    workers = [SPAWN.Process(target=_hold_the_semaphore, args=(db_path, log_path, 20)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    with open(log_path) as log:
+        events = log.read().split("\n")[:-1]
+    assert len(events) == 80
+    assert len({event.split()[1] for event in events}) == 2
+    # With one slot, every entry is followed by the same process's exit
+    for enter, exit in zip(events[::2], events[1::2]):
+        assert enter.startswith("enter ")
+        assert exit == "exit " + enter.split()[1]
+
+
+def test_killed_process_leases_and_slots_are_recovered(tmp_path):
+    db_path = str(tmp_path / "coordination.db")
+    coordinator = Coordinator(db_path)
+    holder = coordinator.holder_id()
+    claimed = SPAWN.Event()
+    worker = SPAWN.Process(target=_claim_and_hang, args=(db_path, claimed))
+    worker.start()
+    try:
+        assert claimed.wait(60)
+        assert not coordinator.claim_lease("doc", holder, lease_seconds=60)
+        assert not coordinator.claim_slot("compile", 1, holder, lease_seconds=60)[0]
+    finally:
+        worker.kill()
+        # Reap it, or its pid still looks alive
+        worker.join()
+
+    assert coordinator.claim_lease("doc", holder, lease_seconds=60)
+    assert coordinator.claim_slot("compile", 1, holder, lease_seconds=60) == (True, 1)
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    coordinator = Coordinator(str(tmp_path / "coordination.db"))
+    first, second = coordinator.holder_id(), coordinator.holder_id()
+    assert coordinator.claim_lease("doc", first, lease_seconds=-1)
+    assert coordinator.claim_lease("doc", second, lease_seconds=60)
+    assert not coordinator.claim_lease("doc", first, lease_seconds=60)
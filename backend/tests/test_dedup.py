@@ -0,0 +1,93 @@
+import pytest
+
+from utils.dedup import BulletDeduplicator
+
+TWO_LISTS = (
+    "\\section*{Greek}\n"
+    "\\begin{itemize}\n"
+    "\\item Alpha is the first letter of the Greek alphabet\n"
+    "\\item Beta is the second letter of the Greek alphabet\n"
+    "\\end{itemize}\n"
+    "Some text between the lists.\n"
+    "\\begin{itemize}\n"
+    "\\item Gamma is the third letter of the Greek alphabet\n"
+    "\\item Delta is the fourth letter of the Greek alphabet\n"
+    "\\end{itemize}\n"
+)
+
+NESTED = (
+    "\\begin{itemize}\n"
+    "\\item Sorting algorithms compared by running time\n"
+    "  \\begin{itemize}\n"
+    "  \\item Merge sort runs in n log n time\n"
+    "  \\item Quick sort runs in n log n time on average\n"
+    "  \\end{itemize}\n"
+    "\\item Alpha is the first letter of the Greek alphabet and starts words\n"
+    "\\end{itemize}\n"
+    "\\begin{enumerate}\n"
+    "\\item Binary search halves the interval every step\n"
+    "\\end{enumerate}\n"
+)
+
+DUPLICATES = (
+    "\\begin{itemize}\n"
+    "\\item Beta is the second letter of the Greek alphabet\n"
+    "\\end{itemize}\n"
+    "\\begin{itemize}\n"
+    "\\item Binary search halves the interval every step\n"
+    "\\item Hash tables give constant expected lookup time\n"
+    "\\end{itemize}\n"
+)
+
+
+@pytest.fixture
+def deduplicator():
+    return BulletDeduplicator()
+
+
+def test_multiple_lists_are_kept_once(deduplicator):
+    result, report = deduplicator.dedup([TWO_LISTS])
+    assert result == [TWO_LISTS]
+    assert report.bullets == 4
+    assert report.removed == 0
+    assert report.chars_removed == 0
+
+
+def test_near_duplicates_across_chunks(deduplicator):
+    summaries = [TWO_LISTS, NESTED, DUPLICATES]
+    result, report = deduplicator.dedup(summaries)
+
+    text = "".join(result)
+    for word in ("Alpha", "Beta", "Gamma", "Delta", "Merge sort", "Binary search"):
+        assert word in text
+    assert text.count("Gamma") == 1
+    assert text.count("Beta is") == 1
+    assert text.count("Binary search") == 1
+    # The longer wording of a duplicate replaces the first one
+    assert "and starts words" in text
+    # The list whose only bullet was a duplicate goes entirely, leaving no empty itemize
+    assert text.count("\\begin{") == text.count("\\end{")
+    assert "\\begin{itemize}\n\\end{itemize}" not in text
+
+    assert report.removed == 3
+    assert report.chars_removed >= 0
+
+
+def test_nested_items_stay_with_their_parent(deduplicator):
+    result, _ = deduplicator.dedup([NESTED])
+    assert result == [NESTED]
+
+
+def test_dedup_is_idempotent(deduplicator):
+    once, _ = deduplicator.dedup([TWO_LISTS, NESTED, DUPLICATES, TWO_LISTS])
+    twice, report = deduplicator.dedup(once)
+    assert twice == once
+    assert report.removed == 0
+    assert report.chars_removed == 0
+
+
+def test_summary_without_lists_is_unchanged(deduplicator):
+    summary = "\\section*{Notes}\nJust a paragraph.\n"
+    result, report = deduplicator.dedup([summary, summary])
+    assert result == [summary, summary]
+    assert report.bullets == 0
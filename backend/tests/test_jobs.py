@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from utils.jobs import JobManager, QueueFullError
+
+
+def test_stop_finishes_running_and_queued_jobs():
+    async def run():
+        release = asyncio.Event()
+
+        async def runner(job):
+            await release.wait()
+            return {}
+
+        manager = JobManager(runner, workers=1, max_queue=4)
+        await manager.start()
+        running, queued = manager.submit("a"), manager.submit("b")
+        await asyncio.sleep(0)
+        assert running.status == "running"
+
+        await manager.stop()
+        # Waiters such as /upload and the token budget's release are woken, not left hanging
+        await asyncio.wait_for(asyncio.gather(running.wait(), queued.wait()), timeout=1)
+        for job in (running, queued):
+            assert job.status == "failed"
+            assert job.error_status == 503
+        with pytest.raises(QueueFullError):
+            manager.submit("c")
+
+    asyncio.run(run())
+
+
+def test_partial_texts_are_dropped_once_the_job_finishes():
+    async def run():
+        async def runner(job):
+            job.partial(0, "\\begin{itemize}\\item a long summary\\end{itemize}")
+            job.partial(1, "\\begin{itemize}\\item another\\end{itemize}")
+            return {"latex_code": "done"}
+
+        manager = JobManager(runner, workers=1)
+        await manager.start()
+        job = manager.submit("a")
+        await job.wait()
+        await manager.stop()
+
+        partials = [event["data"] for event in job.events if event["event"] == "partial"]
+        assert partials == [{"index": 0}, {"index": 1}]
+        assert job.events[-1] == {"event": "done", "data": {"latex_code": "done"}}
+
+    asyncio.run(run())
@@ -0,0 +1,66 @@
+import pytest
+
+from utils.latex_lint import LatexLinter, _Scanner
+
+
+def lint(body: str):
+    result = LatexLinter().lint(f"\\begin{{itemize}}\n\\item {body}\n\\end{{itemize}}")
+    # A sound repair is left alone by a second pass
+    check = _Scanner(result.latex)
+    assert check.run().strip() == result.latex
+    assert not check.repairs
+    assert not result.isolated
+    return result
+
+
+def item(result) -> str:
+    return result.latex.split("\\item ", 1)[1].rsplit("\n\\end{itemize}", 1)[0]
+
+
+def test_verb_argument_is_untouched():
+    result = lint(r"call \verb|x_y| or \verb*+a^b+ here")
+    assert item(result) == r"call \verb|x_y| or \verb*+a^b+ here"
+    assert result.repairs == []
+
+
+def test_verbatim_environment_is_untouched():
+    code = "x_y = $5 % {\n  if a^b: pass\n"
+    result = LatexLinter().lint(f"\\begin{{itemize}}\n\\item Code\n\\begin{{verbatim}}\n{code}\\end{{verbatim}}\n\\end{{itemize}}")
+    assert f"\\begin{{verbatim}}\n{code}\\end{{verbatim}}" in result.latex
+    assert result.repairs == []
+
+
+def test_lstlisting_becomes_verbatim_with_its_contents_untouched():
+    code = "\nprint(a_b, 100 % 7)\n"
+    result = LatexLinter().lint(
+        f"\\begin{{itemize}}\n\\item Code\n\\begin{{lstlisting}}[language=Python]{code}\\end{{lstlisting}}\n\\end{{itemize}}"
+    )
+    assert f"\\begin{{verbatim}}{code}\\end{{verbatim}}" in result.latex
+    assert "lstlisting" not in result.latex
+    assert not result.isolated
+
+
+@pytest.mark.parametrize("body, expected", [
+    ("runs in O(n^2) time", "runs in O($n^2$) time"),
+    ("the term x_i^2 grows", "the term $x_i^2$ grows"),
+    ("sum of a_{ij}, then more", "sum of $a_{ij}$, then more"),
+    ("ratio \\frac{a}{b}) holds", "ratio $\\frac{a}{b}$) holds"),
+    ("there are 2^10 keys", "there are $2^{10}$ keys"),
+    ("see file_name.txt", "see file\\_name.txt"),
+])
+def test_stray_math_wraps_only_the_atom(body, expected):
+    assert item(lint(body)) == expected
+
+
+def test_dollar_amounts_are_escaped():
+    assert item(lint("costs $5 and $10, or $2^n$ in total")) == r"costs \$5 and \$10, or $2^n$ in total"
+
+
+def test_known_unicode_becomes_math():
+    assert item(lint("for x ∈ ℝ")) == r"for x $\in$ $\mathbb{R}$"
+
+
+def test_unknown_unicode_leaves_a_visible_placeholder():
+    result = lint("a ⊕ b and $a ⊕ b$")
+    assert item(result) == r"a [U+2295] b and $a \mbox{[U+2295]} b$"
+    assert result.repairs == ["unicode", "unicode"]
@@ -0,0 +1,57 @@
+import asyncio
+import random
+import shutil
+
+import pytest
+
+from benchmarks.calibrate_layout import generate_bullets, measure
+from utils.compile_latex import LatexCompiler
+from utils.layout import AUTO_COLUMNS, AUTO_FONT_SIZES, estimate_pages, fit_layout
+
+pytestmark = pytest.mark.skipif(shutil.which("pdflatex") is None, reason="calibration needs real pdflatex compiles")
+
+# Largest allowed gap between the mean measured/estimated fill ratio and 1, per font size
+TOLERANCE = 0.1
+ORIENTATIONS = ("portrait", "landscape")
+
+
+@pytest.fixture(scope="module")
+def fills(tmp_path_factory):
+    texts = [generate_bullets(random.Random(sample).randint(20, 160), seed=sample) for sample in range(4)]
+    cases = [
+        (font_size, columns, orientation, text)
+        for text in texts
+        for orientation in ORIENTATIONS
+        for font_size in AUTO_FONT_SIZES
+        for columns in AUTO_COLUMNS
+    ]
+
+    async def run():
+        compiler = LatexCompiler(max_concurrent_jobs=4, scratch_dir=str(tmp_path_factory.mktemp("calibrate")))
+        return await asyncio.gather(*(measure(compiler, text, f, c, o) for f, c, o, text in cases), return_exceptions=True)
+
+    measured = asyncio.run(run())
+    errors = [fill for fill in measured if isinstance(fill, Exception)]
+    assert not errors, f"{len(errors)} compiles could not be measured, e.g.: {errors[0]}"
+    return texts, dict(zip(cases, measured))
+
+
+@pytest.mark.parametrize("font_size", AUTO_FONT_SIZES)
+def test_estimate_pages_is_within_tolerance(fills, font_size):
+    _, by_case = fills
+    ratios = [
+        fill / estimate_pages(text, size, columns, orientation)
+        for (size, columns, orientation, text), fill in by_case.items()
+        if size == font_size and fill > 0.1
+    ]
+    assert ratios
+    mean = sum(ratios) / len(ratios)
+    assert abs(mean - 1) <= TOLERANCE, f"{font_size}: measured/estimated fill averages {mean:.3f}"
+
+
+def test_fit_layout_first_pick_fits_one_page(fills):
+    texts, by_case = fills
+    for text in texts:
+        for orientation in ORIENTATIONS:
+            font_size, columns = fit_layout(text, orientation)
+            assert by_case[(font_size, columns, orientation, text)] <= 1
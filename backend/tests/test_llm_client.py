@@ -0,0 +1,79 @@
+import asyncio
+
+import httpx
+
+from utils.llm_client import LatencyWindow, LLMClient
+
+MESSAGES = [{"role": "user", "content": "Summarize this"}]
+
+
+def reply(used: int) -> httpx.Response:
+    return httpx.Response(
+        200, json={"choices": [{"message": {"content": "ok"}}], "usage": {"total_tokens": used}}
+    )
+
+
+def make_client(handler, **kwargs) -> LLMClient:
+    client = LLMClient("key", base_url="http://llm.test", tokens_per_minute=6000, backoff_base=0.01, **kwargs)
+    client._client = httpx.AsyncClient(base_url=client.base_url, transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_losing_hedge_copy_gives_its_tokens_back():
+    calls = 0
+
+    async def handler(request):
+        nonlocal calls
+        calls += 1
+        # The primary stalls, so the hedged copy wins
+        await asyncio.sleep(1.0 if calls == 1 else 0.0)
+        return reply(50)
+
+    async def run():
+        client = make_client(handler, hedge_min_samples=1, hedge_max_ratio=1.0)
+        # A window of one fast sample makes any stall worth hedging
+        client._latencies["gpt-4"] = LatencyWindow()
+        client._latencies["gpt-4"].add(0.05)
+        assert await client.chat(MESSAGES, "gpt-4", 0.0, max_tokens=500, prompt_tokens=100) == "ok"
+        await asyncio.sleep(0.05)
+        assert client.hedged == 1 and client.hedge_wins == 1
+        # Only the winner's 50 tokens stay charged; the cancelled primary's 600 came back
+        assert client.limiter._available()[1] >= 6000 - 50 - 1
+
+    asyncio.run(run())
+
+
+def test_failed_attempts_give_their_tokens_back():
+    calls = 0
+
+    async def handler(request):
+        nonlocal calls
+        calls += 1
+        return httpx.Response(500) if calls == 1 else reply(50)
+
+    async def run():
+        client = make_client(handler, hedge_quantile=None)
+        assert await client.chat(MESSAGES, "gpt-4", 0.0, max_tokens=500, prompt_tokens=100) == "ok"
+        assert client.retries == 1
+        assert client.limiter._available()[1] >= 6000 - 50 - 1
+
+    asyncio.run(run())
+
+
+def test_latency_window_times_only_the_http_call():
+    async def handler(request):
+        return reply(50)
+
+    async def run():
+        # One request left, refilling every 0.3s: the second chat waits for the bucket
+        client = make_client(handler, hedge_quantile=None)
+        client.limiter._requests = 1
+        client.limiter.requests_per_minute = 200
+        await client.chat(MESSAGES, "gpt-4", 0.0, prompt_tokens=10)
+        await client.chat(MESSAGES, "gpt-4", 0.0, prompt_tokens=10)
+        assert client.limiter.wait_seconds > 0.2
+        window = client._latencies["gpt-4"]
+        assert len(window) == 2
+        assert window.percentile(100) < 0.1
+
+    asyncio.run(run())
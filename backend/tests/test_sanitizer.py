@@ -0,0 +1,41 @@
+import random
+
+import pytest
+
+from benchmarks.bench_sanitizer import generate_document, generate_fuzz_case, reference_sanitize
+from utils.sanitizer import get_sanitizer
+
+DOCUMENTS = [generate_document(5, seed=seed) for seed in range(20)]
+FUZZ_CASES = [generate_fuzz_case(random.Random(seed)) for seed in range(5000)]
+EDGE_CASES = ["", " ", "\n", "\t\n ", " a ", "a ( b ) [ c ] .", " x ", "•»–", "x\n\n\n\ny"]
+
+
+@pytest.fixture(scope="module")
+def sanitizer():
+    return get_sanitizer()
+
+
+@pytest.mark.parametrize("text", DOCUMENTS + EDGE_CASES)
+def test_sanitize_matches_reference(sanitizer, text):
+    assert sanitizer.sanitize(text) == reference_sanitize(sanitizer, text)
+
+
+def test_sanitize_matches_reference_on_fuzz_cases(sanitizer):
+    mismatches = [text for text in FUZZ_CASES if sanitizer.sanitize(text) != reference_sanitize(sanitizer, text)]
+    assert mismatches == []
+
+
+def test_cleanup_text_matches_cleanup_patterns(sanitizer):
+    for text in DOCUMENTS + FUZZ_CASES + EDGE_CASES:
+        expected = text
+        for pattern, repl in sanitizer.compiled_cleanup:
+            expected = pattern.sub(repl, expected)
+        assert sanitizer.cleanup_text(text) == expected, repr(text)
+
+
+def test_remove_noise_matches_removal_patterns(sanitizer):
+    for text in DOCUMENTS + FUZZ_CASES + EDGE_CASES:
+        expected = text
+        for pattern in sanitizer.compiled_patterns:
+            expected = pattern.sub('', expected)
+        assert sanitizer.remove_noise(text) == expected, repr(text)
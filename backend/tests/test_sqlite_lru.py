@@ -0,0 +1,44 @@
+from utils.chunk_cache import ChunkSummaryCache
+from utils.extraction_cache import ExtractionCache
+
+
+def test_evicts_least_recently_used_past_max_bytes(tmp_path):
+    cache = ChunkSummaryCache(str(tmp_path / "summaries.sqlite3"), max_bytes=30, touch_batch=100)
+    cache.put("a", "x" * 10, 100)
+    cache.put("b", "y" * 10, 100)
+    # A hit on a is written with the next store, so b is now the least recently used
+    assert cache.get("a") == "x" * 10
+    cache.put("c", "z" * 15, 100)
+
+    assert cache.peek("b") is None
+    assert cache.peek("a") == "x" * 10
+    assert cache.peek("c") == "z" * 15
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["bytes"] == 25
+    assert stats["hits"] == 1
+    assert stats["bytes_saved"] == 110
+
+
+def test_total_survives_replacing_and_reopening(tmp_path):
+    path = str(tmp_path / "summaries.sqlite3")
+    cache = ChunkSummaryCache(path)
+    cache.put("a", "x" * 10, 0)
+    cache.put("a", "x" * 4, 0)
+    cache.put("b", "y" * 6, 0)
+    assert cache.stats()["bytes"] == 10
+    assert ChunkSummaryCache(path).stats()["bytes"] == 10
+
+
+def test_extraction_cache_round_trip(tmp_path):
+    cache = ExtractionCache(str(tmp_path / "texts.sqlite3"))
+    key = cache.make_key("notes.pdf", b"%PDF-1.4 contents")
+    assert cache.get(key) is None
+    cache.put(key, "Extracted text " * 20, 1234)
+    assert cache.get(key) == "Extracted text " * 20
+
+    stats = cache.stats()
+    assert stats["entries"] == 1
+    assert stats["text_bytes"] == len("Extracted text " * 20)
+    assert stats["hit_rate"] == 0.5
+    assert stats["bytes_parsed_saved"] == 1234
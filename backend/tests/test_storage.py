@@ -0,0 +1,40 @@
+import os
+import time
+
+from utils.storage import PdfStorage
+
+PARTIAL = ".cheatsheet_0123456789abcdef0123456789abcdef.pdf.4242.123456789"
+
+
+def _age(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_sweep_removes_stale_partial_copies(tmp_path):
+    storage = PdfStorage(tmp_path / "pdfs", tmp_path / "scratch", scratch_max_age=60)
+    stale = storage.root / PARTIAL
+    fresh = storage.root / PARTIAL.replace("4242", "4343")
+    unrelated = storage.root / ".keep"
+    for path in (stale, fresh, unrelated):
+        path.write_bytes(b"%PDF")
+    _age(stale, 120)
+    _age(unrelated, 120)
+
+    storage.sweep()
+
+    assert not stale.exists()
+    assert fresh.exists()
+    assert unrelated.exists()
+    assert storage.stats()["partials_removed"] == 1
+
+
+def test_store_leaves_no_partial_copy(tmp_path):
+    storage = PdfStorage(tmp_path / "pdfs", tmp_path / "scratch")
+    source = tmp_path / "document.pdf"
+    source.write_bytes(b"%PDF-1.4 test")
+
+    filename = storage.store(str(source))
+
+    assert sorted(os.listdir(storage.root)) == [filename]
+    assert storage.path(filename).read_bytes() == b"%PDF-1.4 test"
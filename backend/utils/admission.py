@@ -0,0 +1,291 @@
+import asyncio
+import json
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Tuple
+
+from fastapi import HTTPException, UploadFile
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# Request body size is checked on these paths, while the body is still arriving
+UPLOAD_PATHS = ("/upload", "/jobs", "/batch", "/estimate")
+
+class UploadTooLargeError(HTTPException):
+    """An upload exceeded a size limit; reported to the client as a 413"""
+
+    def __init__(self, message: str):
+        super().__init__(status_code=413, detail=message)
+
+class SaturatedError(Exception):
+    def __init__(self, message: str, status_code: int, retry_after: float):
+        """
+        The server cannot take on this upload's tokens soon enough.
+
+        Args:
+            message (str): Shown to the client
+            status_code (int): 429 when this client already has too much queued, 503 when everyone does
+            retry_after (float): Seconds until a retry is likely to be admitted
+        """
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = max(1, math.ceil(retry_after))
+
+class BodySizeLimitMiddleware:
+    def __init__(self, app, max_bytes: int, paths=UPLOAD_PATHS):
+        """
+        Reject request bodies over max_bytes on upload paths without reading them to the end.
+
+        A declared Content-Length over the limit is refused before any of
+        the body is read; otherwise bytes are counted as they arrive and the
+        multipart parser is stopped once the limit is passed.
+
+        Args:
+            app: The ASGI application
+            max_bytes (int): Largest request body accepted
+            paths: Path prefixes the limit applies to
+        """
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        message = f"Upload is larger than the {self.max_bytes // (1024 * 1024)} MiB limit"
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > self.max_bytes:
+            await JSONResponse(status_code=413, content={"error": message})(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            event = await receive()
+            if event["type"] == "http.request":
+                received += len(event.get("body", b""))
+                if received > self.max_bytes:
+                    # An HTTPException passes through FastAPI's body parsing to the 413 handler
+                    raise UploadTooLargeError(message)
+            return event
+
+        await self.app(scope, limited_receive, send)
+
+async def read_upload(file: UploadFile, max_bytes: int, chunk_size: int = 1024 * 1024) -> bytes:
+    """
+    Read an uploaded file in chunks, stopping as soon as it passes max_bytes.
+
+    Raises:
+        UploadTooLargeError: If the file is larger than max_bytes
+    """
+    parts = []
+    size = 0
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLargeError(
+                f"{file.filename} is larger than the {max_bytes // (1024 * 1024)} MiB per-file limit"
+            )
+        parts.append(chunk)
+    return b"".join(parts)
+
+def parse_file_sizes(manifest: str, max_files: int, max_bytes: int) -> List[Tuple[str, int]]:
+    """
+    Parse a JSON list of {"name", "size"} objects describing files not uploaded yet.
+
+    Raises:
+        ValueError: If the manifest is malformed
+        UploadTooLargeError: If there are too many files, or one is larger than max_bytes
+    """
+    try:
+        entries = json.loads(manifest)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"sizes is not valid JSON: {str(e)}")
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("sizes must be a non-empty JSON list")
+    if len(entries) > max_files:
+        raise UploadTooLargeError(f"At most {max_files} files can be uploaded at once")
+
+    sizes = []
+    for index, entry in enumerate(entries):
+        name = entry.get("name") if isinstance(entry, dict) else None
+        size = entry.get("size") if isinstance(entry, dict) else None
+        if not isinstance(name, str) or not isinstance(size, int) or isinstance(size, bool) or size < 0:
+            raise ValueError(f"Entry {index + 1} of sizes needs a name and a non-negative integer size")
+        if size > max_bytes:
+            raise UploadTooLargeError(f"{name} is larger than the {max_bytes // (1024 * 1024)} MiB per-file limit")
+        sizes.append((name, size))
+    return sizes
+
+@dataclass
+class Reservation:
+    client: str
+    tokens: int
+    released: bool = False
+
+class _Waiter:
+    def __init__(self, reservation: Reservation):
+        self.reservation = reservation
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+class TokenBudget:
+    def __init__(
+        self,
+        capacity: int,
+        tokens_per_minute: int,
+        max_wait_seconds: float = 30.0,
+        max_waiting_per_client: int = 2
+    ):
+        """
+        Caps the estimated LLM tokens of all uploads in progress, queueing the rest fairly.
+
+        Waiting uploads are admitted round-robin across clients, one upload
+        per client per turn, so one client sending many uploads cannot push
+        everyone else to the back. An upload that would wait longer than
+        max_wait_seconds, judged by how fast the provider's token budget
+        drains, is refused at once instead of queueing.
+
+        Args:
+            capacity (int): Estimated tokens allowed in progress at once
+            tokens_per_minute (int): Provider token budget, used to predict how long a wait will be
+            max_wait_seconds (float): Longest an upload may be queued before it is refused
+            max_waiting_per_client (int): Uploads one client may have queued at once
+        """
+        self.capacity = capacity
+        self.tokens_per_minute = tokens_per_minute
+        self.max_wait_seconds = max_wait_seconds
+        self.max_waiting_per_client = max_waiting_per_client
+        self._in_use = 0
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_busy = 0
+        self.rejected_client = 0
+        self.timed_out = 0
+        self.wait_seconds = 0.0
+
+    @property
+    def waiting_tokens(self) -> int:
+        return sum(waiter.reservation.tokens for queue in self._queues.values() for waiter in queue)
+
+    def expected_wait(self, tokens: int) -> float:
+        """Seconds until `tokens` more would fit, if work ahead drains at the provider's token rate"""
+        tokens = min(tokens, self.capacity)
+        if tokens == 0:
+            return 0.0
+        excess = self._in_use + self.waiting_tokens + tokens - self.capacity
+        return max(0.0, excess) * 60 / self.tokens_per_minute
+
+    def check(self, client: str) -> None:
+        """
+        Turn an upload away before any work is spent on it, if it could not be queued whatever its size.
+
+        Raises:
+            SaturatedError: If client already has too much queued, or the queue alone is longer than the max wait
+        """
+        self._refuse_if_needed(client, 1)
+
+    async def acquire(self, client: str, tokens: int) -> Reservation:
+        """
+        Reserve an upload's estimated tokens, waiting for room if necessary.
+
+        Raises:
+            SaturatedError: If the wait would be too long or client already has too much queued
+        """
+        # An upload larger than the whole budget is admitted once it can run alone
+        reservation = Reservation(client, min(tokens, self.capacity))
+        if reservation.tokens == 0 or (not self._queues and self._in_use + reservation.tokens <= self.capacity):
+            self._grant(reservation)
+            return reservation
+
+        self._refuse_if_needed(client, reservation.tokens)
+
+        waiter = _Waiter(reservation)
+        self._queues.setdefault(client, deque()).append(waiter)
+        self.queued += 1
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.max_wait_seconds)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done():
+                # Granted just as we gave up
+                self.release(reservation)
+            else:
+                waiter.future.cancel()
+                self._remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out += 1
+                raise SaturatedError("The server is busy, please retry shortly", 503, self.expected_wait(reservation.tokens))
+            raise
+        finally:
+            self.wait_seconds += time.monotonic() - start
+        return reservation
+
+    def _refuse_if_needed(self, client: str, tokens: int) -> None:
+        wait = self.expected_wait(tokens)
+        if len(self._queues.get(client, ())) >= self.max_waiting_per_client:
+            self.rejected_client += 1
+            raise SaturatedError("You already have uploads waiting, please retry once they finish", 429, wait)
+        if wait > self.max_wait_seconds:
+            self.rejected_busy += 1
+            raise SaturatedError("The server is busy, please retry shortly", 503, wait)
+
+    def release(self, reservation: Reservation) -> None:
+        """Return a reservation's tokens once its upload has finished"""
+        if reservation.released:
+            return
+        reservation.released = True
+        self._in_use -= reservation.tokens
+        self._dispatch()
+
+    def _grant(self, reservation: Reservation) -> None:
+        self._in_use += reservation.tokens
+        self.admitted += 1
+
+    def _remove(self, waiter: _Waiter) -> None:
+        queue = self._queues.get(waiter.reservation.client)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[waiter.reservation.client]
+        # A large waiter leaving may let smaller ones behind it through
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        # The client at the front gets one upload in, then goes to the back
+        while self._queues:
+            client, queue = next(iter(self._queues.items()))
+            waiter = queue[0]
+            if self._in_use + waiter.reservation.tokens > self.capacity:
+                return
+            queue.popleft()
+            del self._queues[client]
+            if queue:
+                self._queues[client] = queue
+            self._grant(waiter.reservation)
+            waiter.future.set_result(None)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "capacity": self.capacity,
+            "in_flight_tokens": self._in_use,
+            "waiting": sum(len(queue) for queue in self._queues.values()),
+            "waiting_tokens": self.waiting_tokens,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected_busy": self.rejected_busy,
+            "rejected_client": self.rejected_client,
+            "timed_out": self.timed_out,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
@@ -1,16 +1,66 @@
 import os
+import re
 import asyncio
-import httpx
-from typing import List
+import time
+from functools import lru_cache
+from typing import Callable, List, Optional
 import logging
 
+from .chunk_cache import ChunkSummaryCache
+from .chunker import get_token_counter
+from .coordination import Coordinator
+from .llm_client import LLMClient
+from .metrics import track
+from .packer import ChunkPacker
+from .routing import ModelRouter, Route
+from .singleflight import SingleFlight
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Limit concurrent API calls to avoid rate limits
-MAX_CONCURRENT_CALLS = 3
-semaphore = asyncio.Semaphore(MAX_CONCURRENT_CALLS)
+MAX_CONCURRENT_CALLS = int(os.getenv("OPENAI_MAX_CONCURRENCY", "3"))
+
+MODEL = "gpt-4"
+TEMPERATURE = 0.7
+
+# Summaries of chunks we have already sent, shared across uploads
+chunk_cache = ChunkSummaryCache(
+    os.getenv("CHUNK_CACHE_PATH", os.path.join("cache", "chunk_summaries.sqlite3")),
+    max_bytes=int(os.getenv("CHUNK_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+)
+
+# Rate limits, concurrency slots, in-flight work and results shared by every worker process
+coordinator = Coordinator(
+    os.getenv("COORDINATION_PATH", os.path.join("cache", "coordination.sqlite3"))
+) if os.getenv("SHARED_COORDINATION", "1") == "1" else None
+
+# One pooled client for the whole app; closed in main's lifespan
+llm_client = LLMClient(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+    max_concurrency=MAX_CONCURRENT_CALLS,
+    requests_per_minute=int(os.getenv("OPENAI_RPM", "500")),
+    tokens_per_minute=int(os.getenv("OPENAI_TPM", "40000")),
+    max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "5")),
+    timeout=float(os.getenv("OPENAI_TIMEOUT_SECONDS", "30")),
+    hedge_quantile=float(os.getenv("OPENAI_HEDGE_QUANTILE", "95")) if os.getenv("OPENAI_HEDGE", "1") == "1" else None,
+    hedge_max_ratio=float(os.getenv("OPENAI_HEDGE_MAX_RATIO", "0.1")),
+    coordinator=coordinator
+)
+
+# Small, prose-like chunks can go to a faster model; everything else, and all reduce requests, go to MODEL
+_routes = []
+if os.getenv("ROUTE_FAST_MODEL"):
+    _routes.append(Route(
+        "fast",
+        os.getenv("ROUTE_FAST_MODEL"),
+        max_tokens=int(os.getenv("ROUTE_FAST_MAX_TOKENS", "1500")),
+        max_math_ratio=float(os.getenv("ROUTE_FAST_MAX_MATH_RATIO", "0.15"))
+    ))
+_routes.append(Route("strong", MODEL))
+model_router = ModelRouter(_routes)
 
 SYSTEM_PROMPT = """You are a helpful assistant that creates concise, well-formatted LaTeX bullet points from text.
 Focus on extracting key information and formatting it as LaTeX bullet points.
@@ -25,49 +75,215 @@ Format your response as a complete LaTeX itemize environment:
 Do not include any other LaTeX document structure or preamble - only return the itemize environment with bullet points.
 Use \\item for each bullet point and maintain proper LaTeX formatting."""
 
-async def summarize_chunk(client: httpx.AsyncClient, chunk: str) -> str:
-    """Summarize a single chunk of text using OpenAI's API"""
-    async with semaphore:  # Limit concurrent API calls
-        try:
-            logger.info(f"Processing chunk of length {len(chunk)}")
-            response = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "gpt-4",
-                    "messages": [
-                        {"role": "system", "content": SYSTEM_PROMPT},
-                        {"role": "user", "content": chunk}
-                    ],
-                    "temperature": 0.7
-                },
-                timeout=30.0  # Add timeout
+REDUCE_PROMPT = """You merge several LaTeX bullet lists from the same cheat sheet into one shorter list.
+Combine overlapping points, drop duplicates and minor details, and keep formulas, definitions and key facts.
+Return at most {max_items} bullet points as a single LaTeX itemize environment:
+
+\\begin{{itemize}}
+\\item First bullet point
+\\item Second bullet point
+\\end{{itemize}}
+
+Do not include any other LaTeX document structure or preamble - only return the itemize environment with bullet points."""
+
+# Identical requests already in flight are joined instead of sent again
+inflight_chats = SingleFlight("chats", coordinator)
+
+# Several small chunks can share one request; each is wrapped in a marker line
+SECTION_MARKER = "=== SECTION {} ==="
+_SECTION_LINE = re.compile(r'^=== SECTION (\d+) ===[ \t]*$', re.MULTILINE)
+
+PACKED_PROMPT = SYSTEM_PROMPT + """
+
+The text contains several independent sections, each introduced by a line such as "=== SECTION 1 ===".
+Summarize every section separately and in order. Start each section's output with its marker line, exactly as given, followed by that section's itemize environment."""
+
+async def _lookup(system_prompt: str, route: Route, text: str) -> Optional[str]:
+    # The cache is SQLite on local disk; keep its reads and writes off the event loop
+    cached = await asyncio.to_thread(chunk_cache.get, chunk_cache.make_key(system_prompt, route.model, TEMPERATURE, text))
+    if cached is not None:
+        logger.info(f"Chunk cache hit for chunk of length {len(text)}")
+    return cached
+
+@lru_cache(maxsize=64)
+def _prompt_tokens(system_prompt: str, model: str) -> int:
+    """Tokens of a system + user message pair before the user's text"""
+    return get_token_counter(model).count_tokens_in_messages([
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": ""}
+    ])
+
+async def _send(
+    client: LLMClient,
+    system_prompt: str,
+    route: Route,
+    text: str,
+    stage: str,
+    tokens: Optional[int] = None
+) -> str:
+    """Send one system + user message pair on route, recording the route's latency; tokens is text's count, if known"""
+    start = time.perf_counter()
+    try:
+        with track(stage):
+            reply = await client.chat(
+                [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": text}
+                ],
+                model=route.model,
+                temperature=TEMPERATURE,
+                prompt_tokens=_prompt_tokens(system_prompt, route.model) + tokens if tokens is not None else None
             )
-            response.raise_for_status()
-            return response.json()["choices"][0]["message"]["content"]
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code == 429:  # Rate limit error
-                logger.warning("Rate limit hit, waiting 60 seconds before retry")
-                await asyncio.sleep(60)  # Wait for 60 seconds
-                return await summarize_chunk(client, chunk)  # Retry the request
-            logger.error(f"HTTP error occurred: {str(e)}")
-            raise
-        except httpx.TimeoutException:
-            logger.error("Request timed out")
-            raise
-        except Exception as e:
-            logger.error(f"Unexpected error: {str(e)}")
-            raise
-
-async def summarize_all_chunks(chunks: List[str]) -> List[str]:
-    """Process all chunks concurrently using httpx with rate limiting"""
+    except Exception:
+        model_router.record(route, time.perf_counter() - start, ok=False)
+        raise
+    model_router.record(route, time.perf_counter() - start)
+    return reply
+
+async def _chat_and_store(
+    client: LLMClient,
+    system_prompt: str,
+    route: Route,
+    text: str,
+    stage: str = "summarize",
+    tokens: Optional[int] = None
+) -> str:
+    reply = await _send(client, system_prompt, route, text, stage, tokens)
+    cache_key = chunk_cache.make_key(system_prompt, route.model, TEMPERATURE, text)
+    await asyncio.to_thread(chunk_cache.put, cache_key, reply, len(system_prompt.encode("utf-8")) + len(text.encode("utf-8")))
+    return reply
+
+async def _cached_chat(
+    client: LLMClient,
+    system_prompt: str,
+    route: Route,
+    text: str,
+    stage: str = "summarize",
+    tokens: Optional[int] = None
+) -> str:
+    """Send one system + user message pair, reusing a cached reply for identical input"""
+    cached = await _lookup(system_prompt, route, text)
+    if cached is not None:
+        return cached
+    cache_key = chunk_cache.make_key(system_prompt, route.model, TEMPERATURE, text)
+    return await inflight_chats.do(
+        cache_key,
+        lambda: _chat_and_store(client, system_prompt, route, text, stage, tokens),
+        lookup=lambda: chunk_cache.peek(cache_key)
+    )
+
+async def lookup_summary(chunk: str, tokens: Optional[int] = None) -> Optional[str]:
+    """Return the cached summary of a chunk, if there is one"""
+    return await _lookup(SYSTEM_PROMPT, model_router.choose(chunk, tokens), chunk)
+
+async def summarize_chunk(client: LLMClient, chunk: str, use_cache: bool = True, tokens: Optional[int] = None) -> str:
+    """Summarize a single chunk of text using OpenAI's API"""
+    try:
+        logger.info(f"Processing chunk of length {len(chunk)}")
+        route = model_router.choose(chunk, tokens)
+        if use_cache:
+            return await _cached_chat(client, SYSTEM_PROMPT, route, chunk, tokens=tokens)
+        return await _chat_and_store(client, SYSTEM_PROMPT, route, chunk, tokens=tokens)
+    except Exception as e:
+        logger.error(f"Error summarizing chunk: {str(e)}")
+        raise
+
+def split_packed_reply(reply: str, count: int) -> Optional[List[str]]:
+    """Split a packed reply into one itemize environment per section, or None if it is malformed"""
+    parts = _SECTION_LINE.split(reply)
+    numbers, bodies = parts[1::2], [body.strip() for body in parts[2::2]]
+    if numbers != [str(i) for i in range(1, count + 1)]:
+        return None
+    if any("\\begin{itemize}" not in body or "\\end{itemize}" not in body for body in bodies):
+        return None
+    return bodies
+
+async def summarize_packed(
+    client: LLMClient,
+    chunks: List[str],
+    token_counts: Optional[List[int]] = None
+) -> Optional[List[str]]:
+    """
+    Summarize several chunks in one request.
+
+    Each summary is cached as if its chunk had been sent alone to the
+    model the whole request was routed to.
+
+    Returns:
+        Optional[List[str]]: One summary per chunk, or None if the reply could not be split
+    """
+    logger.info(f"Processing {len(chunks)} small chunks in one request")
+    text = "\n\n".join(f"{SECTION_MARKER.format(i)}\n{chunk}" for i, chunk in enumerate(chunks, start=1))
+    route = model_router.choose_many(chunks, token_counts)
+    # Section markers and separators cost a few tokens per chunk, as the packer assumes
+    tokens = sum(token_counts) + 8 * len(chunks) if token_counts is not None else None
+    reply = await _send(client, PACKED_PROMPT, route, text, "summarize", tokens)
+    summaries = split_packed_reply(reply, len(chunks))
+    if summaries is None:
+        return None
+
+    # Charge the shared system prompt to the first chunk only
+    prompt_bytes = len(PACKED_PROMPT.encode("utf-8"))
+    for chunk, summary in zip(chunks, summaries):
+        cache_key = chunk_cache.make_key(SYSTEM_PROMPT, route.model, TEMPERATURE, chunk)
+        await asyncio.to_thread(chunk_cache.put, cache_key, summary, prompt_bytes + len(chunk.encode("utf-8")))
+        prompt_bytes = 0
+    return summaries
+
+async def reduce_summaries(client: LLMClient, summaries: List[str], max_items: int) -> str:
+    """Merge several chunk summaries into one itemize environment of at most max_items bullets"""
+    try:
+        logger.info(f"Reducing {len(summaries)} summaries to at most {max_items} items")
+        return await _cached_chat(
+            client, REDUCE_PROMPT.format(max_items=max_items), model_router.strongest, "\n\n".join(summaries), "reduce"
+        )
+    except Exception as e:
+        logger.error(f"Error reducing summaries: {str(e)}")
+        raise
+
+# Packs small chunks from concurrent uploads into shared requests
+chunk_packer = ChunkPacker(
+    MODEL,
+    PACKED_PROMPT,
+    lookup=lookup_summary,
+    summarize_one=lambda chunk, tokens: summarize_chunk(llm_client, chunk, use_cache=False, tokens=tokens),
+    summarize_many=lambda chunks, token_counts: summarize_packed(llm_client, chunks, token_counts),
+    max_tokens=int(os.getenv("PACK_MAX_TOKENS", "3000")),
+    small_chunk_tokens=int(os.getenv("PACK_SMALL_CHUNK_TOKENS", "500")),
+    window=float(os.getenv("PACK_WINDOW_SECONDS", "0.02"))
+)
+
+async def summarize_shared(chunk: str, tokens: Optional[int] = None) -> str:
+    """
+    Summarize a chunk through the packer, joining an identical request already in flight.
+
+    tokens, the chunk's token count if the caller already has it, saves counting it again.
+    """
+    cache_key = chunk_cache.make_key(SYSTEM_PROMPT, model_router.choose(chunk, tokens).model, TEMPERATURE, chunk)
+    return await inflight_chats.do(
+        cache_key,
+        lambda: chunk_packer.summarize(chunk, tokens),
+        lookup=lambda: chunk_cache.peek(cache_key)
+    )
+
+async def summarize_all_chunks(
+    chunks: List[str],
+    on_chunk_done: Optional[Callable[[int, str], None]] = None
+) -> List[str]:
+    """
+    Process all chunks concurrently through the shared, rate-limited client.
+
+    on_chunk_done, if given, is called with (index, summary) as each chunk finishes.
+    """
+    async def summarize_indexed(index: int, chunk: str) -> str:
+        summary = await summarize_shared(chunk)
+        if on_chunk_done is not None:
+            on_chunk_done(index, summary)
+        return summary
+
     try:
-        async with httpx.AsyncClient() as client:
-            tasks = [summarize_chunk(client, chunk) for chunk in chunks]
-            return await asyncio.gather(*tasks)
+        tasks = [summarize_indexed(index, chunk) for index, chunk in enumerate(chunks)]
+        return await asyncio.gather(*tasks)
     except Exception as e:
         logger.error(f"Error in summarize_all_chunks: {str(e)}")
-        raise 
\ No newline at end of file
+        raise
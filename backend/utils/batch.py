@@ -0,0 +1,98 @@
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+from .pipeline import LayoutOptions
+
+_UNSAFE_NAME = re.compile(r'[^A-Za-z0-9._ -]+')
+
+@dataclass
+class BatchGroup:
+    # Name of the group's PDF inside the archive, without extension
+    name: str
+    # Indices into the request's uploaded files
+    files: List[int]
+    options: LayoutOptions
+
+def _archive_name(raw: Any, index: int, taken: set) -> str:
+    name = _UNSAFE_NAME.sub("_", str(raw or "")).strip(" .") or f"group_{index + 1}"
+    unique, suffix = name, 2
+    while unique.lower() in taken:
+        unique, suffix = f"{name}_{suffix}", suffix + 1
+    taken.add(unique.lower())
+    return unique
+
+def parse_batch_manifest(
+    manifest: str,
+    filenames: Sequence[str],
+    defaults: Dict[str, Any],
+    max_groups: int
+) -> List[BatchGroup]:
+    """
+    Parse the JSON list of groups sent with a batch request.
+
+    Each group is an object with "files" (names of uploaded files, or their
+    indices) and optionally "name", "font_size", "columns", "orientation" and
+    "max_pages"; options a group leaves out come from defaults.
+
+    Args:
+        manifest (str): The request's groups field
+        filenames (Sequence[str]): Names of the uploaded files, in upload order
+        defaults (Dict[str, Any]): Request-level layout options, None where not given
+        max_groups (int): Most groups one request may contain
+
+    Returns:
+        List[BatchGroup]: The groups, in manifest order
+
+    Raises:
+        ValueError: If the manifest is malformed or refers to files that were not uploaded
+    """
+    try:
+        groups = json.loads(manifest)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"groups is not valid JSON: {str(e)}")
+    if not isinstance(groups, list) or not groups:
+        raise ValueError("groups must be a non-empty JSON list")
+    if len(groups) > max_groups:
+        raise ValueError(f"A batch may contain at most {max_groups} groups")
+
+    positions: Dict[str, List[int]] = {}
+    for index, filename in enumerate(filenames):
+        positions.setdefault(filename, []).append(index)
+
+    parsed = []
+    taken: set = set()
+    for index, group in enumerate(groups):
+        if not isinstance(group, dict) or not isinstance(group.get("files"), list) or not group["files"]:
+            raise ValueError(f"Group {index + 1} needs a non-empty files list")
+
+        files = []
+        for ref in group["files"]:
+            if isinstance(ref, int) and 0 <= ref < len(filenames):
+                files.append(ref)
+            elif isinstance(ref, str) and len(positions.get(ref, [])) == 1:
+                files.append(positions[ref][0])
+            elif isinstance(ref, str) and ref in positions:
+                raise ValueError(f"Several uploaded files are named {ref}; refer to them by index")
+            else:
+                raise ValueError(f"Group {index + 1} refers to {ref!r}, which was not uploaded")
+
+        options: Dict[str, Optional[Any]] = {
+            key: group.get(key, defaults.get(key)) for key in ("font_size", "columns", "orientation", "max_pages")
+        }
+        missing = [key for key in ("font_size", "columns", "orientation") if options[key] is None]
+        if missing:
+            raise ValueError(f"Group {index + 1} is missing {', '.join(missing)}")
+        try:
+            layout = LayoutOptions(
+                str(options["font_size"]),
+                int(options["columns"]),
+                str(options["orientation"]),
+                int(options["max_pages"]) if options["max_pages"] is not None else None
+            )
+        except (TypeError, ValueError):
+            raise ValueError(f"Group {index + 1} has a non-numeric columns or max_pages")
+
+        parsed.append(BatchGroup(_archive_name(group.get("name"), index, taken), files, layout))
+    return parsed
@@ -0,0 +1,69 @@
+import hashlib
+from typing import Dict, Optional, Tuple
+
+from .sqlite_lru import SqliteLRU
+
+
+class ChunkSummaryCache(SqliteLRU):
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, touch_batch: int = 100):
+        """
+        Initialize an on-disk cache of chunk summaries backed by SQLite.
+
+        Args:
+            path (str): Location of the SQLite database file
+            max_bytes (int): Upper bound on the stored summary size before LRU eviction kicks in
+            touch_batch (int): Hits noted before their recency is written on its own
+        """
+        super().__init__(
+            path, "summaries", "summary TEXT NOT NULL, prompt_bytes INTEGER NOT NULL", max_bytes, touch_batch
+        )
+        self.bytes_saved = 0
+
+    @staticmethod
+    def make_key(system_prompt: str, model: str, temperature: float, chunk: str) -> str:
+        """
+        Fingerprint everything that determines a summary.
+
+        Args:
+            system_prompt (str): The system prompt sent with the chunk
+            model (str): The model name
+            temperature (float): Sampling temperature
+            chunk (str): The chunk text
+
+        Returns:
+            str: Hex digest used as the cache key
+        """
+        digest = hashlib.sha256()
+        for part in (system_prompt, model, repr(temperature), chunk):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached summary for key and mark it as recently used"""
+        row = self._get(key, "summary, size, prompt_bytes")
+        return row[0] if row else None
+
+    def _on_hit(self, row: Tuple) -> None:
+        _, size, prompt_bytes = row
+        self.bytes_saved += size + prompt_bytes
+
+    def peek(self, key: str) -> Optional[str]:
+        """Return the cached summary for key without counting a lookup or touching its recency"""
+        row = self._peek(key, "summary")
+        return row[0] if row else None
+
+    def put(self, key: str, summary: str, prompt_bytes: int) -> None:
+        """
+        Store a summary and evict least recently used entries past max_bytes.
+
+        Args:
+            key (str): Key from make_key
+            summary (str): The model's response
+            prompt_bytes (int): Size of the request the summary replaces, used for bytes-saved accounting
+        """
+        self._put(key, len(summary.encode("utf-8")), {"summary": summary, "prompt_bytes": prompt_bytes})
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit rate and bytes saved for monitoring"""
+        return {**super().stats(), "bytes_saved": self.bytes_saved}
@@ -1,6 +1,180 @@
 import tiktoken
 import re
-from typing import Dict, List, Optional, Tuple
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .metrics import track
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str = DEFAULT_MODEL) -> tiktoken.Encoding:
+    """
+    Return the shared tiktoken encoding for a model, loading it on first use.
+    
+    Args:
+        model (str): The model to look up the encoding for
+        
+    Returns:
+        tiktoken.Encoding: The encoding, shared by every caller in the process
+    """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Fallback to cl100k_base encoding if model not found
+        return tiktoken.get_encoding("cl100k_base")
+
+@lru_cache(maxsize=None)
+def get_token_counter(model: str = DEFAULT_MODEL) -> "TokenCounter":
+    """Return the shared TokenCounter for a model"""
+    return TokenCounter(model)
+
+def warm_encoders(models: Iterable[str] = (DEFAULT_MODEL, "gpt-4")) -> None:
+    """
+    Load encodings ahead of time so the first request doesn't pay for it.
+    
+    Args:
+        models (Iterable[str]): Models whose encodings should be loaded
+    """
+    for model in models:
+        get_token_counter(model).count_tokens("warm up")
+
+class TokenizedDocument:
+    def __init__(self, counter: "TokenCounter", pieces: List[str], token_counts: List[int], max_piece_tokens: int):
+        """
+        A document that has been split into sentences and tokenized once.
+        
+        Args:
+            counter (TokenCounter): The counter that produced the tokens
+            pieces (List[str]): Sentences (or sentence fragments) in document order
+            token_counts (List[int]): Token count of each piece
+            max_piece_tokens (int): Upper bound on the token count of any single piece
+        """
+        self.counter = counter
+        self.pieces = pieces
+        self.token_counts = token_counts
+        self.max_piece_tokens = max_piece_tokens
+
+        # token_offsets[i] is the number of tokens in pieces[:i]
+        self.token_offsets = [0]
+        for count in token_counts:
+            self.token_offsets.append(self.token_offsets[-1] + count)
+
+    @property
+    def total_tokens(self) -> int:
+        """Total number of tokens in the document"""
+        return self.token_offsets[-1]
+
+    def estimate_cost(self, model: Optional[str] = None) -> float:
+        """Estimate the cost of sending the whole document to the model"""
+        return self.counter.estimate_cost(self.total_tokens, model)
+
+    def chunk(self, max_tokens: int, overlap_tokens: int = 100) -> List[str]:
+        """
+        Group the pieces into chunks that don't exceed max_tokens, with overlap between chunks.
+        
+        Chunk boundaries are found by binary search over token_offsets, so no
+        text is tokenized again.
+        
+        Args:
+            max_tokens (int): Maximum tokens per chunk
+            overlap_tokens (int): Number of tokens to overlap between chunks
+            
+        Returns:
+            List[str]: List of text chunks
+        """
+        if max_tokens < self.max_piece_tokens:
+            raise ValueError(
+                f"max_tokens ({max_tokens}) is smaller than the piece size the document was tokenized with ({self.max_piece_tokens})"
+            )
+
+        chunker = StreamingChunker(self.counter, max_tokens, overlap_tokens)
+        return chunker.feed_pieces(self.pieces, self.token_counts) + chunker.flush()
+
+class StreamingChunker:
+    def __init__(self, counter: "TokenCounter", max_tokens: int, overlap_tokens: int = 100):
+        """
+        Chunk text that arrives in parts, emitting each chunk as soon as it is complete.
+        
+        Feeding a document in any number of parts gives the same chunks as
+        TokenizedDocument.chunk on the whole, except that part boundaries also
+        end a sentence. Only the pieces of the unfinished chunk are buffered.
+        
+        Args:
+            counter (TokenCounter): Counter used to tokenize fed text
+            max_tokens (int): Maximum tokens per chunk
+            overlap_tokens (int): Number of tokens to overlap between chunks
+        """
+        self.counter = counter
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.total_tokens = 0
+        # Token count of each chunk returned so far, in order
+        self.chunk_tokens: List[int] = []
+
+        self._pieces: List[str] = []
+        self._offsets = [0]  # self._offsets[i] is the number of tokens in self._pieces[:i]
+        self._start = 0      # first piece of the next chunk
+        self._covered = 0    # self._pieces[:self._covered] already appear in some chunk
+
+    def feed(self, text: str) -> List[str]:
+        """Tokenize more text and return any chunks it completes"""
+        return self.feed_pieces(*self.encode(text))
+
+    def encode(self, text: str) -> Tuple[List[str], List[int]]:
+        """Split and tokenize text for feed_pieces; touches no state, so it may run in a worker thread"""
+        return self.counter.encode_sentences(self.counter.split_into_sentences(text), self.max_tokens)
+
+    def feed_pieces(self, pieces: List[str], token_counts: List[int]) -> List[str]:
+        """Add already-tokenized pieces and return any chunks they complete"""
+        self._pieces.extend(pieces)
+        for count in token_counts:
+            self._offsets.append(self._offsets[-1] + count)
+            self.total_tokens += count
+        return self._drain(final=False)
+
+    def flush(self) -> List[str]:
+        """Return the remaining chunks once all text has been fed"""
+        return self._drain(final=True)
+
+    def _drain(self, final: bool) -> List[str]:
+        pieces = self._pieces
+        offsets = self._offsets
+        chunks = []
+        while self._covered < len(pieces):
+            # Furthest end such that pieces[start:end] fits in max_tokens
+            start = self._start
+            end = bisect_right(offsets, offsets[start] + self.max_tokens, lo=start + 1) - 1
+            if end <= self._covered:
+                # The overlap leaves no room for new content, so drop it
+                start = self._covered
+                end = bisect_right(offsets, offsets[start] + self.max_tokens, lo=start + 1) - 1
+            end = max(end, start + 1)
+            if end == len(pieces) and not final:
+                # More text could still fit in this chunk
+                break
+            chunks.append(" ".join(pieces[start:end]))
+            self.chunk_tokens.append(offsets[end] - offsets[start])
+            self._covered = end
+
+            # Back up to the earliest piece whose tail still fits in the overlap,
+            # always moving forward by at least one piece
+            self._start = bisect_left(offsets, offsets[end] - self.overlap_tokens, lo=start + 1, hi=end)
+
+        self._compact()
+        return chunks
+
+    def _compact(self) -> None:
+        # Forget pieces that can no longer be part of a chunk
+        drop = self._start
+        if drop == 0 or drop < len(self._pieces) // 2:
+            return
+        base = self._offsets[drop]
+        del self._pieces[:drop]
+        self._offsets = [offset - base for offset in self._offsets[drop:]]
+        self._start = 0
+        self._covered -= drop
 
 class TokenCounter:
     def __init__(self, model: str = "gpt-3.5-turbo"):
@@ -11,11 +185,7 @@ class TokenCounter:
             model (str): The model to use for token counting. Defaults to "gpt-3.5-turbo"
         """
         self.model = model
-        try:
-            self.encoding = tiktoken.encoding_for_model(model)
-        except KeyError:
-            # Fallback to cl100k_base encoding if model not found
-            self.encoding = tiktoken.get_encoding("cl100k_base")
+        self.encoding = get_encoding(model)
         
         # Compile regex patterns for text segmentation
         self.sentence_endings = re.compile(r'[.!?]+["\']?\s+')
@@ -64,39 +234,61 @@ class TokenCounter:
         Returns:
             List[str]: List of sentences
         """
-        # Split on sentence endings
-        sentences = self.sentence_endings.split(text)
-        # Filter out empty sentences and strip whitespace
-        return [s.strip() for s in sentences if s.strip()]
+        # Split on sentence endings, keeping the terminating punctuation
+        sentences = []
+        pos = 0
+        for match in self.sentence_endings.finditer(text):
+            sentence = text[pos:match.end()].strip()
+            if sentence:
+                sentences.append(sentence)
+            pos = match.end()
+        tail = text[pos:].strip()
+        if tail:
+            sentences.append(tail)
+        return sentences
 
-    def create_chunk_with_overlap(self, sentences: List[str], max_tokens: int, overlap_tokens: int) -> Tuple[str, int]:
+    def encode_sentences(self, sentences: List[str], max_tokens: int) -> Tuple[List[str], List[int]]:
         """
-        Create a chunk from sentences with overlap handling.
+        Tokenize sentences in a single batch, splitting any that exceed max_tokens.
         
         Args:
-            sentences (List[str]): List of sentences to process
-            max_tokens (int): Maximum tokens per chunk
-            overlap_tokens (int): Number of tokens to overlap between chunks
+            sentences (List[str]): Sentences to tokenize
+            max_tokens (int): Largest token count a single piece may have
             
         Returns:
-            Tuple[str, int]: The chunk text and the number of sentences used
+            Tuple[List[str], List[int]]: The pieces and the token count of each piece
         """
-        chunk = []
-        current_tokens = 0
-        sentences_used = 0
+        pieces = []
+        token_counts = []
+        for sentence, tokens in zip(sentences, self.encoding.encode_ordinary_batch(sentences)):
+            if len(tokens) <= max_tokens:
+                pieces.append(sentence)
+                token_counts.append(len(tokens))
+                continue
+            # A single sentence larger than a chunk: cut it on token boundaries
+            for i in range(0, len(tokens), max_tokens):
+                window = tokens[i:i + max_tokens]
+                pieces.append(self.encoding.decode(window).strip())
+                token_counts.append(len(window))
+        return pieces, token_counts
+
+    def tokenize(self, text: str, max_piece_tokens: int) -> TokenizedDocument:
+        """
+        Split text into sentences and tokenize them in a single pass.
         
-        for sentence in sentences:
-            sentence_tokens = self.count_tokens(sentence)
+        Args:
+            text (str): The text to tokenize
+            max_piece_tokens (int): Sentences longer than this are split; use the largest chunk size you plan to ask for
             
-            # If adding this sentence would exceed the limit (accounting for overlap)
-            if current_tokens + sentence_tokens > max_tokens - overlap_tokens:
-                break
-                
-            chunk.append(sentence)
-            current_tokens += sentence_tokens
-            sentences_used += 1
-        
-        return " ".join(chunk), sentences_used
+        Returns:
+            TokenizedDocument: The tokenized document
+        """
+        pieces, token_counts = self.encode_sentences(self.split_into_sentences(text), max_piece_tokens)
+        return TokenizedDocument(self, pieces, token_counts, max_piece_tokens)
+
+    def streaming_chunker(self, max_tokens: int, overlap_tokens: int = 100) -> StreamingChunker:
+        """Create a StreamingChunker that tokenizes with this counter"""
+        return StreamingChunker(self, max_tokens, overlap_tokens)
 
     def chunk_text(self, text: str, max_tokens: int, overlap_tokens: int = 100) -> List[str]:
         """
@@ -110,27 +302,8 @@ class TokenCounter:
         Returns:
             List[str]: List of text chunks
         """
-        # Split text into sentences
-        sentences = self.split_into_sentences(text)
-        chunks = []
-        
-        # Process sentences into chunks
-        current_pos = 0
-        while current_pos < len(sentences):
-            # Create a chunk with overlap
-            chunk, sentences_used = self.create_chunk_with_overlap(
-                sentences[current_pos:],
-                max_tokens,
-                overlap_tokens
-            )
-            
-            if not chunk:  # If we couldn't create a chunk, break
-                break
-                
-            chunks.append(chunk)
-            current_pos += max(1, sentences_used - 1)  # Move forward, accounting for overlap
-        
-        return chunks
+        with track("chunk"):
+            return self.tokenize(text, max_tokens).chunk(max_tokens, overlap_tokens)
 
     def chunk_text_by_paragraphs(self, text: str, max_tokens: int, overlap_paragraphs: int = 1) -> List[str]:
         """
@@ -195,7 +368,7 @@ class TokenCounter:
         cost_per_token = costs.get(model, 0.0005) / 1000  # Convert to cost per token
         return num_tokens * cost_per_token
 
-def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
     """
     Convenience function to count tokens in text.
     
@@ -206,10 +379,10 @@ def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
     Returns:
         int: Number of tokens
     """
-    counter = TokenCounter(model)
+    counter = get_token_counter(model)
     return counter.count_tokens(text)
 
-def chunk_text(text: str, max_tokens: int = 1000, overlap_tokens: int = 100, model: str = "gpt-3.5-turbo") -> List[str]:
+def chunk_text(text: str, max_tokens: int = 1000, overlap_tokens: int = 100, model: str = DEFAULT_MODEL) -> List[str]:
     """
     Convenience function to chunk text into token-limited pieces with overlap.
     
@@ -222,10 +395,10 @@ def chunk_text(text: str, max_tokens: int = 1000, overlap_tokens: int = 100, mod
     Returns:
         List[str]: List of text chunks
     """
-    counter = TokenCounter(model)
+    counter = get_token_counter(model)
     return counter.chunk_text(text, max_tokens, overlap_tokens)
 
-def chunk_text_by_paragraphs(text: str, max_tokens: int = 1000, overlap_paragraphs: int = 1, model: str = "gpt-3.5-turbo") -> List[str]:
+def chunk_text_by_paragraphs(text: str, max_tokens: int = 1000, overlap_paragraphs: int = 1, model: str = DEFAULT_MODEL) -> List[str]:
     """
     Convenience function to chunk text by paragraphs with overlap.
     
@@ -238,5 +411,19 @@ def chunk_text_by_paragraphs(text: str, max_tokens: int = 1000, overlap_paragrap
     Returns:
         List[str]: List of text chunks
     """
-    counter = TokenCounter(model)
-    return counter.chunk_text_by_paragraphs(text, max_tokens, overlap_paragraphs) 
\ No newline at end of file
+    counter = get_token_counter(model)
+    return counter.chunk_text_by_paragraphs(text, max_tokens, overlap_paragraphs)
+
+def tokenize_document(text: str, max_piece_tokens: int = 1000, model: str = DEFAULT_MODEL) -> TokenizedDocument:
+    """
+    Convenience function to tokenize text once for counting, chunking and cost estimation.
+    
+    Args:
+        text (str): The text to tokenize
+        max_piece_tokens (int): Sentences longer than this are split
+        model (str): The model to use for token counting
+        
+    Returns:
+        TokenizedDocument: The tokenized document
+    """
+    return get_token_counter(model).tokenize(text, max_piece_tokens)
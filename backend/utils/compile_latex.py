@@ -1,11 +1,24 @@
-import subprocess
+import asyncio
+import hashlib
 import os
 import uuid
 import shutil
+import logging
+from typing import Dict, Optional, Tuple
 
-def compile_latex_to_pdf(latex_code: str) -> str:
+from .metrics import LOG_SAMPLE_RATE, log_event, track
+
+logger = logging.getLogger(__name__)
+
+PDFLATEX_MISSING = "pdflatex is not installed. Please install a LaTeX distribution like MiKTeX or TeX Live."
+
+# pdflatex output kept in logs; the interesting part of a failure is at the end
+LOG_OUTPUT_CHARS = 2000
+
+def _prepare_work_dir(latex_code: str, scratch_dir: Optional[str] = None) -> Tuple[str, str, str]:
+    """Create a fresh job directory containing document.tex; returns (work_dir, tex_path, pdf_path)"""
     # Create temp directory if it doesn't exist
-    temp_dir = os.path.join(os.getcwd(), "temp")
+    temp_dir = scratch_dir or os.path.join(os.getcwd(), "temp")
     if not os.path.exists(temp_dir):
         os.makedirs(temp_dir)
 
@@ -16,52 +29,281 @@ def compile_latex_to_pdf(latex_code: str) -> str:
     tex_path = os.path.join(work_dir, "document.tex")
     pdf_path = os.path.join(work_dir, "document.pdf")
 
-    # Print the LaTeX code being compiled
-    print("Compiling LaTeX code:")
-    print(latex_code)
-    print("-" * 80)
-
     with open(tex_path, "w", encoding="utf-8") as f:
         f.write(latex_code)
 
-    try:
-        # Check if pdflatex is installed
+    return work_dir, tex_path, pdf_path
+
+def split_preamble(latex_code: str) -> Optional[Tuple[str, str]]:
+    """Split a document into (preamble, body) at \\begin{document}, or None if it has none"""
+    index = latex_code.find("\\begin{document}")
+    if index == -1:
+        return None
+    return latex_code[:index], latex_code[index:]
+
+class LatexCompiler:
+    def __init__(
+        self,
+        max_concurrent_jobs: int = 2,
+        timeout: float = 60.0,
+        scratch_dir: Optional[str] = None,
+        use_formats: bool = False,
+        format_dir: str = "fmt_cache"
+    ):
+        """
+        Run pdflatex jobs as asyncio subprocesses with a bounded number in flight.
+
+        Args:
+            max_concurrent_jobs (int): Maximum number of pdflatex processes running at once
+            timeout (float): Default per-job timeout in seconds
+            scratch_dir (Optional[str]): Where job directories are created; point this at a tmpfs mount
+                such as /dev/shm to keep intermediate files off disk. Defaults to ./temp
+            use_formats (bool): Dump each distinct preamble into a precompiled format file and
+                compile only the document body against it
+            format_dir (str): Where format files are kept
+        """
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.timeout = timeout
+        self.scratch_dir = scratch_dir
+        self.use_formats = use_formats
+        self.format_dir = os.path.abspath(format_dir)
+        self._slots = asyncio.Semaphore(max_concurrent_jobs)
+        self._format_locks: Dict[str, asyncio.Lock] = {}
+        self._broken_formats = set()
+
+        # Filled in by probe()
+        self.pdflatex_version: Optional[str] = None
+        self._probed = False
+        self._probe_lock = asyncio.Lock()
+
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.cancelled = 0
+        self.formats_built = 0
+        self.format_fallbacks = 0
+
+    @property
+    def work_root(self) -> str:
+        """Directory job directories are created in"""
+        return self.scratch_dir or os.path.join(os.getcwd(), "temp")
+
+    def cleanup(self, pdf_path: str) -> None:
+        """Remove the job directory of a PDF returned by compile() once it has been copied out"""
+        shutil.rmtree(os.path.dirname(pdf_path), ignore_errors=True)
+
+    async def probe(self) -> bool:
+        """
+        Check once whether pdflatex is available and remember the result.
+
+        Returns:
+            bool: True if pdflatex can be run
+        """
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "pdflatex", "--version",
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stdout, _ = await proc.communicate()
+            if proc.returncode == 0:
+                self.pdflatex_version = stdout.decode(errors="replace").splitlines()[0]
+        except FileNotFoundError:
+            self.pdflatex_version = None
+        self._probed = True
+
+        if self.pdflatex_version:
+            logger.info(f"Using {self.pdflatex_version}")
+        else:
+            logger.warning(PDFLATEX_MISSING)
+        return self.pdflatex_version is not None
+
+    async def compile(self, latex_code: str, timeout: Optional[float] = None, use_format: Optional[bool] = None) -> str:
+        """
+        Compile LaTeX source to a PDF without blocking the event loop.
+
+        Args:
+            latex_code (str): Complete LaTeX document
+            timeout (Optional[float]): Seconds before pdflatex is killed; defaults to self.timeout
+            use_format (Optional[bool]): Compile against a precompiled preamble format; defaults to self.use_formats
+
+        Returns:
+            str: Path to the generated PDF inside its job directory; pass it to
+            cleanup() once the PDF has been copied out
+        """
+        if not self._probed:
+            async with self._probe_lock:
+                if not self._probed:
+                    await self.probe()
+        if self.pdflatex_version is None:
+            raise Exception(f"LaTeX compilation failed: {PDFLATEX_MISSING}")
+
+        if self.use_formats if use_format is None else use_format:
+            parts = split_preamble(latex_code)
+            format_name = await self._ensure_format(parts[0]) if parts else None
+            if format_name is not None:
+                try:
+                    return await self._compile_job(parts[1], timeout, format_name)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Something in the preamble didn't survive dumping; a full compile
+                    # gives the same result it always did
+                    logger.warning(f"Format compile with {format_name} failed, retrying without it: {str(e)[:200]}")
+                    self.format_fallbacks += 1
+
+        return await self._compile_job(latex_code, timeout)
+
+    async def _compile_job(self, latex_code: str, timeout: Optional[float], format_name: Optional[str] = None) -> str:
+        work_dir, tex_path, pdf_path = _prepare_work_dir(latex_code, self.scratch_dir)
+        args = ["pdflatex", "-interaction=nonstopmode"]
+        if format_name is not None:
+            args.append(f"-fmt={format_name}")
+        args.append(tex_path)
+
+        log_event(logger, logging.DEBUG, "latex_compile_start", LOG_SAMPLE_RATE,
+                  work_dir=work_dir, format=format_name, source_chars=len(latex_code), source_head=latex_code[:500])
+        try:
+            with track("compile"):
+                stdout, stderr, returncode = await self._run(
+                    args,
+                    work_dir,
+                    timeout or self.timeout,
+                    env=self._format_env() if format_name is not None else None
+                )
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise Exception(f"LaTeX compilation failed: timed out after {timeout or self.timeout} seconds")
+        except asyncio.CancelledError:
+            # The process has already been killed by _run
+            self.cancelled += 1
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+        except BaseException:
+            self.failed += 1
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+
+        if returncode != 0 or not os.path.exists(pdf_path):
+            self.failed += 1
+            shutil.rmtree(work_dir, ignore_errors=True)
+            if returncode != 0:
+                error_msg = f"LaTeX compilation failed:\nSTDOUT:\n{stdout}\nSTDERR:\n{stderr}"
+            else:
+                error_msg = "LaTeX compilation failed: PDF was not generated"
+            log_event(logger, logging.ERROR, "latex_compile_failed", format=format_name, returncode=returncode,
+                      stdout_tail=stdout[-LOG_OUTPUT_CHARS:], stderr_tail=stderr[-LOG_OUTPUT_CHARS:])
+            raise Exception(error_msg)
+
+        log_event(logger, logging.DEBUG, "latex_compile_output", LOG_SAMPLE_RATE,
+                  format=format_name, stdout_tail=stdout[-LOG_OUTPUT_CHARS:])
+        self.completed += 1
+        return pdf_path
+
+    async def _ensure_format(self, preamble: str) -> Optional[str]:
+        """
+        Return the name of a format file for this preamble, building it if needed.
+
+        The name is a hash of the preamble and the pdflatex version, so editing
+        templates/base.tex or upgrading TeX produces a new format automatically.
+        Returns None if the format can't be built.
+        """
+        digest = hashlib.sha256(f"{self.pdflatex_version}\0{preamble}".encode("utf-8")).hexdigest()
+        name = f"cheatsheet_{digest[:16]}"
+        fmt_path = os.path.join(self.format_dir, name + ".fmt")
+        if os.path.exists(fmt_path):
+            return name
+        if name in self._broken_formats:
+            return None
+
+        lock = self._format_locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            if os.path.exists(fmt_path):
+                return name
+            if name in self._broken_formats:
+                return None
+
+            os.makedirs(self.format_dir, exist_ok=True)
+            # Build under a unique job name and rename, so other workers never see a partial file
+            build_name = f"{name}_{uuid.uuid4().hex[:8]}"
+            with open(os.path.join(self.format_dir, build_name + ".tex"), "w", encoding="utf-8") as f:
+                f.write(preamble)
+
+            try:
+                stdout, _, returncode = await self._run(
+                    ["pdflatex", "-ini", "-interaction=nonstopmode", f"-jobname={build_name}",
+                     f"&pdflatex {build_name}.tex\\dump"],
+                    self.format_dir,
+                    self.timeout
+                )
+                built = os.path.join(self.format_dir, build_name + ".fmt")
+                if returncode != 0 or not os.path.exists(built):
+                    logger.warning(f"Could not build LaTeX format {name}:\n{stdout[-2000:]}")
+                    self._broken_formats.add(name)
+                    return None
+                os.replace(built, fmt_path)
+                self.formats_built += 1
+                logger.info(f"Built LaTeX format {name}")
+                return name
+            except asyncio.TimeoutError:
+                logger.warning(f"Timed out building LaTeX format {name}")
+                self._broken_formats.add(name)
+                return None
+            finally:
+                for ext in (".tex", ".log", ".fmt"):
+                    leftover = os.path.join(self.format_dir, build_name + ext)
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+
+    def _format_env(self) -> Dict[str, str]:
+        # The trailing separator keeps the distribution's default format path
+        env = dict(os.environ)
+        env["TEXFORMATS"] = self.format_dir + os.pathsep + env.get("TEXFORMATS", "")
+        return env
+
+    async def _run(self, args, cwd: str, timeout: float, env: Optional[Dict[str, str]] = None) -> Tuple[str, str, int]:
+        """Run one pdflatex process once a slot is free, killing it on timeout or cancellation"""
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+
+        self.running += 1
         try:
-            subprocess.run(["pdflatex", "--version"], 
-                         stdout=subprocess.PIPE, 
-                         stderr=subprocess.PIPE, 
-                         check=True)
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            raise Exception("pdflatex is not installed. Please install a LaTeX distribution like MiKTeX or TeX Live.")
-
-        # Run pdflatex
-        result = subprocess.run(
-            ["pdflatex", "-interaction=nonstopmode", tex_path],
-            cwd=work_dir,
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        
-        print("LaTeX output:")
-        print(result.stdout)
-        if result.stderr:
-            print("LaTeX errors:")
-            print(result.stderr)
-
-        if not os.path.exists(pdf_path):
-            raise Exception("PDF was not generated")
-
-        return pdf_path 
-    except subprocess.CalledProcessError as e:
-        error_msg = f"LaTeX compilation failed:\nSTDOUT:\n{e.stdout}\nSTDERR:\n{e.stderr}"
-        print(error_msg)
-        # Clean up the temporary directory
-        shutil.rmtree(work_dir, ignore_errors=True)
-        raise Exception(error_msg)
-    except Exception as e:
-        print("LaTeX compile error:", str(e))
-        # Clean up the temporary directory
-        shutil.rmtree(work_dir, ignore_errors=True)
-        raise Exception(f"LaTeX compilation failed: {str(e)}")
+            proc = await asyncio.create_subprocess_exec(
+                *args,
+                cwd=cwd,
+                env=env,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+            except BaseException:
+                if proc.returncode is None:
+                    proc.kill()
+                    await proc.wait()
+                raise
+            return stdout.decode(errors="replace"), stderr.decode(errors="replace"), proc.returncode
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, object]:
+        """Return queue depth and job counters for monitoring"""
+        return {
+            "pdflatex": self.pdflatex_version,
+            "max_concurrent_jobs": self.max_concurrent_jobs,
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "cancelled": self.cancelled,
+            "formats_built": self.formats_built,
+            "format_fallbacks": self.format_fallbacks,
+        }
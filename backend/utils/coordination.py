@@ -0,0 +1,308 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class Coordinator:
+    def __init__(self, path: str, busy_timeout: float = 10.0):
+        """
+        State shared by every worker process on this machine, kept in one SQLite database in WAL mode.
+
+        It holds the rate-limit buckets, the concurrency slots in use, leases
+        on work in progress and small cached values. Every change is a short
+        BEGIN IMMEDIATE transaction, so processes see each other's updates at
+        once. Rows owned by a process that has died are ignored and cleared.
+
+        Args:
+            path (str): Location of the database file; all workers must use the same one
+            busy_timeout (float): Seconds to wait for another process's write lock
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS buckets (
+                name TEXT PRIMARY KEY,
+                requests REAL NOT NULL,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL,
+                paused_until REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS slots (
+                name TEXT NOT NULL,
+                holder TEXT NOT NULL,
+                pid INTEGER NOT NULL,
+                expires REAL NOT NULL,
+                PRIMARY KEY (name, holder)
+            );
+            CREATE TABLE IF NOT EXISTS leases (
+                key TEXT PRIMARY KEY,
+                holder TEXT NOT NULL,
+                pid INTEGER NOT NULL,
+                expires REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS kv (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            );
+            """
+        )
+        # One connection shared by the event loop and worker threads; transactions must not interleave
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._puts = 0
+
+    def holder_id(self) -> str:
+        """A fresh identifier for a slot or lease owned by this process"""
+        return f"{self._pid}:{uuid.uuid4().hex}"
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _clear_dead(self, conn: sqlite3.Connection, table: str, now: float) -> None:
+        """Delete rows that expired or whose process has exited"""
+        conn.execute(f"DELETE FROM {table} WHERE expires < ?", (now,))
+        for (pid,) in conn.execute(f"SELECT DISTINCT pid FROM {table}").fetchall():
+            if pid != self._pid and not _pid_alive(pid):
+                conn.execute(f"DELETE FROM {table} WHERE pid = ?", (pid,))
+
+    # Rate limiting
+
+    def _bucket(self, conn: sqlite3.Connection, name: str, rpm: float, tpm: float, now: float) -> Tuple[float, float, float]:
+        row = conn.execute("SELECT requests, tokens, updated, paused_until FROM buckets WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return float(rpm), float(tpm), 0.0
+        requests, tokens, updated, paused_until = row
+        elapsed = max(0.0, now - updated)
+        return (
+            min(rpm, requests + elapsed * rpm / 60),
+            min(tpm, tokens + elapsed * tpm / 60),
+            paused_until,
+        )
+
+    def _save_bucket(self, conn: sqlite3.Connection, name: str, requests: float, tokens: float, now: float, paused_until: float) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO buckets (name, requests, tokens, updated, paused_until) VALUES (?, ?, ?, ?, ?)",
+            (name, requests, tokens, now, paused_until)
+        )
+
+    def take(self, name: str, rpm: float, tpm: float, tokens: float) -> float:
+        """
+        Take one request and `tokens` tokens from a shared bucket.
+
+        Returns:
+            float: 0 if they were taken, otherwise seconds to wait before asking again
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            requests, available, paused_until = self._bucket(conn, name, rpm, tpm, now)
+            delay = paused_until - now
+            if delay <= 0:
+                if requests >= 1 and available >= tokens:
+                    requests -= 1
+                    available -= tokens
+                    delay = 0.0
+                else:
+                    delay = max((1 - requests) * 60 / rpm, (tokens - available) * 60 / tpm, 0.001)
+            self._save_bucket(conn, name, requests, available, now, paused_until)
+        return delay
+
+    def adjust(
+        self,
+        name: str,
+        rpm: float,
+        tpm: float,
+        refund_tokens: float = 0.0,
+        max_requests: Optional[float] = None,
+        max_tokens: Optional[float] = None,
+        pause_seconds: float = 0.0
+    ) -> None:
+        """Refund tokens, lower the buckets to what the server reports, or pause every worker"""
+        now = time.time()
+        with self._transaction() as conn:
+            requests, tokens, paused_until = self._bucket(conn, name, rpm, tpm, now)
+            tokens = min(tpm, tokens + refund_tokens)
+            if max_requests is not None:
+                requests = min(requests, max_requests)
+            if max_tokens is not None:
+                tokens = min(tokens, max_tokens)
+            if pause_seconds > 0:
+                paused_until = max(paused_until, now + pause_seconds)
+            self._save_bucket(conn, name, requests, tokens, now, paused_until)
+
+    def bucket(self, name: str, rpm: float, tpm: float) -> Tuple[float, float]:
+        """Current (requests, tokens) in a shared bucket"""
+        with self._lock:
+            requests, tokens, _ = self._bucket(self._conn, name, rpm, tpm, time.time())
+        return requests, tokens
+
+    # Concurrency slots
+
+    def claim_slot(self, name: str, limit: int, holder: str, lease_seconds: float) -> Tuple[bool, int]:
+        """Take one of `limit` slots for holder, if one is free; also returns how many are now in use"""
+        now = time.time()
+        with self._transaction() as conn:
+            self._clear_dead(conn, "slots", now)
+            (in_use,) = conn.execute("SELECT COUNT(*) FROM slots WHERE name = ?", (name,)).fetchone()
+            if in_use >= limit:
+                return False, in_use
+            conn.execute(
+                "INSERT OR REPLACE INTO slots (name, holder, pid, expires) VALUES (?, ?, ?, ?)",
+                (name, holder, self._pid, now + lease_seconds)
+            )
+        return True, in_use + 1
+
+    def release_slot(self, name: str, holder: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM slots WHERE name = ? AND holder = ?", (name, holder))
+
+    def slots_in_use(self, name: str) -> int:
+        with self._lock:
+            (in_use,) = self._conn.execute(
+                "SELECT COUNT(*) FROM slots WHERE name = ? AND expires >= ?", (name, time.time())
+            ).fetchone()
+        return in_use
+
+    # Leases on work in progress
+
+    def claim_lease(self, key: str, holder: str, lease_seconds: float) -> bool:
+        """Record that holder is doing the work for key, unless a live process already is"""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT holder, pid, expires FROM leases WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[0] != holder and row[2] >= now and (row[1] == self._pid or _pid_alive(row[1])):
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (key, holder, pid, expires) VALUES (?, ?, ?, ?)",
+                (key, holder, self._pid, now + lease_seconds)
+            )
+        return True
+
+    def release_lease(self, key: str, holder: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE key = ? AND holder = ?", (key, holder))
+
+    # Small shared values
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE namespace = ? AND key = ? AND expires >= ?", (namespace, key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, namespace: str, key: str, value: str, ttl_seconds: float) -> None:
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, expires) VALUES (?, ?, ?, ?)",
+                (namespace, key, value, now + ttl_seconds)
+            )
+            self._puts += 1
+            if self._puts % 100 == 0:
+                conn.execute("DELETE FROM kv WHERE expires < ?", (now,))
+
+    def stats(self) -> Dict[str, int]:
+        now = time.time()
+        with self._lock:
+            slots = self._conn.execute("SELECT COUNT(*) FROM slots WHERE expires >= ?", (now,)).fetchone()[0]
+            leases = self._conn.execute("SELECT COUNT(*) FROM leases WHERE expires >= ?", (now,)).fetchone()[0]
+            values = self._conn.execute("SELECT COUNT(*) FROM kv WHERE expires >= ?", (now,)).fetchone()[0]
+        return {"slots_in_use": slots, "leases": leases, "values": values}
+
+class SharedSemaphore:
+    def __init__(self, coordinator: Coordinator, name: str, limit: int, lease_seconds: float = 600, poll_interval: float = 0.02):
+        """
+        A semaphore whose `limit` is shared by every process using the same coordinator.
+
+        Args:
+            coordinator (Coordinator): Shared state
+            name (str): Semaphores with the same name share their slots
+            limit (int): Slots across all processes
+            lease_seconds (float): A slot held longer than this is assumed abandoned
+            poll_interval (float): Seconds between attempts while every slot is taken
+        """
+        self.coordinator = coordinator
+        self.name = name
+        self.limit = limit
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        # No process can hold more than `limit` slots, so its own waiters queue locally first
+        self._local = asyncio.Semaphore(limit)
+        self._held: List[str] = []
+        # Slots in use across all processes as of our last claim, so locked() needn't query
+        self._observed = 0
+
+        self.waits = 0
+
+    async def acquire(self) -> None:
+        await self._local.acquire()
+        holder = self.coordinator.holder_id()
+        try:
+            while True:
+                claimed, self._observed = await asyncio.to_thread(
+                    self.coordinator.claim_slot, self.name, self.limit, holder, self.lease_seconds
+                )
+                if claimed:
+                    break
+                self.waits += 1
+                await asyncio.sleep(self.poll_interval)
+        except BaseException:
+            # The claim may have gone through just as we were cancelled
+            try:
+                await asyncio.to_thread(self.coordinator.release_slot, self.name, holder)
+            finally:
+                self._local.release()
+            raise
+        self._held.append(holder)
+
+    async def release(self) -> None:
+        holder = self._held.pop()
+        try:
+            await asyncio.to_thread(self.coordinator.release_slot, self.name, holder)
+        finally:
+            self._observed = max(0, self._observed - 1)
+            self._local.release()
+
+    def locked(self) -> bool:
+        """Whether an acquire would wait, judged from this process's last look at the shared slots"""
+        return self._local.locked() or self._observed >= self.limit
+
+    async def __aenter__(self) -> None:
+        await self.acquire()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.release()
@@ -0,0 +1,216 @@
+import logging
+import random
+import re
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Mersenne prime for the (a * x + b) mod p hash family
+_PRIME = (1 << 61) - 1
+
+_LIST_TOKEN = re.compile(r'\\begin\{(?:itemize|enumerate)\}|\\end\{(?:itemize|enumerate)\}|\\item\b')
+_COMMAND = re.compile(r'\\[a-zA-Z]+\*?')
+_WORD = re.compile(r'\w+')
+
+@dataclass
+class DedupReport:
+    bullets: int
+    removed: int
+    chars_removed: int
+
+class _List:
+    """One top-level list: where it begins, its \\item starts, and the span of its \\end"""
+
+    def __init__(self, begin: int, items: List[int], end: int, end_stop: int):
+        self.begin = begin
+        self.items = items
+        self.end = end
+        self.end_stop = end_stop
+
+class _Summary:
+    """A summary split into its top-level lists' \\item spans and the text between them"""
+
+    def __init__(self, latex: str):
+        self.latex = latex
+        self.items: List[str] = []
+        self.lists: List[_List] = []
+
+        depth = 0
+        begin = 0
+        starts: List[int] = []
+        for match in _LIST_TOKEN.finditer(latex):
+            token = match.group()
+            if token.startswith("\\begin"):
+                if depth == 0:
+                    begin = match.start()
+                    starts = []
+                depth += 1
+            elif token.startswith("\\end"):
+                # A stray \end outside any list is just text
+                if depth == 0:
+                    continue
+                depth -= 1
+                # A list without top-level items is left in the text between lists
+                if depth == 0 and starts:
+                    self.lists.append(_List(begin, starts, match.start(), match.end()))
+            elif depth == 1:
+                starts.append(match.start())
+
+        for environment in self.lists:
+            bounds = environment.items + [environment.end]
+            self.items.extend(latex[start:stop] for start, stop in zip(bounds, bounds[1:]))
+
+    def render(self, dropped: Set[int]) -> str:
+        """The summary without the items at the given indices; empty if none are left"""
+        if not self.lists:
+            return self.latex
+        if len(dropped) == len(self.items):
+            return ""
+
+        parts = []
+        position = 0
+        index = 0
+        for environment in self.lists:
+            kept = [
+                self.items[i] for i in range(index, index + len(environment.items)) if i not in dropped
+            ]
+            index += len(environment.items)
+            parts.append(self.latex[position:environment.begin])
+            # A list left without items would not compile, so it goes entirely
+            if kept:
+                parts.append(self.latex[environment.begin:environment.items[0]])
+                parts.extend(kept)
+                parts.append(self.latex[environment.end:environment.end_stop])
+            position = environment.end_stop
+        parts.append(self.latex[position:])
+        return "".join(parts)
+
+def _shingles(item: str, size: int) -> Set[int]:
+    words = _WORD.findall(_COMMAND.sub(" ", item[len("\\item"):]).lower())
+    if len(words) < size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))}
+    return {
+        zlib.crc32(" ".join(words[i:i + size]).encode("utf-8"))
+        for i in range(len(words) - size + 1)
+    }
+
+class BulletDeduplicator:
+    def __init__(self, threshold: float = 0.7, num_perm: int = 32, bands: int = 8, shingle_size: int = 3):
+        """
+        Merges near-duplicate \\item bullets across chunk summaries.
+
+        Bullets are compared by the Jaccard similarity of their word shingles.
+        MinHash signatures bucketed by LSH bands propose candidates, so each
+        bullet is checked only against the few earlier bullets it collides
+        with rather than against all of them.
+
+        Args:
+            threshold (float): Jaccard similarity at which two bullets count as duplicates
+            num_perm (int): MinHash signature length
+            bands (int): LSH bands; num_perm must divide evenly into them
+            shingle_size (int): Words per shingle
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        rng = random.Random(0)
+        self._perms = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+        self.bullets = 0
+        self.removed = 0
+        self.chars_removed = 0
+
+    def _signature(self, shingles: Set[int]) -> List[int]:
+        return [min((a * s + b) % _PRIME for s in shingles) for a, b in self._perms]
+
+    def dedup(self, summaries: List[str]) -> Tuple[List[str], DedupReport]:
+        """
+        Remove near-duplicate bullets, keeping each group where it first appears.
+
+        The longest bullet of a group replaces the first one, so merging never
+        loses the most detailed wording.
+
+        Args:
+            summaries (List[str]): Itemize environments in document order
+
+        Returns:
+            Tuple[List[str], DedupReport]: The summaries without duplicates (empty
+            lists are dropped) and what was removed
+        """
+        parsed = [_Summary(summary) for summary in summaries]
+        # (summary index, item index) of each bullet, in document order
+        positions = [(i, j) for i, summary in enumerate(parsed) for j in range(len(summary.items))]
+
+        buckets: Dict[Tuple[int, tuple], List[int]] = defaultdict(list)
+        representatives: List[Tuple[int, int]] = []
+        shingle_sets: List[Set[int]] = []
+        # Longest text seen in each group, and the positions it absorbed
+        best: List[str] = []
+        dropped: Set[Tuple[int, int]] = set()
+
+        for position in positions:
+            item = parsed[position[0]].items[position[1]]
+            shingles = _shingles(item, self.shingle_size)
+            signature = self._signature(shingles)
+            keys = [
+                (band, tuple(signature[band * self.rows:(band + 1) * self.rows]))
+                for band in range(self.bands)
+            ]
+
+            match = None
+            for candidate in {c for key in keys for c in buckets.get(key, ())}:
+                other = shingle_sets[candidate]
+                if len(shingles & other) / len(shingles | other) >= self.threshold:
+                    match = candidate
+                    break
+
+            if match is None:
+                group = len(representatives)
+                representatives.append(position)
+                shingle_sets.append(shingles)
+                best.append(item)
+                for key in keys:
+                    buckets[key].append(group)
+            else:
+                dropped.add(position)
+                if len(item.strip()) > len(best[match].strip()):
+                    best[match] = item
+
+        for group, (i, j) in enumerate(representatives):
+            parsed[i].items[j] = best[group]
+
+        result = []
+        for i, summary in enumerate(parsed):
+            rendered = summary.render({j for j in range(len(summary.items)) if (i, j) in dropped})
+            if rendered:
+                result.append(rendered)
+
+        report = DedupReport(
+            bullets=len(positions),
+            removed=len(dropped),
+            chars_removed=sum(len(s) for s in summaries) - sum(len(s) for s in result)
+        )
+        self.bullets += report.bullets
+        self.removed += report.removed
+        self.chars_removed += report.chars_removed
+        if report.removed:
+            logger.info(
+                f"Removed {report.removed} of {report.bullets} bullets as near-duplicates "
+                f"({report.chars_removed} characters)"
+            )
+        return result, report
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "bullets": self.bullets,
+            "removed": self.removed,
+            "chars_removed": self.chars_removed,
+        }
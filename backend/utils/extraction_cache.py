@@ -0,0 +1,87 @@
+import hashlib
+import os
+import zlib
+from typing import Dict, Optional, Tuple
+
+from .sqlite_lru import SqliteLRU
+
+# Bump when extraction or sanitizing changes what a file turns into
+EXTRACTION_VERSION = "1"
+
+
+class ExtractionCache(SqliteLRU):
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 512 * 1024 * 1024,
+        compress_level: int = 6,
+        touch_batch: int = 100
+    ):
+        """
+        Initialize an on-disk cache of extracted, sanitized text, keyed by each uploaded file's contents.
+
+        Text is stored zlib-compressed; max_bytes bounds the compressed total.
+
+        Args:
+            path (str): Location of the SQLite database file
+            max_bytes (int): Upper bound on the stored (compressed) size before LRU eviction kicks in
+            compress_level (int): zlib level; sanitized text compresses about 3-4x at the default
+            touch_batch (int): Hits noted before their recency is written on its own
+        """
+        super().__init__(
+            path,
+            "texts",
+            "data BLOB NOT NULL, text_bytes INTEGER NOT NULL, source_bytes INTEGER NOT NULL",
+            max_bytes,
+            touch_batch
+        )
+        self.compress_level = compress_level
+        self.bytes_parsed_saved = 0
+
+    @staticmethod
+    def make_key(filename: str, content: bytes) -> str:
+        """
+        Fingerprint an uploaded file.
+
+        The extension is part of the key because it decides how the bytes are read.
+
+        Args:
+            filename (str): The uploaded file's name
+            content (bytes): The uploaded file's contents
+
+        Returns:
+            str: Hex digest used as the cache key
+        """
+        digest = hashlib.sha256()
+        for part in (EXTRACTION_VERSION.encode("utf-8"), os.path.splitext(filename)[1].lower().encode("utf-8")):
+            digest.update(part)
+            digest.update(b"\0")
+        digest.update(content)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached text for key and mark it as recently used"""
+        row = self._get(key, "data, source_bytes")
+        return zlib.decompress(row[0]).decode("utf-8") if row else None
+
+    def _on_hit(self, row: Tuple) -> None:
+        self.bytes_parsed_saved += row[1]
+
+    def put(self, key: str, text: str, source_bytes: int) -> None:
+        """
+        Store extracted text and evict least recently used entries past max_bytes.
+
+        Args:
+            key (str): Key from make_key
+            text (str): The sanitized text
+            source_bytes (int): Size of the uploaded file, used for bytes-saved accounting
+        """
+        encoded = text.encode("utf-8")
+        data = zlib.compress(encoded, self.compress_level)
+        self._put(key, len(data), {"data": data, "text_bytes": len(encoded), "source_bytes": source_bytes})
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit rate and bytes saved for monitoring"""
+        with self._lock:
+            (text_bytes,) = self._conn.execute(f"SELECT COALESCE(SUM(text_bytes), 0) FROM {self.table}").fetchone()
+        return {**super().stats(), "text_bytes": text_bytes, "bytes_parsed_saved": self.bytes_parsed_saved}
@@ -0,0 +1,19 @@
+from multiprocessing import shared_memory
+
+import fitz
+
+# Runs in the extraction pool's processes. They are spawned rather than forked, so each one
+# imports only this module and what it needs, not the server's caches and connections.
+
+def extract_page_range(shm_name: str, size: int, start: int, stop: int) -> str:
+    """Extract text from pages [start, stop) of a PDF held in shared memory, reading it in place"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        view = shm.buf[:size]
+        try:
+            with fitz.open(stream=view, filetype="pdf") as doc:
+                return "".join(doc[i].get_text() for i in range(start, stop))
+        finally:
+            view.release()
+    finally:
+        shm.close()
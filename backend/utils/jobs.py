@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("extract", "chunk", "summarize", "dedup", "reduce", "compile")
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+class ShutdownError(Exception):
+    """A job was still queued or running when the server stopped"""
+    status_code = 503
+
+class ProgressReporter:
+    """Receives progress from the pipeline; the default implementation ignores it"""
+
+    def stage(self, name: str, status: str, done: Optional[int] = None, total: Optional[int] = None) -> None:
+        pass
+
+    def partial(self, index: int, text: str) -> None:
+        pass
+
+class ProgressFanout(ProgressReporter):
+    """Forwards progress to several reporters; ones added late are first brought up to date"""
+
+    def __init__(self):
+        self.reporters: List[ProgressReporter] = []
+        self._stages: Dict[str, tuple] = {}
+        self._partials: List[tuple] = []
+
+    def add(self, reporter: ProgressReporter) -> None:
+        for name, (status, done, total) in self._stages.items():
+            reporter.stage(name, status, done, total)
+        for index, text in self._partials:
+            reporter.partial(index, text)
+        self.reporters.append(reporter)
+
+    def remove(self, reporter: ProgressReporter) -> None:
+        self.reporters.remove(reporter)
+
+    def stage(self, name: str, status: str, done: Optional[int] = None, total: Optional[int] = None) -> None:
+        self._stages[name] = (status, done, total)
+        for reporter in self.reporters:
+            reporter.stage(name, status, done, total)
+
+    def partial(self, index: int, text: str) -> None:
+        self._partials.append((index, text))
+        for reporter in self.reporters:
+            reporter.partial(index, text)
+
+class Job(ProgressReporter):
+    def __init__(self, payload: Any):
+        """
+        A unit of background work with per-stage progress and an event log.
+
+        Args:
+            payload (Any): Input handed to the job runner; released once the job finishes
+        """
+        self.id = uuid.uuid4().hex
+        self.payload = payload
+        self.status = "queued"
+        self.stages: Dict[str, Dict[str, Any]] = {name: {"status": "pending"} for name in STAGES}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.error_status = 500
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+        # Append-only log of events for the SSE stream
+        self.events: List[Dict[str, Any]] = []
+        self._changed = asyncio.Event()
+        self._finished = asyncio.Event()
+
+    def stage(self, name: str, status: str, done: Optional[int] = None, total: Optional[int] = None) -> None:
+        """Record the status of a pipeline stage, e.g. stage("summarize", "running", 3, 10)"""
+        info: Dict[str, Any] = {"status": status}
+        if done is not None:
+            info["done"] = done
+        if total is not None:
+            info["total"] = total
+        self.stages[name] = info
+        self._emit("progress", {"stage": name, **info})
+
+    def partial(self, index: int, text: str) -> None:
+        """Publish an intermediate result, such as one chunk's summary"""
+        self._emit("partial", {"index": index, "text": text})
+
+    def start(self) -> None:
+        self.status = "running"
+        self._emit("status", {"status": self.status})
+
+    def succeed(self, result: Dict[str, Any]) -> None:
+        self.status = "done"
+        self.result = result
+        self._finish("done", result)
+
+    def fail(self, error: Exception) -> None:
+        self.status = "failed"
+        self.error = str(error)
+        self.error_status = getattr(error, "status_code", 500)
+        self._finish("error", {"error": self.error, "status_code": self.error_status})
+
+    @property
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+    async def wait(self) -> None:
+        """Wait until the job has succeeded or failed"""
+        await self._finished.wait()
+
+    async def stream_events(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield every event from the beginning, then new ones as they happen, until the job finishes"""
+        index = 0
+        while True:
+            changed = self._changed
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.finished:
+                return
+            await changed.wait()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "stages": self.stages,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+    def _finish(self, event: str, data: Dict[str, Any]) -> None:
+        self.finished_at = time.time()
+        self.payload = None
+        # The result supersedes the partial summaries; keep their place in the log, not their
+        # text, so finished jobs don't hold every chunk's summary for the whole TTL
+        for i, logged in enumerate(self.events):
+            if logged["event"] == "partial":
+                self.events[i] = {"event": "partial", "data": {"index": logged["data"]["index"]}}
+        self._emit(event, data)
+        self._finished.set()
+
+    def _emit(self, event: str, data: Dict[str, Any]) -> None:
+        self.events.append({"event": event, "data": data})
+        # Wake current listeners and give later ones a fresh event to wait on
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+class JobManager:
+    def __init__(
+        self,
+        runner: Callable[[Job], Awaitable[Dict[str, Any]]],
+        workers: int = 2,
+        max_queue: int = 32,
+        ttl_seconds: float = 3600
+    ):
+        """
+        Run jobs on a fixed number of background workers fed by a bounded queue.
+
+        Args:
+            runner (Callable[[Job], Awaitable[Dict[str, Any]]]): Coroutine that processes a job and returns its result
+            workers (int): Number of jobs processed concurrently
+            max_queue (int): Jobs allowed to wait before submit() starts rejecting
+            ttl_seconds (float): How long finished jobs stay queryable
+        """
+        self.runner = runner
+        self.workers = workers
+        self.max_queue = max_queue
+        self.ttl_seconds = ttl_seconds
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._jobs: Dict[str, Job] = {}
+        self._stopped = False
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Cancel running jobs and fail queued ones, so nothing waiting on them hangs"""
+        self._stopped = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while not self._queue.empty():
+            job = self._queue.get_nowait()
+            job.fail(ShutdownError("Server is shutting down"))
+            self._queue.task_done()
+
+    def submit(self, payload: Any) -> Job:
+        """
+        Queue a new job.
+
+        Raises:
+            QueueFullError: If max_queue jobs are already waiting
+        """
+        if self._stopped:
+            raise QueueFullError("Server is shutting down")
+        self._prune()
+        job = Job(payload)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError("Too many jobs are queued, please retry shortly")
+        self._jobs[job.id] = job
+        return job
+
+    def submit_many(self, payloads: List[Any]) -> List[Job]:
+        """
+        Queue several jobs, all or none.
+
+        Raises:
+            QueueFullError: If the queue has no room for every one of them
+        """
+        if self._queue.qsize() + len(payloads) > self.max_queue:
+            raise QueueFullError("Too many jobs are queued, please retry shortly")
+        return [self.submit(payload) for payload in payloads]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        running = sum(1 for job in self._jobs.values() if job.status == "running")
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "running": running,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "tracked_jobs": len(self._jobs),
+        }
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            job.start()
+            try:
+                job.succeed(await self.runner(job))
+            except asyncio.CancelledError:
+                job.fail(ShutdownError("Server is shutting down"))
+                raise
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {str(e)}")
+                job.fail(e)
+            finally:
+                self._queue.task_done()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        for job_id in [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]:
+            del self._jobs[job_id]
@@ -0,0 +1,644 @@
+import logging
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from .layout import item_texts
+
+logger = logging.getLogger(__name__)
+
+# Environments the template can typeset; their contents are kept
+TEXT_ENVIRONMENTS = {"itemize", "enumerate", "description", "center", "flushleft", "quote", "tabular"}
+LIST_ENVIRONMENTS = {"itemize", "enumerate", "description"}
+# Environments whose contents are copied untouched; lstlisting needs listings, which the
+# template doesn't load, so it becomes verbatim
+VERBATIM_ENVIRONMENTS = {"verbatim": "verbatim", "verbatim*": "verbatim*", "lstlisting": "verbatim"}
+# amsmath environments that start display math, and those that only work inside math
+DISPLAY_MATH_ENVIRONMENTS = {"equation", "equation*", "align", "align*", "gather", "gather*", "multline", "multline*"}
+INNER_MATH_ENVIRONMENTS = {"split", "aligned", "cases", "matrix", "pmatrix", "bmatrix", "vmatrix", "array"}
+MATH_ENVIRONMENTS = DISPLAY_MATH_ENVIRONMENTS | INNER_MATH_ENVIRONMENTS
+# Environments where a bare & is a column separator
+ALIGNMENT_ENVIRONMENTS = {"align", "align*", "tabular"} | INNER_MATH_ENVIRONMENTS
+
+# Document structure, definitions and commands that read or write files, with the number
+# of arguments dropped along with them; None drops the rest of the line
+FORBIDDEN_COMMANDS = {
+    "documentclass": 1, "usepackage": 1, "RequirePackage": 1, "title": 1, "author": 1, "date": 1,
+    "maketitle": 0, "tableofcontents": 0, "newpage": 0, "clearpage": 0, "pagebreak": 0,
+    "pagestyle": 1, "thispagestyle": 1, "makeatletter": 0, "makeatother": 0,
+    "input": 1, "include": 1, "includeonly": 1, "includegraphics": 1,
+    "write": None, "immediate": None, "openout": None, "openin": None, "read": None, "catcode": None,
+    "def": None, "gdef": None, "edef": None, "xdef": None, "let": None,
+    "newcommand": 2, "renewcommand": 2, "providecommand": 2, "newenvironment": 3, "renewenvironment": 3,
+}
+# Commands from packages the template doesn't load, replaced by their last argument
+UNWRAP_COMMANDS = {"textcolor": 2, "colorbox": 2, "href": 2, "hl": 1, "mintinline": 2, "lstinline": 1}
+# Commands from packages the template doesn't load, dropped with their argument
+DROP_COMMANDS = {"color": 1, "label": 1, "cite": 1, "ref": 1, "footnote": 1}
+# Shorthands the model uses for number sets, which amssymb doesn't define
+MATH_SHORTHANDS = {"R": r"\mathbb{R}", "N": r"\mathbb{N}", "Z": r"\mathbb{Z}", "Q": r"\mathbb{Q}", "C": r"\mathbb{C}"}
+
+# Unicode characters pdflatex's utf8 input encoding rejects, with a math-mode replacement
+UNICODE_MATH = {
+    "≤": r"\leq", "≥": r"\geq", "≠": r"\neq", "≈": r"\approx", "≡": r"\equiv", "∼": r"\sim",
+    "→": r"\rightarrow", "←": r"\leftarrow", "↔": r"\leftrightarrow", "⇒": r"\Rightarrow",
+    "⇐": r"\Leftarrow", "⇔": r"\Leftrightarrow", "↦": r"\mapsto",
+    "∞": r"\infty", "±": r"\pm", "∓": r"\mp", "×": r"\times", "÷": r"\div", "·": r"\cdot", "∘": r"\circ",
+    "∈": r"\in", "∉": r"\notin", "⊂": r"\subset", "⊆": r"\subseteq", "⊃": r"\supset", "⊇": r"\supseteq",
+    "∪": r"\cup", "∩": r"\cap", "∅": r"\emptyset", "∀": r"\forall", "∃": r"\exists", "¬": r"\neg",
+    "∧": r"\wedge", "∨": r"\vee", "∑": r"\sum", "∏": r"\prod", "∫": r"\int", "√": r"\sqrt{}",
+    "∂": r"\partial", "∇": r"\nabla", "′": "'", "°": r"^\circ",
+    "α": r"\alpha", "β": r"\beta", "γ": r"\gamma", "δ": r"\delta", "ε": r"\epsilon", "ζ": r"\zeta",
+    "η": r"\eta", "θ": r"\theta", "ι": r"\iota", "κ": r"\kappa", "λ": r"\lambda", "μ": r"\mu",
+    "ν": r"\nu", "ξ": r"\xi", "π": r"\pi", "ρ": r"\rho", "σ": r"\sigma", "τ": r"\tau", "υ": r"\upsilon",
+    "φ": r"\phi", "χ": r"\chi", "ψ": r"\psi", "ω": r"\omega", "Γ": r"\Gamma", "Δ": r"\Delta",
+    "Θ": r"\Theta", "Λ": r"\Lambda", "Ξ": r"\Xi", "Π": r"\Pi", "Σ": r"\Sigma", "Φ": r"\Phi",
+    "Ψ": r"\Psi", "Ω": r"\Omega",
+    "ℝ": r"\mathbb{R}", "ℕ": r"\mathbb{N}", "ℤ": r"\mathbb{Z}", "ℚ": r"\mathbb{Q}", "ℂ": r"\mathbb{C}",
+}
+# Commands that only work in math mode; outside math they are wrapped in $...$ with their arguments
+MATH_ONLY_COMMANDS = {
+    "frac", "dfrac", "tfrac", "binom", "sqrt", "lim", "limsup", "liminf", "max", "min", "sup", "inf",
+    "log", "ln", "exp", "sin", "cos", "tan", "det", "mathbb", "mathcal", "mathrm", "mathbf", "mathit",
+    "vec", "hat", "bar", "overline", "tilde", "le", "ge", "ne", "to", "mid",
+    "cdots", "vdots", "ddots", "varepsilon", "varphi", "ell",
+} | {re.match(r'\\([a-zA-Z]+)', command).group(1) for command in UNICODE_MATH.values() if command.startswith("\\")}
+# Non-ASCII characters the utf8 input encoding handles on its own
+UNICODE_TEXT = set("–—‘’“”…•§¶©®™£€¿¡«»") | {chr(c) for c in range(0xC0, 0x100) if c not in (0xD7, 0xF7)}
+
+# Repairs after which the document would still have compiled; everything else is a compile error
+COSMETIC_REPAIRS = {"code_fence", "no_list"}
+
+_TOKEN = re.compile(r'\\(?:[a-zA-Z]+\*?|.)|\$\$?|[{}&%#_^\n]|[^\x00-\x7f]', re.DOTALL)
+_CODE_FENCE = re.compile(r'^\s*```[a-zA-Z]*\s*$', re.MULTILINE)
+_SPACE = re.compile(r'\s*')
+# After _ or ^, what makes it a sub- or superscript rather than part of a name like file_name
+_SCRIPT = re.compile(r'\{|\\[a-zA-Z]|\d+(?![a-zA-Z])|[a-zA-Z](?![a-zA-Z0-9])')
+# The argument of a stray sub- or superscript, when it is plain text
+_SCRIPT_ATOM = re.compile(r'\d+|[a-zA-Z]')
+# The base a stray sub- or superscript attaches to, at the end of the text before it
+_SCRIPT_BASE = re.compile(r'[a-zA-Z0-9]+$')
+_ESCAPES = {"&": r"\&", "%": r"\%", "#": r"\#", "_": r"\_", "^": r"\^{}", "$": r"\$", "{": r"\{", "}": r"\}"}
+
+@dataclass
+class LintResult:
+    latex: str
+    # Kind of each repair made, such as "unescaped_special"
+    repairs: List[str] = field(default_factory=list)
+    # The fragment could not be repaired reliably and was replaced by its plain text
+    isolated: bool = False
+
+    @property
+    def fatal(self) -> bool:
+        """Whether the original fragment would have failed to compile"""
+        return self.isolated or any(kind not in COSMETIC_REPAIRS for kind in self.repairs)
+
+def _placeholder(char: str) -> str:
+    """A visible stand-in for a character pdflatex can't typeset, such as [U+211D]"""
+    return f"[U+{ord(char):04X}]"
+
+def _escape_text(text: str) -> str:
+    out = []
+    for char in text:
+        if char in _ESCAPES:
+            out.append(_ESCAPES[char])
+        elif char == "\\":
+            out.append(r"\textbackslash{}")
+        elif ord(char) < 128 or char in UNICODE_TEXT:
+            out.append(char)
+        else:
+            out.append(_placeholder(char))
+    return "".join(out)
+
+class _Scanner:
+    """One pass over a fragment, copying it to `out` and repairing what would break the compile"""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.pos = 0
+        self.out: List[str] = []
+        self.repairs: List[str] = []
+        # Open environments, each with the number of braces open when it began
+        self.envs: List[Tuple[str, int]] = []
+        self.braces = 0
+        # Closing delimiter of the inline math mode we are in, if any, with the braces and
+        # environments open when it began
+        self.inline_math: Optional[str] = None
+        self.math_braces = 0
+        self.math_depth = 0
+        # Depths of inner math environments we wrapped in $...$ because they began outside math
+        self.wrapped: List[int] = []
+        # The inline math we are in was opened by us around one stray math atom, such as x_1
+        # or \\frac{a}{b}; it ends at the first text after the atom
+        self.auto_math = False
+        # A sub- or superscript was just written in that math, so the text after it is its argument
+        self.script = False
+
+    @property
+    def in_math(self) -> bool:
+        return self.inline_math is not None or any(name in MATH_ENVIRONMENTS for name, _ in self.envs)
+
+    @property
+    def brace_floor(self) -> int:
+        """Braces open when the innermost environment or math mode began; those can't be closed inside it"""
+        floor = self.envs[-1][1] if self.envs else 0
+        return max(floor, self.math_braces) if self.inline_math is not None else floor
+
+    def run(self) -> str:
+        # Unwrapping a command splices its argument back into self.source
+        while True:
+            match = _TOKEN.search(self.source, self.pos)
+            if match is None:
+                self._text(self.source[self.pos:])
+                break
+            self._text(self.source[self.pos:match.start()])
+            self.pos = match.end()
+            self._token(match.group())
+        while self.envs:
+            self._close_env()
+        self._close_inline_math()
+        self._close_braces(0)
+        return "".join(self.out)
+
+    def _repair(self, kind: str) -> None:
+        self.repairs.append(kind)
+
+    def _text(self, text: str) -> None:
+        """Copy plain text, ending a formula we opened once its atom is complete"""
+        if not text or not self.auto_math or self.braces != self.math_braces:
+            self.out.append(text)
+            return
+        atom = 0
+        if self.script:
+            self.script = False
+            match = _SCRIPT_ATOM.match(text)
+            atom = match.end() if match is not None else 0
+            if atom == len(text):
+                # Another script may follow, as in x_i^2
+                self.out.append(self._script_argument(text))
+                return
+        self.out.append(self._script_argument(text[:atom]))
+        self._end_auto_math()
+        self.out.append(text[atom:])
+
+    @staticmethod
+    def _script_argument(atom: str) -> str:
+        """A script's argument as it was meant; 2^10 would otherwise raise only the 1"""
+        return f"{{{atom}}}" if len(atom) > 1 else atom
+
+    def _insert_closer(self, closer: str) -> None:
+        """Append a closing token the model left out, before any trailing whitespace"""
+        tail = ""
+        while self.out and not self.out[-1].strip():
+            tail = self.out.pop() + tail
+        if self.out:
+            text = self.out[-1].rstrip()
+            tail = self.out[-1][len(text):] + tail
+            self.out[-1] = text
+        self.out.append(closer)
+        self.out.append(tail)
+
+    def _token(self, token: str) -> None:
+        if token.startswith("\\") and len(token) > 1 and token[1].isalpha():
+            self._command(token[1:])
+        elif token.startswith("\\"):
+            if token in ("\\(", "\\["):
+                self._open_inline_math(token, "\\)" if token == "\\(" else "\\]")
+            elif token in ("\\)", "\\]"):
+                self._close_delimiter(token)
+            else:
+                self.out.append(token)
+        elif token in ("$", "$$"):
+            if self.auto_math:
+                self._end_auto_math()
+            if token == "$" and self.inline_math is None and not self.in_math and self._is_currency():
+                self._repair("unescaped_special")
+                self.out.append(r"\$")
+            elif self.inline_math == token:
+                self._end_inline_math()
+            elif token == "$$" and self.inline_math == "$":
+                # Two formulas back to back, as in $a$$b$
+                self._end_inline_math()
+                self._open_inline_math("$", "$")
+            elif self.inline_math is None and not self.in_math:
+                self._open_inline_math(token, token)
+            else:
+                # A stray dollar inside math would end it early
+                self._repair("unbalanced_math")
+        elif token == "{":
+            self.script = False
+            self.braces += 1
+            self.out.append(token)
+        elif token == "}":
+            if self.auto_math and self.braces == self.math_braces:
+                self._end_auto_math()
+            if self.braces > self.brace_floor:
+                self.braces -= 1
+                self.out.append(token)
+            else:
+                self._repair("unmatched_brace")
+        elif token == "&":
+            if self.envs and self.envs[-1][0] in ALIGNMENT_ENVIRONMENTS:
+                self.out.append(token)
+            else:
+                self._repair("unescaped_special")
+                self.out.append(r"\&")
+        elif token in ("_", "^"):
+            if self.auto_math and self.braces == self.math_braces and not _SCRIPT.match(self.source, self.pos):
+                self._end_auto_math()
+            if self.in_math:
+                self.out.append(token)
+                self.script = self.auto_math
+            elif _SCRIPT.match(self.source, self.pos):
+                self._open_auto_math(absorb_base=True)
+                self.out.append(token)
+                self.script = True
+            else:
+                self._repair("unescaped_special")
+                self.out.append(_ESCAPES[token])
+        elif token in ("%", "#"):
+            self._repair("unescaped_special")
+            self.out.append(_ESCAPES[token])
+        elif token == "\n":
+            if self.auto_math and self.braces == self.math_braces:
+                self._end_auto_math()
+            # Inline math can't span a paragraph break
+            if self.inline_math in ("$", "\\)") and self._after_blank_line():
+                self._close_inline_math(len(self.envs))
+            self.out.append(token)
+        else:
+            self._unicode(token)
+
+    def _after_blank_line(self) -> bool:
+        i = self.pos - 2
+        while i >= 0 and self.source[i] in " \t":
+            i -= 1
+        return i >= 0 and self.source[i] == "\n"
+
+    def _unicode(self, char: str) -> None:
+        if char in UNICODE_TEXT:
+            self.out.append(char)
+        elif char in UNICODE_MATH:
+            self._repair("unicode")
+            command = UNICODE_MATH[char]
+            self.out.append(f"{command} " if self.in_math else f"${command}$")
+        else:
+            # Kept visible, so a missing symbol shows in the output rather than vanishing
+            self._repair("unicode")
+            placeholder = _placeholder(char)
+            self.out.append(f"\\mbox{{{placeholder}}}" if self.in_math else placeholder)
+
+    def _is_currency(self) -> bool:
+        """Whether a $ just read is an amount, as in "costs $5 and $10", rather than the start of a formula"""
+        if not self.source[self.pos:self.pos + 1].isdigit():
+            return False
+        end = self.source.find("\n", self.pos)
+        line = self.source[self.pos:end if end != -1 else len(self.source)]
+        closing = line.find("$")
+        # A formula such as $2^n$ is closed on the same line by a $ that doesn't start another amount
+        return closing == -1 or line[closing + 1:closing + 2].isdigit()
+
+    def _open_auto_math(self, absorb_base: bool = False) -> None:
+        """Open inline math around stray math-only input; it closes at the next space outside a group"""
+        self._repair("unbalanced_math")
+        base = ""
+        if absorb_base and self.out and not self.out[-1].startswith("\\"):
+            match = _SCRIPT_BASE.search(self.out[-1])
+            if match is not None:
+                self.out[-1] = self.out[-1][:match.start()]
+                base = match.group()
+        self._open_inline_math("$", "$")
+        self.out.append(base)
+        self.auto_math = True
+
+    def _end_auto_math(self) -> None:
+        """Close the formula opened by _open_auto_math, leaving trailing whitespace and punctuation after it"""
+        self._close_braces(self.math_braces)
+        tail = ""
+        while self.out and not self.out[-1].strip():
+            tail = self.out.pop() + tail
+        if self.out and not self.out[-1].startswith("\\"):
+            text = self.out[-1].rstrip(" \t\n.,;:!?")
+            tail = self.out[-1][len(text):] + tail
+            self.out[-1] = text
+        self.out.append("$")
+        self.out.append(tail)
+        self.inline_math = None
+        self.auto_math = False
+        self.script = False
+
+    def _open_inline_math(self, token: str, closing: str) -> None:
+        if self.auto_math:
+            self._end_auto_math()
+        if self.in_math:
+            self._repair("unbalanced_math")
+            return
+        self.inline_math = closing
+        self.math_braces = self.braces
+        self.math_depth = len(self.envs)
+        self.out.append(token)
+
+    def _end_inline_math(self, repaired: bool = False) -> None:
+        self._close_braces(self.math_braces)
+        if repaired:
+            # An empty formula would read as $$, which opens display math
+            empty = self.inline_math == "$" and "".join(self.out).rstrip().endswith("$")
+            self._insert_closer("{}$" if empty else self.inline_math)
+        else:
+            self.out.append(self.inline_math)
+        self.inline_math = None
+
+    def _close_delimiter(self, token: str) -> None:
+        if self.inline_math == token:
+            self._end_inline_math()
+        else:
+            self._repair("unbalanced_math")
+
+    def _close_inline_math(self, depth: int = 0) -> None:
+        """End an inline formula the model left open, if it began inside the first `depth` environments"""
+        if self.inline_math is not None and self.math_depth >= depth:
+            if self.auto_math:
+                self._end_auto_math()
+                return
+            self._repair("unbalanced_math")
+            self._end_inline_math(repaired=True)
+
+    def _close_braces(self, floor: int) -> None:
+        while self.braces > floor:
+            self._repair("unclosed_brace")
+            self._insert_closer("}")
+            self.braces -= 1
+
+    def _close_env(self) -> None:
+        self._close_inline_math(len(self.envs))
+        name, floor = self.envs.pop()
+        self._close_braces(floor)
+        self._repair("unclosed_environment")
+        self._insert_closer(f"\n\\end{{{name}}}")
+        self._unwrap()
+
+    def _unwrap(self) -> None:
+        """Close the $ opened around an inner math environment that just ended"""
+        if self.wrapped and self.wrapped[-1] == len(self.envs):
+            self.wrapped.pop()
+            if self.inline_math is not None:
+                self._end_inline_math()
+
+    def _skip_args(self, count: int) -> List[str]:
+        """Consume up to `count` optional and mandatory arguments after a command, returning the mandatory ones"""
+        args = []
+        while count > 0:
+            start = _SPACE.match(self.source, self.pos).end()
+            if start >= len(self.source) or self.source[start] not in "[{":
+                break
+            end = self._group_end(start)
+            if end is None:
+                break
+            if self.source[start] == "{":
+                args.append(self.source[start + 1:end - 1])
+                count -= 1
+            self.pos = end
+        return args
+
+    def _group_end(self, start: int) -> Optional[int]:
+        """Index just past the group opening at `start`, or None if it never closes"""
+        opening = self.source[start]
+        closing = "}" if opening == "{" else "]"
+        depth = 0
+        i = start
+        while i < len(self.source):
+            char = self.source[i]
+            if char == "\\":
+                i += 2
+                continue
+            if char == opening:
+                depth += 1
+            elif char == closing:
+                depth -= 1
+                if depth == 0:
+                    return i + 1
+            i += 1
+        return None
+
+    def _command(self, name: str) -> None:
+        self.script = False
+        if name == "begin":
+            self._begin()
+        elif name == "end":
+            self._end()
+        elif name == "item":
+            self._item()
+        elif name in ("verb", "verb*"):
+            self._verb(name)
+        elif name in FORBIDDEN_COMMANDS:
+            self._repair("forbidden_command")
+            count = FORBIDDEN_COMMANDS[name]
+            if count is None:
+                end = self.source.find("\n", self.pos)
+                self.pos = len(self.source) if end == -1 else end
+            else:
+                self._skip_args(count)
+        elif name in UNWRAP_COMMANDS:
+            self._repair("unknown_command")
+            args = self._skip_args(UNWRAP_COMMANDS[name])
+            if args:
+                self.source = self.source[:self.pos] + args[-1] + self.source[self.pos:]
+        elif name in DROP_COMMANDS:
+            self._repair("unknown_command")
+            self._skip_args(DROP_COMMANDS[name])
+        elif name == "url":
+            self._repair("unknown_command")
+            args = self._skip_args(1)
+            if args:
+                self.out.append(f"\\texttt{{{_escape_text(args[0])}}}")
+        elif name in MATH_ONLY_COMMANDS and not self.in_math:
+            self._open_auto_math()
+            self.out.append("\\" + name)
+        elif name in MATH_SHORTHANDS:
+            self._repair("unknown_command")
+            shorthand = MATH_SHORTHANDS[name]
+            self.out.append(shorthand if self.in_math else f"${shorthand}$")
+        else:
+            self.out.append("\\" + name)
+
+    def _verb(self, name: str) -> None:
+        """Copy \\verb and its argument untouched, up to the closing delimiter on the same line"""
+        if self.auto_math:
+            self._end_auto_math()
+        delimiter = self.source[self.pos:self.pos + 1]
+        end = self.source.find(delimiter, self.pos + 1) if delimiter.strip() and not delimiter.isalpha() else -1
+        if end == -1 or "\n" in self.source[self.pos:end]:
+            # Without a closing delimiter \\verb would swallow the rest of the line
+            self._repair("malformed_verb")
+            return
+        self.out.append(f"\\{name}{self.source[self.pos:end + 1]}")
+        self.pos = end + 1
+
+    def _verbatim(self, name: str) -> None:
+        """Copy a verbatim environment untouched up to its \\end"""
+        if name != VERBATIM_ENVIRONMENTS[name]:
+            # lstlisting's [options] need listings too
+            self._repair("unknown_environment")
+            if self.source[self.pos:self.pos + 1] == "[":
+                end = self._group_end(self.pos)
+                self.pos = end if end is not None else self.pos
+        closing = f"\\end{{{name}}}"
+        end = self.source.find(closing, self.pos)
+        if end == -1:
+            self._repair("unclosed_environment")
+            end = len(self.source)
+        replacement = VERBATIM_ENVIRONMENTS[name]
+        body = self.source[self.pos:end]
+        self.pos = min(end + len(closing), len(self.source))
+        if f"\\end{{{replacement}}}" in body:
+            # The body would end the renamed environment early
+            self._repair("unknown_environment")
+            return
+        self.out.append(f"\\begin{{{replacement}}}{body}\\end{{{replacement}}}")
+
+    def _env_name(self) -> Optional[str]:
+        start = _SPACE.match(self.source, self.pos).end()
+        match = re.match(r'\{([a-zA-Z]+\*?)\}', self.source[start:])
+        if match is None:
+            return None
+        self.pos = start + match.end()
+        return match.group(1)
+
+    def _begin(self) -> None:
+        if self.auto_math:
+            self._end_auto_math()
+        name = self._env_name()
+        if name is None:
+            self._repair("malformed_environment")
+            return
+        if name == "document":
+            self._repair("forbidden_command")
+            return
+        if name in VERBATIM_ENVIRONMENTS and self.in_math:
+            self._close_inline_math(len(self.envs))
+        if name in VERBATIM_ENVIRONMENTS and not self.in_math:
+            self._verbatim(name)
+            return
+        if name not in TEXT_ENVIRONMENTS and name not in MATH_ENVIRONMENTS:
+            # Needs a package the template doesn't load; drop it with its contents
+            self._repair("unknown_environment")
+            end = self.source.find(f"\\end{{{name}}}", self.pos)
+            if end != -1:
+                self.pos = end + len(f"\\end{{{name}}}")
+            return
+        if name in DISPLAY_MATH_ENVIRONMENTS and self.in_math:
+            self._close_inline_math(len(self.envs))
+            if self.in_math:
+                self._repair("unknown_environment")
+                return
+        if name in INNER_MATH_ENVIRONMENTS and not self.in_math:
+            self._repair("unbalanced_math")
+            self.wrapped.append(len(self.envs))
+            self._open_inline_math("$", "$")
+        self.envs.append((name, self.braces))
+        self.out.append(f"\\begin{{{name}}}")
+
+    def _end(self) -> None:
+        name = self._env_name()
+        if name is None:
+            self._repair("malformed_environment")
+            return
+        if name == "document":
+            self._repair("forbidden_command")
+            return
+        depth = max((i for i, (env, _) in enumerate(self.envs) if env == name), default=None)
+        if depth is None:
+            self._repair("unmatched_end")
+            return
+        while len(self.envs) > depth + 1:
+            self._close_env()
+        self._close_inline_math(depth + 1)
+        _, floor = self.envs.pop()
+        self._close_braces(floor)
+        self.out.append(f"\\end{{{name}}}")
+        self._unwrap()
+
+    def _item(self) -> None:
+        # Nothing from one bullet may stay open into the next
+        while self.envs and self.envs[-1][0] not in LIST_ENVIRONMENTS:
+            self._close_env()
+        self._close_inline_math(len(self.envs))
+        if not self.envs:
+            self._repair("item_outside_list")
+            self.envs.append(("itemize", self.braces))
+            self.out.append("\\begin{itemize}\n")
+        self._close_braces(self.envs[-1][1])
+        self.out.append("\\item")
+
+class LatexLinter:
+    def __init__(self):
+        """
+        Checks each model reply before it reaches the template, and repairs it.
+
+        Escaping, braces, math mode and environments are fixed in one pass so
+        that each reply is self-contained: whatever it leaves open is closed
+        at its end, and commands the template can't handle are dropped. A
+        reply that still changes on a second pass is replaced by its plain
+        text, so one bad chunk can't fail the whole compile.
+        """
+        self.checked = 0
+        self.repaired = 0
+        self.isolated = 0
+        self.compiles_avoided = 0
+        self.repair_counts: Counter = Counter()
+
+    def lint(self, fragment: str) -> LintResult:
+        """
+        Repair one reply from the model.
+
+        Args:
+            fragment (str): Itemize environments as returned by the model
+
+        Returns:
+            LintResult: The repaired fragment and the repairs made
+        """
+        self.checked += 1
+        repairs = []
+        if _CODE_FENCE.search(fragment):
+            repairs.append("code_fence")
+            fragment = _CODE_FENCE.sub("", fragment)
+
+        scanner = _Scanner(fragment)
+        latex = scanner.run().strip()
+        repairs.extend(scanner.repairs)
+        if "\\begin{" not in latex and latex:
+            repairs.append("no_list")
+            latex = f"\\begin{{itemize}}\n\\item {latex}\n\\end{{itemize}}"
+
+        result = LintResult(latex, repairs)
+        # A second pass finds nothing to fix in a sound repair
+        check = _Scanner(latex)
+        if check.run().strip() != latex or check.repairs:
+            result = LintResult(_plain_itemize(item_texts(fragment) or [fragment]), repairs, isolated=True)
+            self.isolated += 1
+            logger.warning(f"Replaced a summary by its plain text after repairs {sorted(set(repairs))}")
+
+        if result.repairs:
+            self.repaired += 1
+            self.repair_counts.update(result.repairs)
+        return result
+
+    def note_compile(self, repaired: bool) -> None:
+        """Record a successful compile; one that needed repairs would otherwise have failed"""
+        if repaired:
+            self.compiles_avoided += 1
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "checked": self.checked,
+            "repaired": self.repaired,
+            "isolated": self.isolated,
+            "compiles_avoided": self.compiles_avoided,
+            "repairs": dict(self.repair_counts),
+        }
+
+def _plain_itemize(texts: List[str]) -> str:
+    """An itemize environment with the texts escaped as plain text"""
+    items = [" ".join(_escape_text(text).split()) for text in texts]
+    return "\\begin{itemize}\n" + "".join(f"\\item {item}\n" for item in items if item) + "\\end{itemize}"
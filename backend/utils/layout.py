@@ -0,0 +1,172 @@
+import math
+import re
+from typing import List, Tuple
+
+import fitz
+
+# Rough text metrics for the base template: US letter with 0.5cm margins
+PAGE_WIDTH_PT = 612.0
+PAGE_HEIGHT_PT = 792.0
+MARGIN_PT = 14.2
+COLUMN_SEP_PT = 10.0
+# Indent of a first-level itemize
+ITEM_INDENT_PT = 25.0
+
+# Point size of each LaTeX size command under \documentclass[10pt]
+FONT_POINTS = {
+    "tiny": 5.0,
+    "scriptsize": 7.0,
+    "footnotesize": 8.0,
+    "small": 9.0,
+    "normalsize": 10.0,
+    "large": 12.0,
+    "Large": 14.4,
+}
+# Baseline skip of each size under \documentclass[10pt]
+BASELINE_POINTS = {
+    "tiny": 6.0,
+    "scriptsize": 8.0,
+    "footnotesize": 9.5,
+    "small": 11.0,
+    "normalsize": 12.0,
+    "large": 14.0,
+    "Large": 18.0,
+}
+# Average glyph width, spaces included, as a fraction of the font size. The
+# small sizes use Computer Modern's optical sizes (cmr5, cmr7, ...), whose
+# glyphs are relatively wider. Check with benchmarks/calibrate_layout.py.
+CHAR_WIDTH_EM = {
+    "tiny": 0.61,
+    "scriptsize": 0.53,
+    "footnotesize": 0.51,
+    "small": 0.495,
+    "normalsize": 0.48,
+    "large": 0.46,
+    "Large": 0.46,
+}
+# Vertical space around each itemize environment, in lines
+LIST_SPACING_LINES = 1.0
+# \itemsep between bullets, in lines
+ITEM_SPACING_LINES = 0.3
+
+# Settings auto-fit chooses from, in order of preference: larger text, then fewer columns
+AUTO_FONT_SIZE = "auto"
+AUTO_FONT_SIZES = ("normalsize", "small", "footnotesize", "scriptsize", "tiny")
+AUTO_COLUMNS = (1, 2, 3, 4)
+# Share of the page budget auto-fit fills at most, leaving room for estimation error
+AUTO_FIT_TARGET = 0.92
+
+_ITEM = re.compile(r'\\item\b')
+_BEGIN_LIST = re.compile(r'\\begin\{(?:itemize|enumerate)\}')
+_COMMAND = re.compile(r'\\[a-zA-Z]+\*?|[{}$\\]')
+
+def _size_name(font_size: str) -> str:
+    name = font_size.lstrip("\\")
+    return name if name in FONT_POINTS else "normalsize"
+
+def font_points(font_size: str) -> float:
+    """Point size for a size command, given with or without the backslash"""
+    return FONT_POINTS[_size_name(font_size)]
+
+def page_dimensions(orientation: str) -> tuple:
+    """Usable (width, height) in points for the given paper orientation"""
+    width, height = PAGE_WIDTH_PT, PAGE_HEIGHT_PT
+    if orientation == "landscape":
+        width, height = height, width
+    return width - 2 * MARGIN_PT, height - 2 * MARGIN_PT
+
+def chars_per_line(font_size: str, columns: int, orientation: str) -> int:
+    """Characters that fit on one line of an item"""
+    width, _ = page_dimensions(orientation)
+    column_width = (width - (columns - 1) * COLUMN_SEP_PT) / columns - ITEM_INDENT_PT
+    return max(1, int(column_width / (font_points(font_size) * CHAR_WIDTH_EM[_size_name(font_size)])))
+
+def lines_per_page(font_size: str, columns: int, orientation: str) -> int:
+    """Text lines on one page, summed over all columns"""
+    _, height = page_dimensions(orientation)
+    return int(height / BASELINE_POINTS[_size_name(font_size)]) * columns
+
+def item_texts(latex: str) -> List[str]:
+    """The visible text of each \\item in a LaTeX fragment, with commands stripped"""
+    items = _ITEM.split(latex)[1:]
+    return [" ".join(_COMMAND.sub(" ", item.split("\\end{")[0]).split()) for item in items]
+
+def estimate_lines(latex: str, font_size: str, columns: int, orientation: str) -> float:
+    """Estimate how many rendered lines the bullet lists in `latex` take up"""
+    per_line = chars_per_line(font_size, columns, orientation)
+    texts = item_texts(latex)
+    lines = sum(max(1, math.ceil(len(text) / per_line)) for text in texts)
+    return lines + ITEM_SPACING_LINES * len(texts) + LIST_SPACING_LINES * len(_BEGIN_LIST.findall(latex))
+
+def estimate_pages(latex: str, font_size: str, columns: int, orientation: str) -> float:
+    """
+    Estimate the number of pages the bullet lists would fill in the base template.
+
+    Args:
+        latex (str): Itemize environments as returned by the model
+        font_size (str): Size command such as "small" or "\\small"
+        columns (int): Number of columns
+        orientation (str): "portrait" or "landscape"
+
+    Returns:
+        float: Estimated page count; fractional values mean a partly filled page
+    """
+    return estimate_lines(latex, font_size, columns, orientation) / lines_per_page(font_size, columns, orientation)
+
+def layout_candidates() -> List[Tuple[str, int]]:
+    """(font size, columns) settings auto-fit considers, most preferred first"""
+    return [(font_size, columns) for font_size in AUTO_FONT_SIZES for columns in AUTO_COLUMNS]
+
+def densest_layout() -> Tuple[str, int]:
+    """The auto-fit setting that holds the most text"""
+    return AUTO_FONT_SIZES[-1], AUTO_COLUMNS[-1]
+
+def fit_layout(
+    latex: str,
+    orientation: str,
+    max_pages: int = 1,
+    target: float = AUTO_FIT_TARGET
+) -> Tuple[str, int]:
+    """
+    Pick the largest font size and fewest columns whose estimated size fits the page budget.
+
+    Args:
+        latex (str): Itemize environments as returned by the model
+        orientation (str): "portrait" or "landscape"
+        max_pages (int): Page budget
+        target (float): Fraction of the budget the estimate may fill
+
+    Returns:
+        Tuple[str, int]: Font size and column count; the densest setting if nothing fits
+    """
+    for font_size, columns in layout_candidates():
+        if estimate_pages(latex, font_size, columns, orientation) <= max_pages * target:
+            return font_size, columns
+    return densest_layout()
+
+def pdf_page_count(pdf_path: str) -> int:
+    """Number of pages in a compiled PDF"""
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+def measure_fill(pdf_path: str, columns: int, orientation: str) -> float:
+    """
+    Pages a compiled cheat sheet actually fills, including the fraction of its last page.
+
+    Columns fill one after another, so the last page's fraction is found from
+    the rightmost column holding text and how far down that column reaches.
+    """
+    width, height = page_dimensions(orientation)
+    column_width = (width - (columns - 1) * COLUMN_SEP_PT) / columns
+    with fitz.open(pdf_path) as doc:
+        pages = doc.page_count
+        words = doc[pages - 1].get_text("words")
+    if not words:
+        return float(pages - 1)
+    column_bottoms = {}
+    for x0, _, _, y1, *_ in words:
+        column = min(columns - 1, max(0, int((x0 - MARGIN_PT) / (column_width + COLUMN_SEP_PT))))
+        column_bottoms[column] = max(column_bottoms.get(column, 0.0), y1)
+    last = max(column_bottoms)
+    depth = min(1.0, max(0.0, (column_bottoms[last] - MARGIN_PT) / height))
+    return pages - 1 + (last + depth) / columns
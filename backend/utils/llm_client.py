@@ -0,0 +1,488 @@
+import asyncio
+import importlib.util
+import logging
+import random
+import re
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from .chunker import get_token_counter
+from .coordination import Coordinator, SharedSemaphore
+from .metrics import LLM_REQUEST_SECONDS, TOKENS, track
+
+logger = logging.getLogger(__name__)
+
+# Completion tokens reserved per request before the real usage is known
+DEFAULT_COMPLETION_TOKENS = 1000
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Parse OpenAI reset headers such as "20ms", "1s" or "6m0s" into seconds"""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+def parse_retry_after(headers: httpx.Headers) -> Optional[float]:
+    """Return the server-requested delay in seconds, if any"""
+    if "retry-after-ms" in headers:
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class LatencyWindow:
+    def __init__(self, size: int = 200):
+        """HTTP round-trip times of the most recent `size` successful requests, without any queueing before them"""
+        self._samples: deque = deque(maxlen=size)
+        self.count = 0
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self.count += 1
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Nearest-rank percentile of the window, q in [0, 100]"""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "count": self.count,
+            "p50": round(p50, 3) if p50 is not None else None,
+            "p95": round(p95, 3) if p95 is not None else None,
+        }
+
+class RateLimiter:
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        """
+        Token buckets for requests and tokens per minute, corrected by the API's rate-limit headers.
+
+        Args:
+            requests_per_minute (int): Request budget per minute
+            tokens_per_minute (int): Token budget per minute (prompt + completion)
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    async def acquire(self, tokens: int) -> None:
+        """Wait until one request and `tokens` tokens are available, then take them"""
+        # A single request larger than the whole bucket could never be admitted
+        tokens = min(tokens, self.tokens_per_minute)
+        # The lock makes callers queue up in arrival order
+        async with self._lock:
+            while True:
+                self._refill()
+                delay = self._paused_until - time.monotonic()
+                if delay <= 0:
+                    if self._requests >= 1 and self._tokens >= tokens:
+                        self._requests -= 1
+                        self._tokens -= tokens
+                        return
+                    delay = max(
+                        (1 - self._requests) * 60 / self.requests_per_minute,
+                        (tokens - self._tokens) * 60 / self.tokens_per_minute
+                    )
+                self.waits += 1
+                self.wait_seconds += delay
+                await asyncio.sleep(delay)
+
+    async def record_usage(self, reserved: int, used: int) -> None:
+        """Refund (or charge) the difference between reserved and actual tokens"""
+        self._refill()
+        self._tokens = min(self.tokens_per_minute, self._tokens + reserved - used)
+
+    async def pause(self, seconds: float) -> None:
+        """Hold all requests for at least `seconds`"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def update_from_headers(self, headers: httpx.Headers) -> None:
+        """Lower our buckets to what the server says is left, so we don't outrun it"""
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        try:
+            requests = float(remaining_requests) if remaining_requests is not None else None
+            tokens = float(remaining_tokens) if remaining_tokens is not None else None
+        except ValueError:
+            return
+        await self._cap(requests, tokens)
+
+        # Nothing left: wait for the server's reset rather than our own estimate
+        if requests is not None and requests <= 0:
+            reset = parse_reset_duration(headers.get("x-ratelimit-reset-requests"))
+            if reset:
+                await self.pause(reset)
+        if tokens is not None and tokens <= 0:
+            reset = parse_reset_duration(headers.get("x-ratelimit-reset-tokens"))
+            if reset:
+                await self.pause(reset)
+
+    async def _cap(self, requests: Optional[float], tokens: Optional[float]) -> None:
+        self._refill()
+        if requests is not None:
+            self._requests = min(self._requests, requests)
+        if tokens is not None:
+            self._tokens = min(self._tokens, tokens)
+
+    def _available(self) -> Tuple[float, float]:
+        self._refill()
+        return self._requests, self._tokens
+
+    def stats(self) -> Dict[str, float]:
+        requests, tokens = self._available()
+        return {
+            "requests_available": round(requests, 2),
+            "tokens_available": round(tokens),
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
+
+class SharedRateLimiter(RateLimiter):
+    def __init__(self, coordinator: Coordinator, requests_per_minute: int, tokens_per_minute: int, name: str = "openai"):
+        """
+        The same token buckets, kept in the coordinator so every worker process draws from one budget.
+
+        Args:
+            coordinator (Coordinator): Shared state
+            requests_per_minute (int): Request budget per minute across all processes
+            tokens_per_minute (int): Token budget per minute across all processes
+            name (str): Limiters with the same name share their buckets
+        """
+        super().__init__(requests_per_minute, tokens_per_minute)
+        self.coordinator = coordinator
+        self.name = name
+
+    async def acquire(self, tokens: int) -> None:
+        tokens = min(tokens, self.tokens_per_minute)
+        async with self._lock:
+            while True:
+                delay = await asyncio.to_thread(
+                    self.coordinator.take, self.name, self.requests_per_minute, self.tokens_per_minute, tokens
+                )
+                if delay <= 0:
+                    return
+                self.waits += 1
+                self.wait_seconds += delay
+                await asyncio.sleep(delay)
+
+    # Each adjustment is a write transaction that may wait on other processes, so it runs off the event loop
+
+    async def record_usage(self, reserved: int, used: int) -> None:
+        await asyncio.to_thread(
+            self.coordinator.adjust, self.name, self.requests_per_minute, self.tokens_per_minute,
+            refund_tokens=reserved - used
+        )
+
+    async def pause(self, seconds: float) -> None:
+        await asyncio.to_thread(
+            self.coordinator.adjust, self.name, self.requests_per_minute, self.tokens_per_minute,
+            pause_seconds=seconds
+        )
+
+    async def _cap(self, requests: Optional[float], tokens: Optional[float]) -> None:
+        await asyncio.to_thread(
+            self.coordinator.adjust, self.name, self.requests_per_minute, self.tokens_per_minute,
+            max_requests=requests, max_tokens=tokens
+        )
+
+    def _available(self) -> Tuple[float, float]:
+        return self.coordinator.bucket(self.name, self.requests_per_minute, self.tokens_per_minute)
+
+class LLMClient:
+    def __init__(
+        self,
+        api_key: Optional[str],
+        base_url: str = "https://api.openai.com/v1",
+        max_concurrency: int = 3,
+        requests_per_minute: int = 500,
+        tokens_per_minute: int = 40000,
+        max_retries: int = 5,
+        timeout: float = 30.0,
+        backoff_base: float = 1.0,
+        backoff_cap: float = 60.0,
+        hedge_quantile: Optional[float] = 95,
+        hedge_min_samples: int = 20,
+        hedge_max_ratio: float = 0.1,
+        coordinator: Optional[Coordinator] = None
+    ):
+        """
+        Shared chat-completions client with connection pooling, rate limiting and retries.
+
+        Args:
+            api_key (Optional[str]): API key sent as a bearer token
+            base_url (str): API root; point this at a local stub for testing
+            max_concurrency (int): Maximum requests in flight at once
+            requests_per_minute (int): Request budget per minute
+            tokens_per_minute (int): Token budget per minute
+            max_retries (int): Retries for 429s, 5xx responses and transport errors
+            timeout (float): Per-request timeout in seconds
+            backoff_base (float): First retry delay in seconds, doubled per attempt
+            backoff_cap (float): Upper bound on a single retry delay
+            hedge_quantile (Optional[float]): A request still running after this percentile of the
+                model's recent latencies gets a duplicate, and the first reply wins; None disables hedging
+            hedge_min_samples (int): Successful requests needed before a model's latencies are trusted
+            hedge_max_ratio (float): Hedges allowed as a fraction of all chat() calls
+            coordinator (Optional[Coordinator]): When given, the rate limits and max_concurrency
+                are shared by every process using it instead of applying per process
+        """
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        if coordinator is not None:
+            self.limiter = SharedRateLimiter(coordinator, requests_per_minute, tokens_per_minute)
+            self._slots = SharedSemaphore(coordinator, "openai", max_concurrency, lease_seconds=timeout * 2)
+        else:
+            self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+            self._slots = asyncio.Semaphore(max_concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_max_ratio = hedge_max_ratio
+        self._latencies: Dict[str, LatencyWindow] = {}
+
+        self.chats = 0
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                # HTTP/2 needs the optional h2 package
+                http2=importlib.util.find_spec("h2") is not None,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency * 2,
+                    max_keepalive_connections=self.max_concurrency * 2
+                ),
+                timeout=self.timeout,
+                headers={"Authorization": f"Bearer {self.api_key}"}
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close pooled connections; called on application shutdown"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps retries from many chunks from arriving in lockstep
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    async def chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: Optional[int] = None,
+        prompt_tokens: Optional[int] = None
+    ) -> str:
+        """
+        Send a chat completion and return the first choice's content.
+
+        Once the model has enough recent samples, a request whose HTTP call
+        outlives their hedge_quantile gets a duplicate and the first reply wins.
+
+        Args:
+            messages (List[Dict[str, str]]): Chat messages
+            model (str): Model name
+            temperature (float): Sampling temperature
+            max_tokens (Optional[int]): Completion limit, also used for rate-limit accounting
+            prompt_tokens (Optional[int]): The messages' tokens, if the caller already knows them;
+                otherwise they are counted off the event loop
+
+        Returns:
+            str: The assistant's reply
+        """
+        self.chats += 1
+        if prompt_tokens is None:
+            with track("count_tokens"):
+                prompt_tokens = await asyncio.to_thread(get_token_counter(model).count_tokens_in_messages, messages)
+        reserved = prompt_tokens + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+        window = self._latencies.setdefault(model, LatencyWindow())
+        delay = None
+        if self.hedge_quantile is not None and len(window) >= self.hedge_min_samples:
+            delay = window.percentile(self.hedge_quantile)
+
+        if delay is None:
+            return await self._chat_with_retries(messages, model, temperature, max_tokens, reserved)
+        return await self._hedged(
+            lambda started: self._chat_with_retries(messages, model, temperature, max_tokens, reserved, started), delay
+        )
+
+    async def _hedged(self, request, delay: float) -> str:
+        """
+        Run request(started); if its HTTP call is still going after `delay` seconds, race it against a second copy.
+
+        The primary sets `started` when its HTTP call begins, so time spent
+        waiting for the rate limiter or a free slot doesn't count towards the delay.
+        """
+        started = asyncio.Event()
+        primary = asyncio.ensure_future(request(started))
+        backup = None
+        try:
+            began = asyncio.ensure_future(started.wait())
+            try:
+                await asyncio.wait({primary, began}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                began.cancel()
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            # A duplicate that would only queue behind other requests doesn't help
+            if done or self._slots.locked() or self.hedged >= self.hedge_max_ratio * self.chats:
+                return await primary
+
+            self.hedged += 1
+            logger.info(f"Request slower than {delay:.2f}s, sending a hedged duplicate")
+            backup = asyncio.ensure_future(request(None))
+            pending = {primary, backup}
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.hedge_wins += 1
+                        return task.result()
+                if not pending:
+                    # Both copies failed; report the primary's error
+                    raise primary.exception()
+        finally:
+            for task in (primary, backup):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def _chat_with_retries(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: Optional[int],
+        reserved: int,
+        started: Optional[asyncio.Event] = None
+    ) -> str:
+        payload = {"model": model, "messages": messages, "temperature": temperature}
+        if max_tokens is not None:
+            payload["max_tokens"] = max_tokens
+
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(reserved)
+            # Whether this attempt's reservation has been settled against the tokens the API reports
+            settled = False
+            try:
+                try:
+                    async with self._slots:
+                        self.requests += 1
+                        if started is not None:
+                            started.set()
+                        start = time.perf_counter()
+                        try:
+                            response = await self._http().post("/chat/completions", json=payload)
+                        except Exception as e:
+                            LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, status=type(e).__name__)
+                            raise
+                        elapsed = time.perf_counter() - start
+                        LLM_REQUEST_SECONDS.observe(elapsed, status=str(response.status_code))
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    if attempt == self.max_retries:
+                        logger.error(f"Request failed after {attempt + 1} attempts: {str(e)}")
+                        raise
+                    delay = self._backoff(attempt)
+                    logger.warning(f"Request error ({type(e).__name__}), retrying in {delay:.1f}s")
+                    self.retries += 1
+                    await asyncio.sleep(delay)
+                    continue
+
+                await self.limiter.update_from_headers(response.headers)
+
+                if response.status_code == 429 or response.status_code >= 500:
+                    if attempt == self.max_retries:
+                        response.raise_for_status()
+                    retry_after = parse_retry_after(response.headers)
+                    delay = retry_after if retry_after is not None else self._backoff(attempt)
+                    if response.status_code == 429:
+                        self.rate_limited += 1
+                        # Everyone waits, not just this request
+                        await self.limiter.pause(delay)
+                    logger.warning(f"HTTP {response.status_code}, retrying in {delay:.1f}s (attempt {attempt + 1})")
+                    self.retries += 1
+                    await asyncio.sleep(delay)
+                    continue
+
+                response.raise_for_status()
+                data = response.json()
+                self._latencies.setdefault(model, LatencyWindow()).add(elapsed)
+                usage = data.get("usage", {})
+                TOKENS.inc(usage.get("prompt_tokens", 0), kind="prompt")
+                TOKENS.inc(usage.get("completion_tokens", 0), kind="completion")
+                used = usage.get("total_tokens")
+                settled = True
+                if used is not None:
+                    await self.limiter.record_usage(reserved, used)
+                return data["choices"][0]["message"]["content"]
+            finally:
+                if not settled:
+                    # A failed attempt, or a hedge copy cancelled because the other one won,
+                    # gives its reservation back rather than holding it until the bucket refills
+                    await self.limiter.record_usage(reserved, 0)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "max_concurrency": self.max_concurrency,
+            "latency": {model: window.stats() for model, window in self._latencies.items()},
+            "limiter": self.limiter.stats(),
+        }
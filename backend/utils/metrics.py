@@ -0,0 +1,217 @@
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Fraction of verbose debug events (LaTeX sources, pdflatex output) that are logged
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+
+# Latency buckets in seconds, from fast CPU stages up to slow LLM and pdflatex calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+LabelValues = Tuple[str, ...]
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items
+        ]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: (bucket counts, sum, count)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        lines = self.header()
+        for key, counts, total, count in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class Registry:
+    def __init__(self, prefix: str = "cheatsheet"):
+        """
+        Holds the application's metrics and renders them in the Prometheus text format.
+
+        Args:
+            prefix (str): Prepended to the names of metrics built from component stats
+        """
+        self.prefix = prefix
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Tuple[str, Callable[[], dict]]] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._add(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labelnames, buckets))
+
+    def add_collector(self, component: str, stats: Callable[[], dict]) -> None:
+        """Expose the numeric values of a component's stats() dict as gauges at scrape time"""
+        self._collectors.append((component, stats))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for component, stats in self._collectors:
+            for key, value in _flatten(stats()):
+                name = f"{self.prefix}_{component}_{key}"
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+def _flatten(stats: dict, prefix: str = "") -> Iterator[Tuple[str, float]]:
+    for key, value in stats.items():
+        # Keys can be model names such as "gpt-4"
+        key = re.sub(r'[^a-zA-Z0-9_]', "_", str(key))
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{key}_")
+        elif isinstance(value, (bool, int, float)):
+            yield f"{prefix}{key}", float(value)
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "cheatsheet_stage_seconds", "Time spent in each pipeline stage", ("stage",)
+)
+STAGE_IN_FLIGHT = REGISTRY.gauge(
+    "cheatsheet_stage_in_flight", "Operations currently running in each stage", ("stage",)
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "cheatsheet_stage_errors_total", "Operations that raised, by stage", ("stage",)
+)
+TOKENS = REGISTRY.counter(
+    "cheatsheet_tokens_total", "Tokens processed: document tokens chunked, and prompt/completion tokens billed", ("kind",)
+)
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "cheatsheet_llm_request_seconds", "Latency of individual chat completion requests", ("status",)
+)
+UPLOADS = REGISTRY.counter(
+    "cheatsheet_uploads_total", "Cheat sheet builds, by outcome", ("outcome",)
+)
+AUTO_FIT = REGISTRY.counter(
+    "cheatsheet_auto_fit_total", "Auto-fit layouts, by whether the first compile fit the page budget", ("outcome",)
+)
+EXTRACTED_BYTES = REGISTRY.counter(
+    "cheatsheet_extracted_bytes_total", "Bytes of uploaded files extracted, by file type", ("type",)
+)
+BATCH_GROUPS = REGISTRY.counter(
+    "cheatsheet_batch_groups_total", "Groups of /batch requests, by outcome", ("outcome",)
+)
+
+@contextmanager
+def track(stage: str) -> Iterator[None]:
+    """Time a block as one operation of `stage`, counting it as in flight while it runs"""
+    STAGE_IN_FLIGHT.inc(stage=stage)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+        STAGE_IN_FLIGHT.dec(stage=stage)
+
+def log_event(logger: logging.Logger, level: int, event: str, sample_rate: Optional[float] = None, **fields) -> None:
+    """
+    Log one structured event as a JSON object.
+
+    Args:
+        logger (logging.Logger): Logger to write to
+        level (int): Logging level
+        event (str): Event name
+        sample_rate (Optional[float]): Fraction of calls that are logged; None logs every call
+        **fields: Extra JSON-serializable fields
+    """
+    if sample_rate is not None and random.random() >= sample_rate:
+        return
+    if logger.isEnabledFor(level):
+        logger.log(level, json.dumps({"event": event, **fields}, default=str))
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+from .chunker import get_token_counter
+
+logger = logging.getLogger(__name__)
+
+class ChunkPacker:
+    def __init__(
+        self,
+        model: str,
+        system_prompt: str,
+        lookup: Callable[[str, int], Awaitable[Optional[str]]],
+        summarize_one: Callable[[str, int], Awaitable[str]],
+        summarize_many: Callable[[List[str], List[int]], Awaitable[Optional[List[str]]]],
+        max_tokens: int = 3000,
+        small_chunk_tokens: int = 500,
+        window: float = 0.02
+    ):
+        """
+        Packs small chunks, from any number of concurrent uploads, into shared requests.
+
+        Small chunks that are not cached wait up to `window` seconds for
+        company. A bin is sent as soon as the next chunk would push it past
+        `max_tokens`. A bin holding one chunk is sent as a normal request.
+        Each callback also gets the token count of every chunk it is given.
+
+        Args:
+            model (str): Model the packed requests go to, for token counting
+            system_prompt (str): System prompt of a packed request
+            lookup (Callable[[str, int], Awaitable[Optional[str]]]): Returns a cached summary for a chunk, if any
+            summarize_one (Callable[[str, int], Awaitable[str]]): Summarizes one uncached chunk
+            summarize_many (Callable[[List[str], List[int]], Awaitable[Optional[List[str]]]]): Summarizes
+                several chunks in one request, or returns None if the reply could not be split
+            max_tokens (int): Prompt token budget of a packed request
+            small_chunk_tokens (int): Chunks above this size are always sent on their own
+            window (float): Seconds a bin stays open for more chunks
+        """
+        self.model = model
+        self.system_prompt = system_prompt
+        self.lookup = lookup
+        self.summarize_one = summarize_one
+        self.summarize_many = summarize_many
+        self.max_tokens = max_tokens
+        self.small_chunk_tokens = small_chunk_tokens
+        self.window = window
+
+        self._pending: List[Tuple[str, int, asyncio.Future]] = []
+        self._base_tokens: Optional[int] = None
+        self._pending_tokens = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._batches: Set[asyncio.Task] = set()
+
+        self.packed_requests = 0
+        self.packed_chunks = 0
+        self.fallbacks = 0
+
+    @property
+    def base_tokens(self) -> int:
+        """Prompt tokens of a packed request before any chunk is added"""
+        if self._base_tokens is None:
+            self._base_tokens = get_token_counter(self.model).count_tokens_in_messages([
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": ""}
+            ])
+        return self._base_tokens
+
+    async def summarize(self, chunk: str, tokens: Optional[int] = None) -> str:
+        """Summarize a chunk of `tokens` tokens, counted here if not given, sharing a request where possible"""
+        if tokens is None:
+            tokens = get_token_counter(self.model).count_tokens(chunk)
+        cached = await self.lookup(chunk, tokens)
+        if cached is not None:
+            return cached
+
+        # Section markers and separators cost a few tokens per chunk
+        size = tokens + 8
+        if size > self.small_chunk_tokens or self.base_tokens + size > self.max_tokens:
+            return await self.summarize_one(chunk, tokens)
+
+        if self.base_tokens + self._pending_tokens + size > self.max_tokens:
+            self._flush()
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((chunk, tokens, future))
+        self._pending_tokens += size
+        if self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        self._pending_tokens = 0
+        if batch:
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, int, asyncio.Future]]) -> None:
+        # Callers that were cancelled while waiting no longer need a summary
+        batch = [(chunk, tokens, future) for chunk, tokens, future in batch if not future.done()]
+        if not batch:
+            return
+
+        summaries = None
+        if len(batch) > 1:
+            try:
+                summaries = await self.summarize_many(
+                    [chunk for chunk, _, _ in batch], [tokens for _, tokens, _ in batch]
+                )
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            if summaries is not None:
+                self.packed_requests += 1
+                self.packed_chunks += len(batch)
+            else:
+                logger.warning(f"Could not split packed reply for {len(batch)} chunks, sending them one by one")
+                self.fallbacks += 1
+
+        if summaries is None:
+            results = await asyncio.gather(
+                *(self.summarize_one(chunk, tokens) for chunk, tokens, _ in batch),
+                return_exceptions=True
+            )
+        else:
+            results = summaries
+
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "packed_requests": self.packed_requests,
+            "packed_chunks": self.packed_chunks,
+            "fallbacks": self.fallbacks,
+        }
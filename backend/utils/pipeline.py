@@ -0,0 +1,405 @@
+import asyncio
+import logging
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .async_summarizer import summarize_shared, MODEL, SYSTEM_PROMPT
+from .chunker import get_token_counter
+from .compile_latex import LatexCompiler
+from .coordination import Coordinator
+from .dedup import BulletDeduplicator
+from .jobs import STAGES, ProgressFanout, ProgressReporter
+from .latex_gen import render_latex
+from .latex_lint import LatexLinter
+from .llm_client import DEFAULT_COMPLETION_TOKENS
+from .layout import AUTO_FIT_TARGET, AUTO_FONT_SIZE, densest_layout, estimate_pages, fit_layout, measure_fill
+from .metrics import AUTO_FIT, TOKENS, UPLOADS, track
+from .reducer import SummaryReducer
+from .result_cache import ResultCache
+from .singleflight import SingleFlight
+from .storage import PdfStorage
+from .text_extractor import extract_text_from_bytes, guess_tokens, guess_tokens_from_size
+
+logger = logging.getLogger(__name__)
+
+# Maximum tokens per chunk sent to the model; smaller uploads become a single chunk
+CHUNK_THRESHOLD_TOKENS = 4000
+CHUNK_OVERLAP_TOKENS = 200
+
+class InputFileError(ValueError):
+    """An uploaded file could not be processed; reported to the client as a 400"""
+    status_code = 400
+
+@dataclass
+class LayoutOptions:
+    # AUTO_FONT_SIZE picks both the font size and the number of columns
+    font_size: str
+    columns: int
+    orientation: str
+    # Summaries are merged until they fit this many pages, which costs extra model calls;
+    # None (or 0) keeps every bullet
+    max_pages: Optional[int] = None
+
+@dataclass
+class CheatsheetResult:
+    pdf_filename: str
+    latex_code: str
+    cached: bool = False
+
+@dataclass
+class UploadEstimate:
+    files: int
+    # Tokens the text is expected to have, guessed from file sizes and page counts, and its chunks
+    document_tokens: int = 0
+    chunks: int = 0
+    # What the summarize requests will send and reserve, as the LLM client counts them
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    cost_usd: float = 0.0
+    # The result is already cached, so the upload costs nothing
+    cached: bool = False
+
+class CheatsheetPipeline:
+    def __init__(
+        self,
+        result_cache: ResultCache,
+        latex_compiler: LatexCompiler,
+        reducer: SummaryReducer,
+        deduplicator: BulletDeduplicator,
+        storage: PdfStorage,
+        linter: LatexLinter,
+        coordinator: Optional[Coordinator] = None
+    ):
+        """
+        Turns uploaded files into a compiled cheat sheet: extract, chunk, summarize, dedup, reduce, compile.
+
+        Args:
+            result_cache (ResultCache): Cache of finished cheat sheets
+            latex_compiler (LatexCompiler): Compiler used for the final PDF
+            reducer (SummaryReducer): Merges summaries that would overflow the page budget
+            deduplicator (BulletDeduplicator): Drops bullets repeated by overlapping chunks
+            storage (PdfStorage): Where finished PDFs are kept for download
+            linter (LatexLinter): Repairs each model reply before it reaches the compiler
+            coordinator (Optional[Coordinator]): Shares in-flight builds with other worker processes
+        """
+        self.result_cache = result_cache
+        self.latex_compiler = latex_compiler
+        self.reducer = reducer
+        self.deduplicator = deduplicator
+        self.storage = storage
+        self.linter = linter
+
+        # Identical uploads arriving while one is being built share that build
+        self.inflight = SingleFlight("uploads", coordinator, poll_interval=0.25)
+        self._progress: Dict[str, ProgressFanout] = {}
+
+    async def run(
+        self,
+        files: List[Tuple[str, bytes]],
+        options: LayoutOptions,
+        progress: Optional[ProgressReporter] = None
+    ) -> CheatsheetResult:
+        """
+        Build a cheat sheet from (filename, content) pairs.
+
+        Raises:
+            InputFileError: If one of the files is not a readable PDF or TXT file
+        """
+        progress = progress or ProgressReporter()
+
+        # Return the stored result if we have already built this exact cheat sheet
+        cache_key = self._cache_key(files, options)
+        cached = await asyncio.to_thread(self.result_cache.get, cache_key)
+        if cached is not None:
+            self.storage.touch(cached.pdf_filename)
+            UPLOADS.inc(outcome="cached")
+            for name in STAGES:
+                progress.stage(name, "skipped")
+            return CheatsheetResult(cached.pdf_filename, cached.latex_code, cached=True)
+
+        fanout = self._progress.setdefault(cache_key, ProgressFanout())
+        fanout.add(progress)
+        try:
+            result = await self.inflight.do(
+                cache_key,
+                lambda: self._build(files, options, cache_key, fanout),
+                lookup=lambda: self._built_elsewhere(cache_key)
+            )
+        finally:
+            fanout.remove(progress)
+            if not fanout.reporters and self._progress.get(cache_key) is fanout:
+                del self._progress[cache_key]
+
+        if result.cached:
+            # Another worker process built it while we waited
+            UPLOADS.inc(outcome="cached")
+            for name in STAGES:
+                progress.stage(name, "skipped")
+        return result
+
+    async def estimate(self, files: List[Tuple[str, bytes]], options: LayoutOptions) -> UploadEstimate:
+        """
+        Estimate the LLM tokens and cost of building a cheat sheet, without calling the model.
+
+        Each file's tokens are guessed from its size, or its page count for a
+        PDF; nothing is extracted or tokenized, so admission control can use
+        this before it has committed any work to an upload, and the build
+        tokenizes the text once. Reduce requests are not included, as they
+        depend on the model's replies.
+
+        Raises:
+            InputFileError: If one of the files is not a PDF or TXT file, or the PDF can't be opened
+        """
+        # Hashing large uploads for the cache key is CPU work too
+        cache_key = await asyncio.to_thread(self._cache_key, files, options)
+        if await asyncio.to_thread(self.result_cache.peek, cache_key) is not None:
+            return UploadEstimate(files=len(files), cached=True)
+
+        async def guess(filename: str, content: bytes) -> int:
+            try:
+                return await guess_tokens(filename, content)
+            except ValueError as e:
+                raise InputFileError(f"Error processing {filename}: {str(e)}")
+
+        document_tokens = sum(await asyncio.gather(*(guess(filename, content) for filename, content in files)))
+        return self._estimate_for(len(files), document_tokens)
+
+    def estimate_sizes(self, sizes: List[Tuple[str, int]]) -> UploadEstimate:
+        """
+        Estimate like estimate(), from file names and sizes alone, so a client can ask before uploading.
+
+        Raises:
+            InputFileError: If one of the files is not a PDF or TXT file
+        """
+        document_tokens = 0
+        for filename, size in sizes:
+            try:
+                document_tokens += guess_tokens_from_size(filename, size)
+            except ValueError as e:
+                raise InputFileError(f"Error processing {filename}: {str(e)}")
+        return self._estimate_for(len(sizes), document_tokens)
+
+    def _estimate_for(self, files: int, document_tokens: int) -> UploadEstimate:
+        """The chunks, requests and cost that document_tokens of text will take"""
+        if document_tokens == 0:
+            return UploadEstimate(files=files)
+
+        counter = get_token_counter(MODEL)
+        stride = CHUNK_THRESHOLD_TOKENS - CHUNK_OVERLAP_TOKENS
+        chunks = max(1, math.ceil((document_tokens - CHUNK_OVERLAP_TOKENS) / stride))
+        per_request = counter.count_tokens_in_messages([
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": ""},
+        ])
+        prompt_tokens = document_tokens + (chunks - 1) * CHUNK_OVERLAP_TOKENS + chunks * per_request
+        completion_tokens = chunks * DEFAULT_COMPLETION_TOKENS
+        total_tokens = prompt_tokens + completion_tokens
+        return UploadEstimate(
+            files=files,
+            document_tokens=document_tokens,
+            chunks=chunks,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=total_tokens,
+            cost_usd=round(counter.estimate_cost(total_tokens, MODEL), 4)
+        )
+
+    def _cache_key(self, files: List[Tuple[str, bytes]], options: LayoutOptions) -> str:
+        return self.result_cache.make_key(
+            [self.result_cache.file_digest(content) for _, content in files],
+            options.font_size, 0 if options.font_size == AUTO_FONT_SIZE else options.columns,
+            options.orientation, options.max_pages
+        )
+
+    def _built_elsewhere(self, cache_key: str) -> Optional[CheatsheetResult]:
+        """The result of an identical upload another worker process has finished building"""
+        cached = self.result_cache.peek(cache_key)
+        if cached is None:
+            return None
+        self.storage.touch(cached.pdf_filename)
+        return CheatsheetResult(cached.pdf_filename, cached.latex_code, cached=True)
+
+    async def _build(
+        self,
+        files: List[Tuple[str, bytes]],
+        options: LayoutOptions,
+        cache_key: str,
+        progress: ProgressReporter
+    ) -> CheatsheetResult:
+        try:
+            with track("pipeline"):
+                result = await self._run_stages(files, options, cache_key, progress)
+        except Exception:
+            UPLOADS.inc(outcome="failed")
+            raise
+        UPLOADS.inc(outcome="built")
+        return result
+
+    async def _run_stages(
+        self,
+        files: List[Tuple[str, bytes]],
+        options: LayoutOptions,
+        cache_key: str,
+        progress: ProgressReporter
+    ) -> CheatsheetResult:
+        # Extraction, chunking and summarization overlap: every file is extracted
+        # concurrently, files are chunked in upload order as their text arrives,
+        # and each chunk goes to the model as soon as it is complete. Only the
+        # text of the chunk being built is held, never the whole corpus.
+        extract_tasks = [
+            asyncio.create_task(self._extract_one(filename, content))
+            for filename, content in files
+        ]
+        summary_tasks: List[asyncio.Task] = []
+        summarized = 0
+        # Whether any reply would have failed the compile without repairs
+        repaired = False
+
+        def lint(summary: str) -> str:
+            nonlocal repaired
+            with track("lint"):
+                result = self.linter.lint(summary)
+            repaired = repaired or result.fatal
+            return result.latex
+
+        async def summarize(chunk: str, tokens: int) -> str:
+            # Each reply is checked as it arrives, so a broken one is isolated to its chunk
+            return lint(await summarize_shared(chunk, tokens))
+
+        def on_summary_done(index: int, task: asyncio.Task) -> None:
+            nonlocal summarized
+            if task.cancelled() or task.exception() is not None:
+                return
+            summarized += 1
+            progress.stage("summarize", "running", summarized, len(summary_tasks))
+            progress.partial(index, task.result())
+
+        def submit_chunks(chunks: List[str]) -> None:
+            # The chunker has already counted each chunk's tokens; routing reuses them
+            token_counts = chunker.chunk_tokens[len(chunker.chunk_tokens) - len(chunks):]
+            for chunk, tokens in zip(chunks, token_counts):
+                index = len(summary_tasks)
+                task = asyncio.create_task(summarize(chunk, tokens))
+                task.add_done_callback(lambda t, index=index: on_summary_done(index, t))
+                summary_tasks.append(task)
+            if chunks:
+                progress.stage("chunk", "running", len(summary_tasks))
+
+        chunker = get_token_counter().streaming_chunker(CHUNK_THRESHOLD_TOKENS, CHUNK_OVERLAP_TOKENS)
+        try:
+            progress.stage("extract", "running", 0, len(files))
+            for extracted, task in enumerate(extract_tasks, start=1):
+                text = await task
+                progress.stage("extract", "running", extracted, len(files))
+                # Blank line between files, as when the texts were concatenated.
+                # Tokenizing a whole file is CPU work, so it runs off the event loop.
+                with track("chunk"):
+                    pieces, token_counts = await asyncio.to_thread(chunker.encode, text + "\n\n")
+                    chunks = chunker.feed_pieces(pieces, token_counts)
+                submit_chunks(chunks)
+            progress.stage("extract", "done", len(files), len(files))
+
+            with track("chunk"):
+                chunks = await asyncio.to_thread(chunker.flush)
+            submit_chunks(chunks)
+            TOKENS.inc(chunker.total_tokens, kind="document")
+            progress.stage("chunk", "done", len(summary_tasks), len(summary_tasks))
+            logger.info(
+                f"Document has {chunker.total_tokens} tokens in {len(summary_tasks)} chunks, "
+                f"estimated cost ${chunker.counter.estimate_cost(chunker.total_tokens, MODEL):.4f}"
+            )
+
+            processed_chunks = await asyncio.gather(*summary_tasks)
+        except BaseException:
+            # One bad file (or a failed chunk) fails the upload; stop the rest of the work
+            for task in extract_tasks + summary_tasks:
+                task.cancel()
+            raise
+        progress.stage("summarize", "done", len(summary_tasks), len(summary_tasks))
+
+        # Overlapping chunks make the model repeat facts; drop the repeats before
+        # they cost reduce calls and page space
+        progress.stage("dedup", "running")
+        with track("dedup"):
+            processed_chunks, report = await asyncio.to_thread(self.deduplicator.dedup, processed_chunks)
+        progress.stage("dedup", "done", report.removed, report.bullets)
+
+        # Large uploads would overflow the layout; merge summaries down to the page budget.
+        # Auto-fit merges down to what its densest setting holds, then picks the largest that fits.
+        auto_fit = options.font_size == AUTO_FONT_SIZE
+        if options.max_pages:
+            font_size, columns = densest_layout() if auto_fit else (options.font_size, options.columns)
+            processed_chunks = await self.reducer.reduce(
+                processed_chunks, font_size, columns, options.orientation, options.max_pages, progress
+            )
+            # Merged summaries are model replies too
+            processed_chunks = [lint(summary) for summary in processed_chunks]
+            progress.stage("reduce", "done")
+        else:
+            progress.stage("reduce", "skipped")
+        ai_generated_text = "\n".join(processed_chunks)
+
+        # Generate LaTeX and compile to PDF
+        progress.stage("compile", "running")
+        if auto_fit:
+            latex_content, temp_pdf = await self._compile_auto_fit(ai_generated_text, options)
+        else:
+            latex_content, temp_pdf = await self._compile(
+                ai_generated_text, options.font_size, options.columns, options.orientation
+            )
+        self.linter.note_compile(repaired)
+        try:
+            with track("store"):
+                pdf_filename = await asyncio.to_thread(self.storage.store, temp_pdf)
+        finally:
+            self.latex_compiler.cleanup(temp_pdf)
+        await asyncio.to_thread(self.result_cache.put, cache_key, pdf_filename, latex_content)
+        progress.stage("compile", "done")
+
+        return CheatsheetResult(pdf_filename, latex_content)
+
+    async def _compile(self, text: str, font_size: str, columns: int, orientation: str) -> Tuple[str, str]:
+        """Render the bullet lists into the template and compile them, returning (LaTeX, PDF path)"""
+        with track("render"):
+            latex_content = render_latex(text, "\\" + font_size, columns, orientation)
+        return latex_content, await self.latex_compiler.compile(latex_content)
+
+    async def _compile_auto_fit(self, text: str, options: LayoutOptions) -> Tuple[str, str]:
+        """
+        Compile with the largest setting estimated to fit the page budget.
+
+        The compiled PDF is measured; if the estimate was optimistic, the
+        estimate is scaled by the measured error and the text is compiled
+        once more with the denser setting that then fits.
+        """
+        budget = max(1, options.max_pages or 1)
+        font_size, columns = fit_layout(text, options.orientation, budget)
+        latex_content, temp_pdf = await self._compile(text, font_size, columns, options.orientation)
+        try:
+            fill = await asyncio.to_thread(measure_fill, temp_pdf, columns, options.orientation)
+        except Exception as e:
+            logger.warning(f"Could not measure the compiled layout: {str(e)}")
+            AUTO_FIT.inc(outcome="unverified")
+            return latex_content, temp_pdf
+
+        if fill <= budget or (font_size, columns) == densest_layout():
+            AUTO_FIT.inc(outcome="fit" if fill <= budget else "overflow")
+            return latex_content, temp_pdf
+
+        estimated = estimate_pages(text, font_size, columns, options.orientation)
+        denser = fit_layout(text, options.orientation, budget, AUTO_FIT_TARGET * estimated / fill)
+        logger.info(
+            f"{font_size}/{columns} columns filled {fill:.2f} pages against an estimate of {estimated:.2f}, "
+            f"recompiling with {denser[0]}/{denser[1]} columns"
+        )
+        self.latex_compiler.cleanup(temp_pdf)
+        AUTO_FIT.inc(outcome="corrected")
+        return await self._compile(text, *denser, options.orientation)
+
+    async def _extract_one(self, filename: str, content: bytes) -> str:
+        try:
+            return await extract_text_from_bytes(filename, content)
+        except ValueError as e:
+            raise InputFileError(f"Error processing {filename}: {str(e)}")
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import math
+from typing import List, Optional
+
+from .async_summarizer import reduce_summaries
+from .jobs import ProgressReporter
+from .layout import estimate_lines, item_texts, lines_per_page
+from .llm_client import LLMClient
+
+logger = logging.getLogger(__name__)
+
+# A reduced group is never asked for fewer bullets than this, so heavy
+# overflows are condensed over several rounds rather than in one lossy step
+MIN_ITEMS_PER_GROUP = 3
+
+class SummaryReducer:
+    def __init__(self, client: LLMClient, fan_in: int = 4, max_concurrency: int = 4, max_rounds: int = 6):
+        """
+        Shrinks chunk summaries to a page budget by merging them in a tree.
+
+        Each round merges groups of `fan_in` neighbouring summaries in parallel,
+        so the number of rounds grows with log(chunks) rather than with chunks.
+
+        Args:
+            client (LLMClient): Client used for the merge requests
+            fan_in (int): Summaries merged by one request
+            max_concurrency (int): Merge requests in flight at once, across all uploads
+            max_rounds (int): Give up and keep the current summaries after this many rounds
+        """
+        if fan_in < 2:
+            raise ValueError("fan_in must be at least 2")
+        self.client = client
+        self.fan_in = fan_in
+        self.max_rounds = max_rounds
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+        self.reductions = 0
+        self.rounds = 0
+
+    async def reduce(
+        self,
+        summaries: List[str],
+        font_size: str,
+        columns: int,
+        orientation: str,
+        max_pages: int,
+        progress: Optional[ProgressReporter] = None
+    ) -> List[str]:
+        """
+        Merge summaries until their estimated rendered size fits in max_pages.
+
+        Args:
+            summaries (List[str]): Itemize environments in document order
+            font_size (str): Size command such as "small"
+            columns (int): Number of columns
+            orientation (str): "portrait" or "landscape"
+            max_pages (int): Page budget
+            progress (Optional[ProgressReporter]): Receives a "reduce" stage update per round
+
+        Returns:
+            List[str]: Summaries in document order that fit the budget, or the
+            input unchanged if it already fits
+        """
+        progress = progress or ProgressReporter()
+        capacity = lines_per_page(font_size, columns, orientation) * max_pages
+
+        for round_number in range(1, self.max_rounds + 1):
+            sizes = [estimate_lines(summary, font_size, columns, orientation) for summary in summaries]
+            total = sum(sizes)
+            if total <= capacity:
+                return summaries
+
+            items = sum(len(item_texts(summary)) for summary in summaries)
+            lines_per_item = total / max(items, 1)
+            groups = [
+                (summaries[i:i + self.fan_in], sum(sizes[i:i + self.fan_in]))
+                for i in range(0, len(summaries), self.fan_in)
+            ]
+            logger.info(
+                f"Summaries take ~{total:.0f} lines for a budget of {capacity}; "
+                f"round {round_number} merges {len(summaries)} into {len(groups)}"
+            )
+            progress.stage("reduce", "running", round_number)
+
+            # Each group gets its proportional share of the page budget
+            reduced = await asyncio.gather(*(
+                self._reduce_group(group, max(MIN_ITEMS_PER_GROUP, math.floor(capacity * size / total / lines_per_item)))
+                for group, size in groups
+            ))
+            self.rounds += 1
+
+            if len(summaries) == 1 and estimate_lines(reduced[0], font_size, columns, orientation) >= total:
+                logger.warning("Reducing a single summary did not shrink it; keeping the result")
+                return reduced
+            summaries = reduced
+
+        logger.warning(f"Summaries still exceed {max_pages} page(s) after {self.max_rounds} rounds")
+        return summaries
+
+    async def _reduce_group(self, group: List[str], max_items: int) -> str:
+        async with self._slots:
+            self.reductions += 1
+            return await reduce_summaries(self.client, group, max_items)
+
+    def stats(self) -> dict:
+        return {
+            "fan_in": self.fan_in,
+            "rounds": self.rounds,
+            "reductions": self.reductions,
+        }
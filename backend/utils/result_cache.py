@@ -0,0 +1,196 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .async_summarizer import MODEL, SYSTEM_PROMPT, TEMPERATURE, model_router
+from .coordination import Coordinator
+
+# Bump when the pipeline changes in a way that invalidates stored results
+CACHE_VERSION = "6"
+
+TEMPLATE_PATH = Path(__file__).resolve().parent.parent / "templates" / "base.tex"
+
+
+@dataclass
+class CachedResult:
+    pdf_filename: str
+    latex_code: str
+    created_at: float
+
+
+class ResultCache:
+    def __init__(
+        self,
+        storage_dir: Path,
+        max_entries: int = 256,
+        ttl_seconds: float = 24 * 3600,
+        coordinator: Optional[Coordinator] = None
+    ):
+        """
+        Initialize a content-addressed cache of finished cheat sheets.
+
+        With a coordinator, lookups and stores touch SQLite, so callers run
+        them in worker threads; the in-memory entries are guarded by a lock.
+
+        Args:
+            storage_dir (Path): Directory the cached PDFs live in
+            max_entries (int): Maximum number of results kept before evicting the oldest
+            ttl_seconds (float): How long a result stays valid after it was stored
+            coordinator (Optional[Coordinator]): When given, results are also published there,
+                so a cheat sheet built by one worker process is a hit in all of them
+        """
+        self.storage_dir = Path(storage_dir)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.coordinator = coordinator
+        self._entries: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # The template is part of every key, so hash it once up front
+        self._template_hash = hashlib.sha256(TEMPLATE_PATH.read_bytes()).hexdigest()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.shared_hits = 0
+
+    @staticmethod
+    def file_digest(content: bytes) -> str:
+        """Hash one uploaded file's contents"""
+        return hashlib.sha256(content).hexdigest()
+
+    def make_key(
+        self,
+        file_digests: List[str],
+        font_size: str,
+        columns: int,
+        orientation: str,
+        max_pages: Optional[int]
+    ) -> str:
+        """
+        Build the cache key for a set of uploaded files and their layout options.
+
+        Keying on the uploaded bytes rather than the extracted text lets a hit
+        skip extraction as well. CACHE_VERSION covers changes to extraction
+        and sanitizing.
+
+        Args:
+            file_digests (List[str]): file_digest of each uploaded file, in upload order
+            font_size (str): Font size option as sent by the client
+            columns (int): Number of columns
+            orientation (str): Paper orientation
+            max_pages (Optional[int]): Page budget the summaries were reduced to, None if they were not
+
+        Returns:
+            str: Hex digest identifying the result
+        """
+        digest = hashlib.sha256()
+        for part in (
+            CACHE_VERSION,
+            MODEL,
+            model_router.signature(),
+            str(TEMPERATURE),
+            SYSTEM_PROMPT,
+            self._template_hash,
+            font_size,
+            str(columns),
+            orientation,
+            str(max_pages),
+            *file_digests,
+        ):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        """Return the cached result for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_valid(entry):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+            if entry is not None:
+                # Expired, or its PDF has been removed from storage
+                del self._entries[key]
+                self.evictions += 1
+
+        entry = self._get_shared(key)
+        with self._lock:
+            if entry is not None:
+                self.hits += 1
+                self.shared_hits += 1
+                return entry
+            self.misses += 1
+        return None
+
+    def peek(self, key: str) -> Optional[CachedResult]:
+        """Like get, but without counting a lookup; used while waiting on another process's build"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and self._is_valid(entry):
+            return entry
+        return self._get_shared(key)
+
+    def _get_shared(self, key: str) -> Optional[CachedResult]:
+        """Adopt a result another worker process published"""
+        if self.coordinator is None:
+            return None
+        value = self.coordinator.get("results", key)
+        if value is None:
+            return None
+        entry = CachedResult(**json.loads(value))
+        if not self._is_valid(entry):
+            return None
+        with self._lock:
+            self._store(key, entry)
+        return entry
+
+    def put(self, key: str, pdf_filename: str, latex_code: str) -> None:
+        """Store a finished result, evicting the least recently used entries if needed"""
+        entry = CachedResult(
+            pdf_filename=pdf_filename,
+            latex_code=latex_code,
+            created_at=time.time()
+        )
+        with self._lock:
+            self._store(key, entry)
+        if self.coordinator is not None:
+            self.coordinator.put("results", key, json.dumps(asdict(entry)), self.ttl_seconds)
+
+    def _store(self, key: str, entry: CachedResult) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+
+        # Drop expired entries first so they don't push out live ones
+        now = time.time()
+        for stale_key in [k for k, e in self._entries.items() if now - e.created_at > self.ttl_seconds]:
+            del self._entries[stale_key]
+            self.evictions += 1
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "shared_hits": self.shared_hits,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _is_valid(self, entry: CachedResult) -> bool:
+        if time.time() - entry.created_at > self.ttl_seconds:
+            return False
+        return (self.storage_dir / entry.pdf_filename).exists()
@@ -0,0 +1,100 @@
+import logging
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from .chunker import get_token_counter
+from .llm_client import LatencyWindow
+
+logger = logging.getLogger(__name__)
+
+# Characters that mark formula-heavy text, which the fast model summarizes poorly
+_MATH_CHARS = re.compile(r'[=+\-*/^_\\{}()\[\]<>|∑∫√≤≥≠±×÷∞∂∇πθλμσ0-9]')
+
+@dataclass
+class Route:
+    name: str
+    model: str
+    # A chunk takes the first route whose limits it fits; None means no limit
+    max_tokens: Optional[int] = None
+    max_math_ratio: Optional[float] = None
+
+    def accepts(self, tokens: int, math_ratio: float) -> bool:
+        if self.max_tokens is not None and tokens > self.max_tokens:
+            return False
+        if self.max_math_ratio is not None and math_ratio > self.max_math_ratio:
+            return False
+        return True
+
+def math_ratio(text: str) -> float:
+    """Fraction of non-whitespace characters that are digits, operators or math symbols"""
+    visible = len(text) - sum(1 for c in text if c.isspace())
+    if visible == 0:
+        return 0.0
+    return len(_MATH_CHARS.findall(text)) / visible
+
+class ModelRouter:
+    def __init__(self, routes: List[Route]):
+        """
+        Picks the model a chunk is summarized with.
+
+        Routes are tried in order, so cheap and fast ones come first and the
+        last one, usually without limits, catches everything else.
+
+        Args:
+            routes (List[Route]): Routes in order of preference
+        """
+        if not routes:
+            raise ValueError("ModelRouter needs at least one route")
+        self.routes = routes
+        self._latencies: Dict[str, LatencyWindow] = {route.name: LatencyWindow() for route in routes}
+        self._requests: Dict[str, int] = {route.name: 0 for route in routes}
+        self._errors: Dict[str, int] = {route.name: 0 for route in routes}
+
+    @property
+    def strongest(self) -> Route:
+        return self.routes[-1]
+
+    def choose(self, text: str, tokens: Optional[int] = None) -> Route:
+        """Return the first route that accepts text; pass its token count if known, to skip counting"""
+        return self.routes[self._index(text, tokens)]
+
+    def choose_many(self, texts: Sequence[str], token_counts: Optional[Sequence[int]] = None) -> Route:
+        """Return the route for a request carrying several texts: the latest one any of them needs"""
+        if token_counts is None:
+            token_counts = [None] * len(texts)
+        return self.routes[max(self._index(text, tokens) for text, tokens in zip(texts, token_counts))]
+
+    def _index(self, text: str, tokens: Optional[int] = None) -> int:
+        if len(self.routes) == 1:
+            return 0
+        if tokens is None:
+            tokens = get_token_counter(self.routes[0].model).count_tokens(text)
+        ratio = math_ratio(text)
+        for index, route in enumerate(self.routes):
+            if route.accepts(tokens, ratio):
+                return index
+        return len(self.routes) - 1
+
+    def record(self, route: Route, seconds: float, ok: bool = True) -> None:
+        """Record the outcome of a request sent on route"""
+        self._requests[route.name] += 1
+        if ok:
+            self._latencies[route.name].add(seconds)
+        else:
+            self._errors[route.name] += 1
+
+    def signature(self) -> str:
+        """Identifies the routing policy, so results built under another policy are not reused"""
+        return ";".join(f"{r.name}={r.model}:{r.max_tokens}:{r.max_math_ratio}" for r in self.routes)
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        return {
+            route.name: {
+                "model": route.model,
+                "requests": self._requests[route.name],
+                "errors": self._errors[route.name],
+                **self._latencies[route.name].stats(),
+            }
+            for route in self.routes
+        }
@@ -1,6 +1,36 @@
 import re
+from functools import lru_cache
 from typing import List, Tuple
 
+# Literals that must appear in the text for a removal pattern to match at all.
+# Phrase and keyword patterns are covered by _PHRASE_PATTERN below; anything
+# else without an entry here always runs.
+LITERAL_HINTS = {
+    r'Page\s+\d+': ('Page',),
+    r'-\s*\d+\s*-': ('-',),
+    r'^\s*©.*$': ('©',),
+    r'^\s*www\..*$': ('www.',),
+    r'^\s*Copyright\s+©\s*\d{4}.*$': ('Copyright',),
+    r'^\s*\d+\.\s*$': ('.',),
+    r'^\s*\[\d+\]\s*': ('[',),
+    r'^\s*\*\s*$': ('*',),
+    r'^\s*[•\-\*]{3,}\s*$': ('•', '-', '*'),
+    r'^\s*\.{3,}\s*$': ('...',),
+    r'^\s*_{3,}\s*$': ('___',),
+}
+
+# Matches patterns like ^\s*[A-Z\s]+TRADE SECRET.*$ and ^\s*All rights reserved.*$
+_PHRASE_PATTERN = re.compile(r'\^\\s\*(?:\[A-Z\\s\]\+)?([A-Za-z][A-Za-z ]*)\.\*\$')
+
+def _required_literals(pattern: str) -> Tuple[str, ...]:
+    """Return literals one of which must occur in any text the pattern matches"""
+    if pattern in LITERAL_HINTS:
+        return LITERAL_HINTS[pattern]
+    match = _PHRASE_PATTERN.fullmatch(pattern)
+    if match:
+        return (match.group(1),)
+    return ()
+
 class TextSanitizer:
     def __init__(self):
         # Common patterns to remove
@@ -67,6 +97,13 @@ class TextSanitizer:
         
         # Compile patterns for better performance
         self.compiled_patterns = [re.compile(pattern, re.MULTILINE) for pattern in self.patterns]
+
+        # Most patterns target a literal keyword; a substring check lets us skip
+        # the regex pass entirely when the keyword isn't in the text
+        self.removal_plan = [
+            (compiled, _required_literals(pattern))
+            for pattern, compiled in zip(self.patterns, self.compiled_patterns)
+        ]
         
         # Patterns to clean up but not remove entirely
         self.cleanup_patterns = [
@@ -88,19 +125,43 @@ class TextSanitizer:
         # Compile cleanup patterns
         self.compiled_cleanup = [(re.compile(pattern), repl) for pattern, repl in self.cleanup_patterns]
 
+        # Once whitespace is collapsed to single spaces, every remaining cleanup
+        # pattern reduces to a fixed string replacement
+        self.cleanup_replacements = [(' ' + p, p) for p in '.,;:!?'] + [
+            ('( ', '('),
+            (' )', ')'),
+            ('[ ', '['),
+            (' ]', ']'),
+        ]
+        self.bullet_table = str.maketrans('', '', '•»–')
+
     def remove_noise(self, text: str) -> str:
         """Remove common noise patterns from text"""
-        # Apply removal patterns
-        for pattern in self.compiled_patterns:
+        # Apply removal patterns in order, skipping those whose keyword is absent.
+        # The check runs on the current text since earlier removals can join
+        # fragments into a new keyword.
+        for pattern, literals in self.removal_plan:
+            if literals and not any(literal in text for literal in literals):
+                continue
             text = pattern.sub('', text)
         return text
 
     def cleanup_text(self, text: str) -> str:
         """Clean up text formatting without removing content"""
-        # Apply cleanup patterns
-        for pattern, repl in self.compiled_cleanup:
-            text = pattern.sub(repl, text)
-        return text
+        # Equivalent to applying self.compiled_cleanup in order. str.split uses the
+        # same notion of whitespace as \s, so this matches the first pattern exactly.
+        collapsed = ' '.join(text.split())
+        if collapsed:
+            if text[0].isspace():
+                collapsed = ' ' + collapsed
+            if text[-1].isspace():
+                collapsed += ' '
+        elif text:
+            collapsed = ' '
+        for target, repl in self.cleanup_replacements:
+            if target in collapsed:
+                collapsed = collapsed.replace(target, repl)
+        return collapsed.translate(self.bullet_table)
 
     def sanitize(self, text: str) -> str:
         """Apply all sanitization steps to the text"""
@@ -126,7 +187,11 @@ class TextSanitizer:
         # Join lines and clean up
         return self.cleanup_text('\n'.join(processed_lines))
 
+@lru_cache(maxsize=None)
+def get_sanitizer() -> TextSanitizer:
+    """Return the process-wide sanitizer, compiling its patterns on first use"""
+    return TextSanitizer()
+
 def sanitize_text(text: str) -> str:
     """Convenience function to sanitize text using the default sanitizer"""
-    sanitizer = TextSanitizer()
-    return sanitizer.sanitize(text) 
\ No newline at end of file
+    return get_sanitizer().sanitize(text) 
\ No newline at end of file
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .coordination import Coordinator
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    def __init__(
+        self,
+        name: str,
+        coordinator: Optional[Coordinator] = None,
+        lease_seconds: float = 600,
+        poll_interval: float = 0.1
+    ):
+        """
+        Coalesces concurrent calls with the same key into one shared computation.
+
+        The computation runs as its own task, shielded from its callers:
+        cancelling one waiter (or all of them) does not stop it, so its result
+        still reaches the caches for the next request.
+
+        With a coordinator, calls are also coalesced across worker processes:
+        the process holding the key's lease computes, and the others poll the
+        shared cache through `lookup` until the result appears or the lease is
+        given up.
+
+        Args:
+            name (str): Label used in stats, and the namespace of its leases
+            coordinator (Optional[Coordinator]): Shared state for cross-process coalescing
+            lease_seconds (float): A computation running longer than this is assumed abandoned
+            poll_interval (float): Seconds between lookups while another process computes
+        """
+        self.name = name
+        self.coordinator = coordinator
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+        self.started = 0
+        self.coalesced = 0
+        self.remote_waits = 0
+        self.remote_hits = 0
+
+    async def do(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[Any]],
+        lookup: Optional[Callable[[], Any]] = None
+    ) -> Any:
+        """
+        Return the result of factory(), or of the identical call already in flight for key.
+
+        Args:
+            key (str): Identifies the computation
+            factory (Callable[[], Awaitable[Any]]): Runs the computation, storing its result where lookup finds it
+            lookup (Optional[Callable[[], Any]]): Reads a finished result from a cache shared by all
+                processes, or returns None; it runs in a worker thread. Without it calls are only
+                coalesced within this process
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            if self.coordinator is not None and lookup is not None:
+                task = asyncio.ensure_future(self._across_processes(key, factory, lookup))
+            else:
+                task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _across_processes(self, key: str, factory: Callable[[], Awaitable[Any]], lookup: Callable[[], Any]) -> Any:
+        lease = f"{self.name}:{key}"
+        holder = self.coordinator.holder_id()
+        waited = False
+        while not await asyncio.to_thread(self.coordinator.claim_lease, lease, holder, self.lease_seconds):
+            if not waited:
+                waited = True
+                self.remote_waits += 1
+            await asyncio.sleep(self.poll_interval)
+            result = await asyncio.to_thread(lookup)
+            if result is not None:
+                self.remote_hits += 1
+                return result
+
+        try:
+            # Another process may have finished between our last lookup and the claim
+            result = await asyncio.to_thread(lookup)
+            if result is not None:
+                if waited:
+                    self.remote_hits += 1
+                return result
+            return await factory()
+        finally:
+            try:
+                await asyncio.to_thread(self.coordinator.release_lease, lease, holder)
+            except Exception as e:
+                # The lease expires on its own; don't mask the computation's outcome
+                logger.warning(f"Could not release lease {lease}: {str(e)}")
+
+    def _finished(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the error as seen even if every waiter has gone away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._inflight),
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "remote_waits": self.remote_waits,
+            "remote_hits": self.remote_hits,
+        }
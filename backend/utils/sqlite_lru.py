@@ -0,0 +1,143 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+
+class SqliteLRU:
+    def __init__(self, path: str, table: str, columns: str, max_bytes: int, touch_batch: int = 100):
+        """
+        Initialize an on-disk table of entries evicted least recently used first once their sizes pass max_bytes.
+
+        Lookups and stores run in worker threads, so the connection is guarded
+        by a lock. Hits only note their key; the recency of noted keys is
+        written with the next store, or once touch_batch hits have built up.
+        A running total of the entries' sizes is kept in a totals table, so
+        neither stores nor evictions have to sum the table.
+
+        Args:
+            path (str): Location of the SQLite database file
+            table (str): Name of the table holding the entries
+            columns (str): Column definitions besides key, size and last_used
+            max_bytes (int): Upper bound on the stored size before LRU eviction kicks in
+            touch_batch (int): Hits noted before their recency is written on its own
+        """
+        self.path = path
+        self.table = table
+        self.max_bytes = max_bytes
+        self.touch_batch = touch_batch
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Every worker process opens the same file; WAL lets them read while one writes
+        self._conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                key TEXT PRIMARY KEY,
+                {columns},
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_last_used ON {table} (last_used)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS totals (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.execute(
+            f"INSERT OR IGNORE INTO totals (name, value) SELECT ?, COALESCE(SUM(size), 0) FROM {table}", (table,)
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+        # Keys hit since recency was last written, with the time of their latest hit
+        self._touched: Dict[str, float] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key: str, columns: str) -> Optional[Tuple]:
+        """Return the requested columns of key's entry, counting the lookup and noting the hit"""
+        with self._lock:
+            row = self._conn.execute(f"SELECT {columns} FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._touched[key] = time.time()
+            if len(self._touched) >= self.touch_batch:
+                self._write_touched()
+                self._conn.commit()
+            self.hits += 1
+            self._on_hit(row)
+        return row
+
+    def _on_hit(self, row: Tuple) -> None:
+        """Account for a hit; called with the lock held"""
+
+    def _peek(self, key: str, columns: str) -> Optional[Tuple]:
+        """Return the requested columns of key's entry without counting a lookup or touching its recency"""
+        with self._lock:
+            return self._conn.execute(f"SELECT {columns} FROM {self.table} WHERE key = ?", (key,)).fetchone()
+
+    def _put(self, key: str, size: int, values: Dict[str, object]) -> None:
+        """Store an entry of the given size with its other column values, then evict past max_bytes"""
+        names = ["key", *values, "size", "last_used"]
+        row: Sequence[object] = [key, *values.values(), size, time.time()]
+        with self._lock:
+            # Immediate, so no other process changes the entry between reading its old size and replacing it
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._write_touched()
+                previous = self._conn.execute(f"SELECT size FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} ({', '.join(names)}) VALUES ({', '.join('?' for _ in names)})",
+                    row
+                )
+                total = self._add_to_total(size - (previous[0] if previous else 0))
+                if total > self.max_bytes:
+                    self._evict(total)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def _write_touched(self) -> None:
+        if self._touched:
+            self._conn.executemany(
+                f"UPDATE {self.table} SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def _add_to_total(self, delta: int) -> int:
+        self._conn.execute("UPDATE totals SET value = value + ? WHERE name = ?", (delta, self.table))
+        return self._conn.execute("SELECT value FROM totals WHERE name = ?", (self.table,)).fetchone()[0]
+
+    def _evict(self, total: int) -> None:
+        # Walk from the least recently used end until we are back under budget
+        stale = []
+        freed = 0
+        for key, size in self._conn.execute(f"SELECT key, size FROM {self.table} ORDER BY last_used"):
+            if total - freed <= self.max_bytes:
+                break
+            stale.append((key,))
+            freed += size
+        self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", stale)
+        self._add_to_total(-freed)
+
+    def stats(self) -> Dict[str, float]:
+        """Return entry count, stored size and hit rate for monitoring"""
+        with self._lock:
+            (entries,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+            (total,) = self._conn.execute("SELECT value FROM totals WHERE name = ?", (self.table,)).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
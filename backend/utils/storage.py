@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Stored PDFs are named after a hash of their contents
+_PDF_NAME = re.compile(r'^cheatsheet_([0-9a-f]{16,64})\.pdf$')
+# Temporary copies store() renames into place once complete
+_PARTIAL_NAME = re.compile(r'^\.cheatsheet_[0-9a-f]{16,64}\.pdf\.\d+\.\d+$')
+
+class PdfStorage:
+    def __init__(
+        self,
+        root: Path,
+        scratch_dir: Path,
+        max_bytes: int = 1024 * 1024 * 1024,
+        ttl_seconds: float = 24 * 3600,
+        scratch_max_age: float = 3600,
+        sweep_interval: float = 300
+    ):
+        """
+        Content-addressed store for finished PDFs, with TTL and size-based eviction.
+
+        Identical PDFs are stored once. A background task removes PDFs that
+        have not been stored or served for ttl_seconds, then the least recently
+        used ones until the total is under max_bytes. It also clears job
+        directories left in the LaTeX scratch directory and partial copies
+        left in root by a crash.
+
+        Args:
+            root (Path): Directory the PDFs are kept in
+            scratch_dir (Path): The LaTeX compiler's scratch directory
+            max_bytes (int): Upper bound on the total size of stored PDFs
+            ttl_seconds (float): How long an unused PDF is kept
+            scratch_max_age (float): Age after which a scratch job directory or partial copy counts as abandoned
+            sweep_interval (float): Seconds between eviction sweeps
+        """
+        self.root = Path(root)
+        self.scratch_dir = Path(scratch_dir)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.scratch_max_age = scratch_max_age
+        self.sweep_interval = sweep_interval
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        # Last time each PDF was stored or served; falls back to its mtime
+        self._last_used: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self.stored = 0
+        self.deduplicated = 0
+        self.evicted = 0
+        self.bytes_evicted = 0
+        self.scratch_removed = 0
+        self.partials_removed = 0
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def store(self, pdf_path: str) -> str:
+        """
+        Copy a compiled PDF into storage and return its filename.
+
+        Args:
+            pdf_path (str): PDF produced by the compiler
+
+        Returns:
+            str: Name of the stored file, derived from its contents
+        """
+        digest = hashlib.sha256()
+        with open(pdf_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        filename = f"cheatsheet_{digest.hexdigest()[:32]}.pdf"
+        target = self.root / filename
+
+        if target.exists():
+            self.deduplicated += 1
+        else:
+            # Copy under a temporary name so a download never sees a partial file
+            partial = self.root / f".{filename}.{os.getpid()}.{time.monotonic_ns()}"
+            shutil.copyfile(pdf_path, partial)
+            os.replace(partial, target)
+            self.stored += 1
+        self.touch(filename)
+        return filename
+
+    def path(self, filename: str) -> Optional[Path]:
+        """Return the path of a stored PDF, or None if the name is invalid or the file is gone"""
+        if not _PDF_NAME.match(filename):
+            return None
+        target = self.root / filename
+        return target if target.exists() else None
+
+    @staticmethod
+    def etag(filename: str) -> str:
+        """Strong ETag for a stored PDF; its name already identifies its contents"""
+        return f'"{_PDF_NAME.match(filename).group(1)}"'
+
+    def touch(self, filename: str) -> None:
+        """Record that a PDF was used, deferring its eviction"""
+        now = time.time()
+        self._last_used[filename] = now
+        # Other worker processes sweep the same directory and only see the file's mtime
+        try:
+            os.utime(self.root / filename, (now, now))
+        except OSError:
+            pass
+
+    def sweep(self) -> None:
+        """Evict expired and least recently used PDFs and remove abandoned scratch directories and partial copies"""
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.root):
+            if not entry.is_file():
+                continue
+            if _PARTIAL_NAME.match(entry.name):
+                # A copy still being written is younger than any sane scratch_max_age
+                try:
+                    if now - entry.stat().st_mtime > self.scratch_max_age:
+                        os.remove(entry.path)
+                        self.partials_removed += 1
+                except FileNotFoundError:
+                    pass
+                continue
+            if not _PDF_NAME.match(entry.name):
+                continue
+            stat = entry.stat()
+            entries.append((self._last_used.get(entry.name, stat.st_mtime), stat.st_size, entry.name))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for last_used, size, name in entries:
+            if now - last_used <= self.ttl_seconds and total <= self.max_bytes:
+                break
+            try:
+                os.remove(self.root / name)
+            except FileNotFoundError:
+                pass
+            self._last_used.pop(name, None)
+            total -= size
+            self.evicted += 1
+            self.bytes_evicted += size
+
+        if self.scratch_dir.is_dir():
+            for entry in os.scandir(self.scratch_dir):
+                if entry.is_dir() and now - entry.stat().st_mtime > self.scratch_max_age:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    self.scratch_removed += 1
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                logger.error(f"Storage sweep failed: {str(e)}")
+            await asyncio.sleep(self.sweep_interval)
+
+    def stats(self) -> Dict[str, int]:
+        files = [entry for entry in os.scandir(self.root) if entry.is_file() and _PDF_NAME.match(entry.name)]
+        return {
+            "files": len(files),
+            "bytes": sum(entry.stat().st_size for entry in files),
+            "max_bytes": self.max_bytes,
+            "stored": self.stored,
+            "deduplicated": self.deduplicated,
+            "evicted": self.evicted,
+            "bytes_evicted": self.bytes_evicted,
+            "scratch_removed": self.scratch_removed,
+            "partials_removed": self.partials_removed,
+        }
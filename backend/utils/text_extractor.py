@@ -1,21 +1,146 @@
+import asyncio
+import math
+import multiprocessing
+import os
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+
 import fitz
 from fastapi import UploadFile
+from .extraction_cache import ExtractionCache
+from .extraction_worker import extract_page_range
 from .sanitizer import sanitize_text
+from .metrics import EXTRACTED_BYTES, track
+
+# Fewest pages worth a worker task of their own; each task opens the document once
+PAGES_PER_TASK = int(os.getenv("EXTRACT_PAGES_PER_TASK", "25"))
+# Per server process: each uvicorn worker has a pool of its own, so the default stays small
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "2"))
+
+# Rough sizes for guessing a file's tokens before it is extracted: English text averages
+# about four bytes per token, and a page of lecture notes a few hundred tokens
+BYTES_PER_TOKEN = 4
+TOKENS_PER_PDF_PAGE = int(os.getenv("TOKENS_PER_PDF_PAGE", "600"))
+# Used to guess a PDF's page count when only its size is known
+PDF_BYTES_PER_PAGE = int(os.getenv("PDF_BYTES_PER_PAGE", "50000"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+# Sanitized text of files we have already extracted, shared across uploads
+extraction_cache = ExtractionCache(
+    os.getenv("EXTRACTION_CACHE_PATH", os.path.join("cache", "extracted_text.sqlite3")),
+    max_bytes=int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+)
+
+def get_extraction_pool() -> ProcessPoolExecutor:
+    """Return the process pool used for PDF parsing and sanitizing, creating it on first use"""
+    global _pool
+    if _pool is None:
+        # Forking would copy this process's threads and SQLite connections into the workers
+        _pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def shutdown_extraction_pool() -> None:
+    """Stop the worker processes; called on application shutdown"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+def _count_pages(content: bytes) -> int:
+    with fitz.open(stream=content, filetype="pdf") as doc:
+        return doc.page_count
+
+def _page_spans(page_count: int) -> List[Tuple[int, int]]:
+    """Split pages into at most one contiguous span per worker, each at least PAGES_PER_TASK long"""
+    span = max(PAGES_PER_TASK, math.ceil(page_count / EXTRACT_WORKERS))
+    return [(start, min(start + span, page_count)) for start in range(0, page_count, span)]
+
+async def _extract_pdf_text(content: bytes) -> str:
+    """
+    Extract a PDF's text with page ranges spread across the process pool.
+
+    Raises:
+        ValueError: If the PDF can't be read
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_extraction_pool()
+    try:
+        page_count = await asyncio.to_thread(_count_pages, content)
+    except RuntimeError as e:
+        raise ValueError(f"Could not read the PDF: {str(e)}")
+
+    # Workers attach to one shared copy of the document instead of each
+    # receiving the bytes through a pipe
+    shm = shared_memory.SharedMemory(create=True, size=max(len(content), 1))
+    try:
+        shm.buf[:len(content)] = content
+        # Every task parses the whole document, so there are no more tasks than workers
+        parts = await asyncio.gather(*(
+            loop.run_in_executor(pool, extract_page_range, shm.name, len(content), start, stop)
+            for start, stop in _page_spans(page_count)
+        ))
+    except BrokenExecutor:
+        raise
+    except RuntimeError as e:
+        # A page MuPDF can't parse, though the document opened
+        raise ValueError(f"Could not read the PDF: {str(e)}")
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return "".join(parts)
+
+def guess_tokens_from_size(filename: str, size: int) -> int:
+    """Guess a file's token count from its size alone, before it has been uploaded"""
+    if not filename.endswith((".pdf", ".txt")):
+        raise ValueError("File must be a PDF or TXT file")
+    if filename.endswith(".txt"):
+        return math.ceil(size / BYTES_PER_TOKEN)
+    return math.ceil(size / PDF_BYTES_PER_PAGE) * TOKENS_PER_PDF_PAGE
+
+async def guess_tokens(filename: str, content: bytes) -> int:
+    """Guess a file's token count without extracting it: from its size for text, its page count for a PDF"""
+    if not filename.endswith(".pdf"):
+        return guess_tokens_from_size(filename, len(content))
+    try:
+        # Opening a PDF reads its structure, not the contents of its pages
+        pages = await asyncio.to_thread(_count_pages, content)
+    except RuntimeError as e:
+        raise ValueError(f"Could not read the PDF: {str(e)}")
+    return pages * TOKENS_PER_PDF_PAGE
+
+async def extract_text_from_bytes(filename: str, content: bytes) -> str:
+    """Extract and sanitize text from the contents of a PDF or TXT file, reusing an earlier extraction of the same bytes"""
+    if not filename.endswith((".pdf", ".txt")):
+        raise ValueError("File must be a PDF or TXT file")
+
+    # Hashing and decompressing large files would stall the event loop
+    key = await asyncio.to_thread(extraction_cache.make_key, filename, content)
+    cached = await asyncio.to_thread(extraction_cache.get, key)
+    if cached is not None:
+        return cached
+
+    text = await _extract_and_sanitize(filename, content)
+    await asyncio.to_thread(extraction_cache.put, key, text, len(content))
+    return text
+
+async def _extract_and_sanitize(filename: str, content: bytes) -> str:
+    with track("extract"):
+        if filename.endswith(".pdf"):
+            text = await _extract_pdf_text(content)
+            EXTRACTED_BYTES.inc(len(content), type="pdf")
+        else:
+            text = content.decode("utf-8")
+            EXTRACTED_BYTES.inc(len(content), type="txt")
+
+    # Sanitizing is CPU-bound too, so keep it off the event loop
+    loop = asyncio.get_running_loop()
+    with track("sanitize"):
+        return await loop.run_in_executor(get_extraction_pool(), sanitize_text, text)
 
 async def extract_text_from_file(file: UploadFile) -> str:
     """Extract text from a PDF or TXT file"""
     content = await file.read()
-    
-    if file.filename.endswith(".pdf"):
-        doc = fitz.open(stream=content, filetype="pdf")
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        # Sanitize the extracted text
-        return sanitize_text(text)
-    elif file.filename.endswith(".txt"):
-        text = content.decode("utf-8")
-        # Sanitize the text file content
-        return sanitize_text(text)
-    else:
-        raise ValueError("File must be a PDF or TXT file") 
\ No newline at end of file
+    return await extract_text_from_bytes(file.filename, content)
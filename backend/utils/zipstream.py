@@ -0,0 +1,79 @@
+import os
+import time
+import zipfile
+from typing import Iterator, List
+
+class _Sink:
+    """Write-only file object that collects what zipfile writes until it is drained"""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+class ZipStream:
+    def __init__(self, chunk_size: int = 64 * 1024):
+        """
+        Builds a ZIP archive incrementally and hands out its bytes as they are produced.
+
+        The output is never seeked, so zipfile writes each entry's sizes in a
+        data descriptor after its contents; memory use is one chunk at a time,
+        however large the archive gets.
+
+        Args:
+            chunk_size (int): Bytes read from a source file per piece of output
+        """
+        self.chunk_size = chunk_size
+        self._sink = _Sink()
+        self._zip = zipfile.ZipFile(self._sink, "w")
+        self.bytes_written = 0
+
+    def _drain(self) -> bytes:
+        data = self._sink.drain()
+        self.bytes_written += len(data)
+        return data
+
+    def _info(self, name: str, size: int, compress: bool) -> zipfile.ZipInfo:
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        info.file_size = size
+        return info
+
+    def add_file(self, name: str, path: str, compress: bool = False) -> Iterator[bytes]:
+        """
+        Add a file from disk, yielding the archive's bytes one chunk at a time.
+
+        Args:
+            name (str): Name inside the archive
+            path (str): File to copy in
+            compress (bool): Deflate the contents; PDFs are already compressed, so off by default
+        """
+        with open(path, "rb") as source:
+            with self._zip.open(self._info(name, os.fstat(source.fileno()).st_size, compress), "w") as entry:
+                for block in iter(lambda: source.read(self.chunk_size), b""):
+                    entry.write(block)
+                    data = self._drain()
+                    if data:
+                        yield data
+        yield self._drain()
+
+    def add_bytes(self, name: str, data: bytes, compress: bool = True) -> bytes:
+        """Add a small in-memory file and return the archive's bytes for it"""
+        with self._zip.open(self._info(name, len(data), compress), "w") as entry:
+            entry.write(data)
+        return self._drain()
+
+    def close(self) -> bytes:
+        """Write the central directory and return the archive's final bytes"""
+        self._zip.close()
+        return self._drain()
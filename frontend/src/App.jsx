@@ -1,4 +1,22 @@
-import { useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
+
+// Wait for the file list to settle before asking for an estimate
+const ESTIMATE_DEBOUNCE_MS = 500;
+
+const buildFormData = (files, { fontSize, columns, orientation }) => {
+  const formData = new FormData();
+  
+  // Append each file with the same field name 'files'
+  files.forEach((file) => {
+    formData.append('files', file);
+  });
+  
+  // Append other form data
+  formData.append('font_size', fontSize);
+  formData.append('columns', columns);
+  formData.append('orientation', orientation);
+  return formData;
+};
 
 function App() {
   const [files, setFiles] = useState([]);
@@ -8,6 +26,35 @@ function App() {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
   const [result, setResult] = useState(null);
+  const [estimate, setEstimate] = useState(null);
+
+  // The estimate depends only on the files' names and sizes, so changing the layout doesn't
+  // re-estimate; the current layout is sent only because the endpoint requires it
+  const layout = useRef();
+  layout.current = { fontSize, columns, orientation };
+
+  // Ask the server what the selected files will cost before they are submitted;
+  // only their sizes are sent, so the files themselves are uploaded once
+  useEffect(() => {
+    setEstimate(null);
+    if (files.length === 0) return;
+    const controller = new AbortController();
+    const timer = setTimeout(() => {
+      const formData = new FormData();
+      formData.append('sizes', JSON.stringify(files.map(file => ({ name: file.name, size: file.size }))));
+      formData.append('font_size', layout.current.fontSize);
+      formData.append('columns', layout.current.columns);
+      formData.append('orientation', layout.current.orientation);
+      fetch('http://localhost:8000/estimate', { method: 'POST', body: formData, signal: controller.signal })
+        .then(response => (response.ok ? response.json() : null))
+        .then(data => setEstimate(data))
+        .catch(() => {});
+    }, ESTIMATE_DEBOUNCE_MS);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [files]);
 
   const handleFileChange = (e) => {
     const selectedFiles = Array.from(e.target.files);
@@ -48,26 +95,18 @@ function App() {
     setError(null);
     setResult(null);
 
-    const formData = new FormData();
-    
-    // Append each file with the same field name 'files'
-    files.forEach((file) => {
-      formData.append('files', file);
-    });
-    
-    // Append other form data
-    formData.append('font_size', fontSize);
-    formData.append('columns', columns);
-    formData.append('orientation', orientation);
-
     try {
       const response = await fetch('http://localhost:8000/upload', {
         method: 'POST',
-        body: formData,
+        body: buildFormData(files, { fontSize, columns, orientation }),
       });
 
       if (!response.ok) {
         const errorData = await response.json();
+        const retryAfter = response.headers.get('Retry-After');
+        if (retryAfter) {
+          throw new Error(`${errorData.error} (try again in ${retryAfter}s)`);
+        }
         throw new Error(errorData.error || 'Upload failed');
       }
 
@@ -132,6 +171,7 @@ function App() {
               onChange={(e) => setFontSize(e.target.value)}
               className="w-full px-3 py-2 border border-gray-300 rounded-lg text-sm text-gray-700"
             >
+              <option value="auto">Auto-fit to one page</option>
               <option value="small">Small</option>
               <option value="normal">Normal</option>
               <option value="large">Large</option>
@@ -186,6 +226,15 @@ function App() {
           </button>
         </form>
 
+        {estimate && (
+          <p className="mt-2 text-sm text-gray-500">
+            {estimate.cached
+              ? 'This cheat sheet has already been generated and will be returned immediately.'
+              : `About ${estimate.total_tokens.toLocaleString()} tokens in ${estimate.chunks} chunks (~$${estimate.cost_usd.toFixed(2)})` +
+                (estimate.expected_wait_seconds > 0 ? `, expected wait ${Math.ceil(estimate.expected_wait_seconds)}s` : '')}
+          </p>
+        )}
+
         {error && (
           <div className="mt-4 p-3 bg-red-50 text-red-700 rounded-lg text-sm">
             {error}